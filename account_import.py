@@ -0,0 +1,201 @@
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, List, Optional, Tuple
+
+import piecash
+from piecash import Account, Commodity, Price, Split, Transaction
+
+from account_index import AccountIndex
+
+# Account types whose initial_balance gets an offsetting Equity transaction, with the sign applied
+OPENING_BALANCE_SIGNS = {
+    "ASSET": 1,
+    "BANK": 1,
+    "LIABILITY": -1,
+    "CREDIT": -1,
+}
+
+
+def _parse_decimal(value) -> Decimal:
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"'{value}' is not a number")
+
+
+def validate_account_tree(nodes, valid_types, index: AccountIndex = None) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Validate the 'accounts' section of an account YAML file without touching the book.
+
+    Args:
+        nodes: List of account nodes (dicts with name, type, children, ...)
+        valid_types: Collection of accepted account types
+        index: Optional AccountIndex of the target book, used to count existing accounts
+               and to check that an Equity account is available for opening balances
+
+    Returns:
+        Tuple of (list of error messages, stats dict with 'new', 'existing', 'opening_balances', 'stocks')
+    """
+    errors = []
+    stats = {"new": 0, "existing": 0, "opening_balances": 0, "stocks": 0}
+    has_equity = index is not None and index.get("Equity", case_sensitive=True) is not None
+
+    def walk(items, parent_path, parent_type, parent_exists):
+        nonlocal has_equity
+        if not isinstance(items, list):
+            errors.append(f"{parent_path or 'accounts'}: 'children' must be a list")
+            return
+        seen = set()
+        for position, acc in enumerate(items, 1):
+            where = f"{parent_path}[{position}]" if parent_path else f"accounts[{position}]"
+            if not isinstance(acc, dict) or not acc.get('name'):
+                errors.append(f"{where}: account entry must be a mapping with a 'name'")
+                continue
+
+            name = str(acc['name'])
+            fullname = f"{parent_path}:{name}" if parent_path else name
+            if ':' in name:
+                errors.append(f"{fullname}: account names cannot contain ':'")
+            if name in seen:
+                errors.append(f"{fullname}: duplicate account name under the same parent")
+            seen.add(name)
+
+            acc_type = str(acc.get('type', parent_type or "ASSET")).upper()
+            if acc_type not in valid_types:
+                errors.append(f"{fullname}: invalid account type '{acc_type}'")
+            if acc_type == "STOCK":
+                stats["stocks"] += 1
+                if 'initial_price' in acc:
+                    try:
+                        _parse_decimal(acc['initial_price'])
+                    except ValueError as e:
+                        errors.append(f"{fullname}: invalid initial_price - {e}")
+
+            exists = parent_exists and index is not None and fullname in index
+            stats["existing" if exists else "new"] += 1
+            if fullname == "Equity":
+                has_equity = True
+
+            if 'initial_balance' in acc:
+                try:
+                    _parse_decimal(acc['initial_balance'])
+                except ValueError as e:
+                    errors.append(f"{fullname}: invalid initial_balance - {e}")
+                try:
+                    datetime.strptime(str(acc.get('balance_date', date.today().isoformat())), '%Y-%m-%d')
+                except ValueError:
+                    errors.append(f"{fullname}: invalid balance_date '{acc.get('balance_date')}' (expected YYYY-MM-DD)")
+                if acc_type in OPENING_BALANCE_SIGNS:
+                    stats["opening_balances"] += 1
+
+            if 'children' in acc:
+                walk(acc['children'], fullname, acc_type, exists)
+
+    walk(nodes, "", None, True)
+
+    if stats["opening_balances"] and not has_equity:
+        errors.append("Opening balances need an 'Equity' top-level account (in the book or in the file)")
+
+    return errors, stats
+
+
+def import_account_tree(book: piecash.Book, nodes, index: AccountIndex,
+                        default_namespace: str) -> List[str]:
+    """
+    Build accounts, stock commodities, prices and opening balances in the session.
+
+    Nothing is saved: the caller commits everything with a single book.save().
+    Opening balance transactions are created after the whole tree exists, so the
+    Equity account may appear anywhere in the file.
+
+    Args:
+        book: A read-write piecash Book object
+        nodes: Validated list of account nodes (see :func:`validate_account_tree`)
+        index: AccountIndex of the book, updated with the new accounts
+        default_namespace: Commodity namespace for stock accounts without one
+
+    Returns:
+        List of result messages, one per account
+    """
+    results = []
+    commodities: Dict[Tuple[str, str], Commodity] = {}
+    opening_balances = []
+
+    def get_commodity(namespace, mnemonic, initial_price):
+        key = (namespace, mnemonic)
+        if key not in commodities:
+            try:
+                commodities[key] = book.commodities(namespace=namespace, mnemonic=mnemonic)
+            except KeyError:
+                commodity = Commodity(
+                    namespace=namespace,
+                    mnemonic=mnemonic,
+                    fullname=mnemonic,
+                    fraction=1000,
+                    book=book
+                )
+                Price(commodity=commodity,
+                      currency=book.default_currency,
+                      date=date.today(),
+                      value=_parse_decimal(initial_price),
+                      type='last')
+                commodities[key] = commodity
+        return commodities[key]
+
+    def create_accounts(items, parent: Optional[Account]):
+        for acc in items:
+            name = str(acc['name'])
+            fullname = f"{parent.fullname}:{name}" if parent else name
+
+            new_acc = index.child(parent, name)
+            if new_acc is not None:
+                results.append(f"Account already exists: {fullname} - checking for children")
+            else:
+                acc_type = str(acc.get('type', parent.type if parent is not None else "ASSET")).upper()
+                if acc_type == "STOCK":
+                    namespace = acc.get('namespace', default_namespace)
+                    new_acc = Account(
+                        name=name,
+                        type="STOCK",
+                        commodity=get_commodity(namespace, name, acc.get('initial_price', 0.0)),
+                        commodity_scu=1000,
+                        parent=parent or book.root_account,
+                        description=acc.get('description', '')
+                    )
+                else:
+                    new_acc = Account(
+                        name=name,
+                        type=acc_type,
+                        commodity=book.default_currency,
+                        parent=parent or book.root_account,
+                        description=acc.get('description', '')
+                    )
+                index.add(new_acc)
+                results.append(f"Created account: {fullname}")
+
+            if 'initial_balance' in acc and new_acc.type in OPENING_BALANCE_SIGNS:
+                opening_balances.append((new_acc, acc))
+
+            if 'children' in acc:
+                create_accounts(acc['children'], new_acc)
+
+    create_accounts(nodes, None)
+
+    if opening_balances:
+        equity_acc = index.get("Equity", case_sensitive=True)
+        for account, acc in opening_balances:
+            balance = _parse_decimal(acc['initial_balance']) * OPENING_BALANCE_SIGNS[account.type]
+            balance_date = datetime.strptime(str(acc.get('balance_date', date.today().isoformat())), '%Y-%m-%d').date()
+            Transaction(
+                currency=book.default_currency,
+                description="Initial balance",
+                splits=[
+                    Split(account=account, value=balance),
+                    Split(account=equity_acc, value=-balance)
+                ],
+                post_date=balance_date,
+                enter_date=datetime.combine(balance_date, datetime.min.time()),
+            )
+            results.append(f"Opening balance {balance} on {balance_date} for {account.fullname}")
+
+    return results
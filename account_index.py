@@ -0,0 +1,171 @@
+import difflib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+import piecash
+from piecash import Account
+
+
+class AccountIndex:
+    """
+    In-memory lookup structure for the accounts of a book.
+
+    Built with a single accounts query and then kept up to date by the tools
+    that create, move or delete accounts (see :meth:`add`, :meth:`move` and
+    :meth:`remove`), so resolving an account name never scans ``book.accounts``.
+
+    Indexes:
+        - full name -> account (exact and case-insensitive)
+        - leaf name -> candidate accounts (case-insensitive)
+        - parent full name -> {child name -> account}
+    """
+
+    def __init__(self, book: piecash.Book):
+        self.book = book
+        self._by_fullname: Dict[str, Account] = {}
+        self._by_lower: Dict[str, List[Account]] = defaultdict(list)
+        self._by_name: Dict[str, List[Account]] = defaultdict(list)
+        self._children: Dict[str, Dict[str, Account]] = defaultdict(dict)
+
+        # book.accounts leaves out the root accounts, so a parent missing from
+        # by_guid means a top-level account
+        accounts = list(book.accounts)
+        by_guid = {acc.guid: acc for acc in accounts}
+
+        # Build full names top-down from parent_guid, without touching relationships
+        fullnames = {}
+
+        def fullname_of(acc):
+            if acc.guid not in fullnames:
+                parent = by_guid.get(acc.parent_guid)
+                if parent is None:
+                    fullnames[acc.guid] = acc.name
+                else:
+                    fullnames[acc.guid] = f"{fullname_of(parent)}:{acc.name}"
+            return fullnames[acc.guid]
+
+        for acc in accounts:
+            if acc.type != "ROOT":
+                self._insert(acc, fullname_of(acc))
+
+    @staticmethod
+    def _parent_name(fullname: str) -> str:
+        return fullname.rpartition(':')[0]
+
+    def _insert(self, account: Account, fullname: str):
+        if self._by_fullname.get(fullname) is account:
+            return
+        self._by_fullname[fullname] = account
+        self._by_lower[fullname.lower()].append(account)
+        self._by_name[account.name.lower()].append(account)
+        self._children[self._parent_name(fullname)][account.name] = account
+
+    def _discard(self, account: Account, fullname: str):
+        self._by_fullname.pop(fullname, None)
+        for mapping, key in ((self._by_lower, fullname.lower()), (self._by_name, account.name.lower())):
+            candidates = [acc for acc in mapping.get(key, []) if acc is not account]
+            if candidates:
+                mapping[key] = candidates
+            else:
+                mapping.pop(key, None)
+        siblings = self._children.get(self._parent_name(fullname))
+        if siblings is not None:
+            siblings.pop(account.name, None)
+
+    def _subtree(self, fullname: str) -> List[str]:
+        """Full names of an account and all its descendants, parents first."""
+        names = [fullname]
+        for name in names:
+            names.extend(f"{name}:{child}" for child in self._children.get(name, {}))
+        return names
+
+    def get(self, fullname: str, case_sensitive: bool = False) -> Optional[Account]:
+        """
+        Resolve an account by full name.
+
+        Falls back to a case-insensitive match when there is no exact match
+        and exactly one account matches ignoring case.
+
+        Args:
+            fullname: Full account name (e.g. "Assets:Checking")
+            case_sensitive: Only accept an exact match
+
+        Returns:
+            The account, or None if not found
+        """
+        if fullname is None:
+            return None
+        account = self._by_fullname.get(fullname)
+        if account is None and not case_sensitive:
+            candidates = self._by_lower.get(fullname.lower(), [])
+            if len(candidates) == 1:
+                account = candidates[0]
+        return account
+
+    def find_by_name(self, name: str) -> List[Account]:
+        """All accounts whose own (leaf) name matches, ignoring case."""
+        return list(self._by_name.get(name.lower(), []))
+
+    def child(self, parent: Optional[Account], name: str) -> Optional[Account]:
+        """Direct child of parent (top-level account when parent is None or ROOT) with that name."""
+        parent_name = "" if parent is None or parent.type == "ROOT" else parent.fullname
+        return self._children.get(parent_name, {}).get(name)
+
+    def children(self, parent: Optional[Account]) -> List[Account]:
+        """Direct children of parent (top-level accounts when parent is None or ROOT)."""
+        parent_name = "" if parent is None or parent.type == "ROOT" else parent.fullname
+        return list(self._children.get(parent_name, {}).values())
+
+    def suggest(self, fullname: str, n: int = 3) -> List[str]:
+        """Closest existing full names, for "did you mean" messages."""
+        if not fullname:
+            return []
+        by_lower = {name.lower(): name for name in self._by_fullname}
+        matches = difflib.get_close_matches(fullname.lower(), by_lower.keys(), n=n, cutoff=0.6)
+        # A bare leaf name is a good hint too
+        leaf_matches = [acc.fullname for acc in self.find_by_name(fullname.rpartition(':')[2])]
+        suggestions = []
+        for name in leaf_matches + [by_lower[m] for m in matches]:
+            if name not in suggestions:
+                suggestions.append(name)
+        return suggestions[:n]
+
+    def not_found(self, label: str, fullname: str) -> str:
+        """Standard "not found" message with fuzzy suggestions."""
+        message = f"{label} '{fullname}' not found."
+        suggestions = self.suggest(fullname)
+        if suggestions:
+            message += " Did you mean: " + ", ".join(suggestions) + "?"
+        return message
+
+    def __contains__(self, fullname: str) -> bool:
+        return fullname in self._by_fullname
+
+    def __len__(self) -> int:
+        return len(self._by_fullname)
+
+    def add(self, account: Account):
+        """Register a newly created account."""
+        self._insert(account, account.fullname)
+
+    def add_all(self, accounts: Iterable[Account]):
+        for account in accounts:
+            self.add(account)
+
+    def remove(self, account: Account):
+        """Forget a deleted account (and any descendants still indexed)."""
+        fullname = account.fullname
+        for name in reversed(self._subtree(fullname)):
+            acc = self._by_fullname.get(name)
+            if acc is not None:
+                self._discard(acc, name)
+
+    def move(self, account: Account, old_fullname: str):
+        """Re-key an account and its subtree after its parent changed."""
+        old_names = self._subtree(old_fullname)
+        moved = [(name, self._by_fullname[name]) for name in old_names if name in self._by_fullname]
+        for name, acc in reversed(moved):
+            self._discard(acc, name)
+        new_prefix = account.fullname
+        for name, acc in moved:
+            self._insert(acc, new_prefix + name[len(old_fullname):])
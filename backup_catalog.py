@@ -0,0 +1,343 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+CATALOG_FILE = "backup_catalog.db"
+STORE = "store"  # location of backups in the backup store
+STAMP = '%Y%m%d%H%M%S'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT NOT NULL,
+    location TEXT NOT NULL,
+    book TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    size INTEGER,
+    checksum TEXT,
+    PRIMARY KEY (location, name)
+);
+CREATE INDEX IF NOT EXISTS backups_book_time ON backups (book, timestamp);
+"""
+
+# Retention tiers: bucket of a backup time; the newest backup of each bucket is kept
+TIERS: Dict[str, Callable[[datetime], object]] = {
+    "all": lambda t: t,
+    "hourly": lambda t: (t.date(), t.hour),
+    "daily": lambda t: t.date(),
+    "weekly": lambda t: t.isocalendar()[:2],
+    "monthly": lambda t: (t.year, t.month),
+    "yearly": lambda t: t.year,
+}
+UNITS = {"h": timedelta(hours=1), "d": timedelta(days=1), "w": timedelta(weeks=1),
+         "m": timedelta(days=30), "y": timedelta(days=365)}
+DEFAULT_RETENTION = "hourly:1d,daily:30d,monthly:1y"
+
+Policy = List[Tuple[str, timedelta]]
+
+
+def parse_policy(text: str) -> Policy:
+    """
+    Parse a retention policy such as 'hourly:1d,daily:30d,monthly:1y'.
+
+    Each tier keeps the newest backup of every bucket (hour, day, week, month, year,
+    or every backup for 'all') that is younger than the tier's window. Windows are
+    a number with h, d, w, m (30 days) or y (365 days).
+    """
+    policy = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        tier, _, window = part.partition(":")
+        tier = tier.strip().lower()
+        if tier not in TIERS:
+            raise ValueError(f"Unknown retention tier '{tier}', use one of: {', '.join(TIERS)}")
+        window = window.strip().lower()
+        if not window or window[-1] not in UNITS or not window[:-1].isdigit():
+            raise ValueError(f"Invalid retention window '{window}' for {tier}, e.g. 12h, 30d, 1y")
+        policy.append((tier, int(window[:-1]) * UNITS[window[-1]]))
+    if not policy:
+        raise ValueError("Empty retention policy")
+    return policy
+
+
+def expired_by_policy(times: Iterable[datetime], policy: Policy, now: datetime = None) -> List[datetime]:
+    """Backup times a retention policy does not keep. The newest backup is always kept."""
+    now = now or datetime.now()
+    times = sorted(set(times))
+    keep = set(times[-1:])
+    for tier, window in policy:
+        bucket_of = TIERS[tier]
+        newest = {}
+        for t in times:
+            if t >= now - window:
+                newest[bucket_of(t)] = t  # sorted: the last one wins
+        keep.update(newest.values())
+    return [t for t in times if t not in keep]
+
+
+def backup_time(name: str) -> Optional[datetime]:
+    """Timestamp of a GnuCash backup file name (book.gnucash.YYYYMMDDHHMMSS.gnucash), else None."""
+    parts = name.split('.')
+    if len(parts) >= 3 and parts[-1] == "gnucash" and len(parts[-2]) == 14 and parts[-2].isdigit():
+        try:
+            return _parse_stamp(parts[-2])
+        except ValueError:
+            return None
+    return None
+
+
+def _parse_stamp(stamp: str) -> datetime:
+    # YYYYMMDDHHMMSS; much faster than strptime over thousands of backups
+    return datetime(int(stamp[:4]), int(stamp[4:6]), int(stamp[6:8]),
+                    int(stamp[8:10]), int(stamp[10:12]), int(stamp[12:14]))
+
+
+def file_checksum(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry(row) -> dict:
+    name, location, book, timestamp, size, checksum = row
+    return {
+        "name": name,
+        "location": location,
+        "path": None if location == STORE else os.path.join(location, name),
+        "book": book,
+        "timestamp": _parse_stamp(timestamp),
+        "size": size,
+        "checksum": checksum,
+    }
+
+
+class BackupCatalog:
+    """
+    Index of all backups of all books: backup files in the working directory and
+    in backups/, and backups in the backup store, with their time, size and checksum.
+
+    Kept in step by the backup sweeper and the backup store as backups come and go,
+    so listing, purging and retention are range scans over (book, timestamp)
+    instead of directory globs. :meth:`refresh` rebuilds the file entries from the
+    directories, e.g. at start or after files were changed by hand.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._ready = False
+        # One connection per thread: the sweeper updates the catalog once per backup
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            return db
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        # The catalog can be rebuilt from the directories (refresh): no fsync per update
+        db.execute("PRAGMA synchronous = OFF")
+        if not self._ready:
+            with self._lock:
+                db.execute("PRAGMA journal_mode = WAL")
+                db.executescript(SCHEMA)
+                self._ready = True
+        self._local.db = db
+        return db
+
+    def add(self, name: str, location: str, size: int = None, checksum: str = None):
+        """Record a backup; location is the folder of a backup file, or STORE."""
+        self.add_many([(name, location, size, checksum)])
+
+    def add_many(self, rows: Iterable[Tuple[str, str, Optional[int], Optional[str]]]):
+        records = []
+        for name, location, size, checksum in rows:
+            stamp = backup_time(name)
+            if stamp is None:
+                continue
+            book = '.'.join(name.split('.')[:-2])
+            location = location if location == STORE else os.path.abspath(location)
+            records.append((name, location, book, stamp.strftime(STAMP), size, checksum))
+        if not records:
+            return
+        # Keep a known checksum when the same file is recorded again without one
+        self._write(
+            "INSERT INTO backups (name, location, book, timestamp, size, checksum) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (location, name) DO UPDATE SET size = excluded.size, "
+            "checksum = coalesce(excluded.checksum, backups.checksum)",
+            records
+        )
+
+    def remove(self, name: str, location: str):
+        self.remove_many([(name, location)])
+
+    def remove_many(self, rows: Iterable[Tuple[str, str]]):
+        rows = [(name, location if location == STORE else os.path.abspath(location)) for name, location in rows]
+        if not rows:
+            return
+        self._write("DELETE FROM backups WHERE name = ? AND location = ?", rows)
+
+    def _write(self, statement: str, rows: list):
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany(statement, rows)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def entries(self, book: str = None, start: datetime = None, end: datetime = None,
+                location: str = None) -> List[dict]:
+        """
+        Backups oldest first, optionally of one book (e.g. 'mybook.gnucash'), taken at
+        or after start and before end, in one location.
+        """
+        query = "SELECT name, location, book, timestamp, size, checksum FROM backups WHERE 1 = 1"
+        params = []
+        if book:
+            query += " AND book = ?"
+            params.append(book)
+        if start:
+            query += " AND timestamp >= ?"
+            params.append(start.strftime(STAMP))
+        if end:
+            query += " AND timestamp < ?"
+            params.append(end.strftime(STAMP))
+        if location:
+            query += " AND location = ?"
+            params.append(location if location == STORE else os.path.abspath(location))
+        db = self._connect()
+        return [_entry(row) for row in db.execute(query + " ORDER BY timestamp, name", params)]
+
+    def expired(self, policy: Policy, now: datetime = None, book: str = None,
+                locations: Iterable[str] = None) -> List[dict]:
+        """
+        Backups a retention policy does not keep, judged per book over the backups in
+        the given locations (default: all).
+        """
+        locations = None if locations is None else {
+            location if location == STORE else os.path.abspath(location) for location in locations}
+        by_book: Dict[str, Dict[datetime, List[dict]]] = {}
+        for entry in self.entries(book):
+            if locations is None or entry["location"] in locations:
+                by_book.setdefault(entry["book"], {}).setdefault(entry["timestamp"], []).append(entry)
+        expired = []
+        for times in by_book.values():
+            for t in expired_by_policy(times, policy, now):
+                expired.extend(times[t])
+        return expired
+
+    def books(self) -> List[str]:
+        db = self._connect()
+        return [book for (book,) in db.execute("SELECT DISTINCT book FROM backups ORDER BY book")]
+
+    def count(self, book: str = None) -> int:
+        db = self._connect()
+        if book:
+            return db.execute("SELECT count(*) FROM backups WHERE book = ?", (book,)).fetchone()[0]
+        return db.execute("SELECT count(*) FROM backups").fetchone()[0]
+
+    def built(self) -> bool:
+        """Whether the catalog was ever refreshed from the directories."""
+        db = self._connect()
+        return db.execute("SELECT 1 FROM meta WHERE key = 'refreshed'").fetchone() is not None
+
+    def sync_folder(self, folder, names: Iterable[str]) -> Tuple[int, int]:
+        """
+        Make the entries of a folder (or STORE) match the given backup names.
+
+        Returns:
+            (entries added, entries removed)
+        """
+        location = folder if folder == STORE else os.path.abspath(folder)
+        names = {name for name in names if backup_time(name) is not None}
+        db = self._connect()
+        known = {name for (name,) in db.execute("SELECT name FROM backups WHERE location = ?", (location,))}
+        gone = known - names
+        self.remove_many((name, location) for name in gone)
+        new = names - known
+        if folder == STORE:
+            # Store entries carry their size and checksum; the caller adds them
+            return len(new), len(gone)
+        rows = []
+        for name in new:
+            try:
+                rows.append((name, location, os.path.getsize(os.path.join(location, name)), None))
+            except OSError:
+                continue
+        self.add_many(rows)
+        return len(new), len(gone)
+
+    def refresh(self, folders: Iterable, store=None) -> Tuple[int, int]:
+        """Rebuild the catalog from backup files in folders and the store's backups."""
+        added = removed = 0
+        for folder in folders:
+            names = [path.name for path in Path(folder).glob('*.*.gnucash')]
+            a, r = self.sync_folder(folder, names)
+            added, removed = added + a, removed + r
+        if store is not None:
+            stored = store.list()
+            _, r = self.sync_folder(STORE, [entry["name"] for entry in stored])
+            removed += r
+            self.add_many((entry["name"], STORE, entry["size"], entry["sha256"]) for entry in stored)
+        db = self._connect()
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('refreshed', ?)",
+                   (datetime.now().isoformat(timespec="seconds"),))
+        log.debug(f"Backup catalog refreshed: {added} added, {removed} removed")
+        return added, removed
+
+
+def remove_backups(entries: Iterable[dict], catalog: BackupCatalog, store=None) -> Tuple[int, int]:
+    """
+    Delete catalogued backups: files are unlinked, stored backups deleted from the store.
+
+    Returns:
+        (backups deleted, bytes freed)
+    """
+    deleted = freed = 0
+    stored = []
+    gone = []
+    for entry in entries:
+        if entry["location"] == STORE:
+            stored.append(entry["name"])
+            continue
+        try:
+            os.remove(entry["path"])
+            deleted += 1
+            freed += entry["size"] or 0
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log.error(f"Could not delete backup {entry['path']}: {str(e)}")
+            continue
+        gone.append((entry["name"], entry["location"]))
+    catalog.remove_many(gone)
+    if stored and store is not None:
+        count, store_freed = store.delete(stored)
+        deleted, freed = deleted + count, freed + store_freed
+    return deleted, freed
+
+
+_catalogs: Dict[str, BackupCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def backup_catalog(folder="backups") -> BackupCatalog:
+    """The backup catalog kept in a folder."""
+    path = os.path.abspath(os.path.join(folder, CATALOG_FILE))
+    with _catalogs_lock:
+        if path not in _catalogs:
+            os.makedirs(folder, exist_ok=True)
+            _catalogs[path] = BackupCatalog(path)
+        return _catalogs[path]
@@ -0,0 +1,319 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backup_catalog import STORE, backup_catalog, backup_time, file_checksum
+
+log = logging.getLogger(__name__)
+
+STORE_FILE = "backup_store.db"
+DIGEST_SIZE = 32  # sha256
+# Chunk size for files that are not SQLite databases
+BLOCK_SIZE = 4096
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    hash BLOB PRIMARY KEY,
+    refs INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backups (
+    name TEXT PRIMARY KEY,
+    book TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    stored_bytes INTEGER NOT NULL,
+    chunks BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backups_book_time ON backups (book, timestamp);
+"""
+
+
+def chunk_size_of(path) -> int:
+    """SQLite page size of a database file, so chunks are whole pages; else BLOCK_SIZE."""
+    with open(path, "rb") as f:
+        header = f.read(100)
+    if len(header) == 100 and header.startswith(b"SQLite format 3\x00"):
+        size = int.from_bytes(header[16:18], "big")
+        return 65536 if size == 1 else size
+    return BLOCK_SIZE
+
+
+def split_backup_name(name: str) -> Tuple[str, str]:
+    """'book.gnucash.20240101120000.gnucash' -> ('book.gnucash', '20240101120000')."""
+    parts = name.split('.')
+    return '.'.join(parts[:-2]), parts[-2]
+
+
+class BackupStore:
+    """
+    Deduplicating, compressed store for book backups, in one SQLite file.
+
+    Backups are split into chunks of one SQLite page each. Each distinct page is
+    stored once, zlib-compressed, keyed by its sha256 and reference-counted; a
+    backup is the list of its page hashes. Successive backups of a book share all
+    unchanged pages, so keeping weeks of history costs little more than the pages
+    that changed. Deleting backups drops the chunks nothing references any more.
+    """
+
+    def __init__(self, path, catalog=None):
+        """
+        Args:
+            path: Store file
+            catalog: backup_catalog.BackupCatalog kept in step with the stored backups
+        """
+        self.path = str(path)
+        self.catalog = catalog
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._ready:
+            with self._lock:
+                # Only takes effect on a new file: lets deletes give space back
+                db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                db.executescript(SCHEMA)
+                self._ready = True
+        return db
+
+    def __contains__(self, name: str) -> bool:
+        with closing(self._connect()) as db:
+            return db.execute("SELECT 1 FROM backups WHERE name = ?", (name,)).fetchone() is not None
+
+    def unused_name(self, book: str, when: datetime = None) -> str:
+        """
+        Backup name for a book at a time (default now), book.gnucash.YYYYMMDDHHMMSS.gnucash.
+        Timestamps have one-second resolution, so a taken name moves on by a second.
+        """
+        when = when or datetime.now()
+        while True:
+            name = f"{book}.{when:%Y%m%d%H%M%S}.gnucash"
+            if name not in self:
+                return name
+            when += timedelta(seconds=1)
+
+    def add(self, path, name: str = None) -> Optional[dict]:
+        """
+        Store a backup file.
+
+        Args:
+            path: Backup file to read
+            name: Backup name (default: the file name, book.gnucash.YYYYMMDDHHMMSS.gnucash)
+
+        Returns:
+            dict: size, sha256, chunks, new_chunks, stored_bytes, seconds; None if the
+            backup is already in the store
+        """
+        started = time.perf_counter()
+        name = name or Path(path).name
+        book, timestamp = split_backup_name(name)
+        chunk_size = chunk_size_of(path)
+        whole = hashlib.sha256()
+        digests = []
+        new_chunks = stored = size = 0
+        seen = set()
+        with closing(self._connect()) as db, open(path, "rb") as f:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if db.execute("SELECT 1 FROM backups WHERE name = ?", (name,)).fetchone():
+                    db.execute("ROLLBACK")
+                    return None
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    whole.update(chunk)
+                    digest = hashlib.sha256(chunk).digest()
+                    digests.append(digest)
+                    if digest in seen:
+                        continue
+                    seen.add(digest)
+                    # One reference per backup that contains the chunk
+                    if db.execute("UPDATE chunks SET refs = refs + 1 WHERE hash = ?", (digest,)).rowcount:
+                        continue
+                    data = zlib.compress(chunk)
+                    db.execute("INSERT INTO chunks (hash, refs, size, data) VALUES (?, 1, ?, ?)",
+                               (digest, len(chunk), data))
+                    new_chunks += 1
+                    stored += len(data)
+                db.execute(
+                    "INSERT INTO backups (name, book, timestamp, size, chunk_size, sha256, stored_bytes, chunks) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (name, book, timestamp, size, chunk_size, whole.hexdigest(), stored, b"".join(digests))
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        stats = {"size": size, "sha256": whole.hexdigest(), "chunks": len(digests), "new_chunks": new_chunks,
+                 "stored_bytes": stored, "seconds": round(time.perf_counter() - started, 3)}
+        if self.catalog is not None:
+            self.catalog.add(name, STORE, size, stats["sha256"])
+        log.debug(f"Stored backup {name}: {stats}")
+        return stats
+
+    def keep(self, path) -> str:
+        """
+        Store a backup file whose original is about to be deleted.
+
+        A stored backup of the same name is only this file if it has the same
+        contents; otherwise (e.g. the file was written again after a restore) the
+        file is stored under the next free name of its book.
+
+        Returns:
+            str: Name of the stored backup with the file's contents
+        """
+        name = Path(path).name
+        while self.add(path, name) is None:
+            with closing(self._connect()) as db:
+                row = db.execute("SELECT sha256 FROM backups WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] == file_checksum(path):
+                return name
+            name = self.unused_name(split_backup_name(name)[0], backup_time(name))
+            log.debug(f"Backup {Path(path).name} differs from the stored one, storing it as {name}")
+        return name
+
+    def list(self, book: str = None) -> List[dict]:
+        """Backups in the store, oldest first; book is e.g. 'mybook.gnucash' (all books if None)."""
+        query = "SELECT name, book, timestamp, size, sha256, stored_bytes FROM backups"
+        params = ()
+        if book:
+            query += " WHERE book = ?"
+            params = (book,)
+        query += " ORDER BY timestamp, name"
+        with closing(self._connect()) as db:
+            return [dict(name=name, book=b, timestamp=ts, size=size, sha256=sha256, stored_bytes=stored)
+                    for name, b, ts, size, sha256, stored in db.execute(query, params)]
+
+    def find(self, timestamp: str, book: str = None) -> List[str]:
+        """Names of the backups whose timestamp starts with the given digits."""
+        digits = "".join(c for c in timestamp if c.isdigit())
+        query = "SELECT name FROM backups WHERE timestamp LIKE ?"
+        params = [digits + "%"]
+        if book:
+            query += " AND book = ?"
+            params.append(book)
+        with closing(self._connect()) as db:
+            return [name for (name,) in db.execute(query + " ORDER BY timestamp", params)]
+
+    def restore(self, name: str, dest) -> int:
+        """
+        Write a stored backup to dest, verified against its checksum. dest is replaced
+        only once the whole file is written and verified.
+
+        Returns:
+            int: bytes written
+        """
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT size, sha256, chunks FROM backups WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise KeyError(f"No backup named {name}")
+            size, sha256, chunks = row
+            digests = [chunks[i:i + DIGEST_SIZE] for i in range(0, len(chunks), DIGEST_SIZE)]
+            partial = f"{dest}.restoring"
+            whole = hashlib.sha256()
+            cache: Dict[bytes, bytes] = {}
+            try:
+                with open(partial, "wb") as f:
+                    for digest in digests:
+                        chunk = cache.get(digest)
+                        if chunk is None:
+                            data = db.execute("SELECT data FROM chunks WHERE hash = ?", (digest,)).fetchone()
+                            if data is None:
+                                raise ValueError(f"Backup {name} is missing chunk {digest.hex()}")
+                            chunk = zlib.decompress(data[0])
+                            if len(cache) < 1024:
+                                cache[digest] = chunk
+                        whole.update(chunk)
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if whole.hexdigest() != sha256:
+                    raise ValueError(f"Backup {name} does not match its checksum")
+                os.replace(partial, dest)
+            finally:
+                if os.path.exists(partial):
+                    os.remove(partial)
+        log.debug(f"Restored backup {name} to {dest} ({size} bytes)")
+        return size
+
+    def delete(self, names: Iterable[str]) -> Tuple[int, int]:
+        """
+        Delete backups and garbage-collect the chunks no backup references any more.
+
+        Returns:
+            (backups deleted, compressed bytes freed)
+        """
+        deleted = []
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for name in names:
+                    row = db.execute("SELECT chunks FROM backups WHERE name = ?", (name,)).fetchone()
+                    if row is None:
+                        continue
+                    digests = {row[0][i:i + DIGEST_SIZE] for i in range(0, len(row[0]), DIGEST_SIZE)}
+                    db.executemany("UPDATE chunks SET refs = refs - 1 WHERE hash = ?", ((d,) for d in digests))
+                    db.execute("DELETE FROM backups WHERE name = ?", (name,))
+                    deleted.append(name)
+                freed = self._collect(db)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("PRAGMA incremental_vacuum")
+        if self.catalog is not None:
+            self.catalog.remove_many((name, STORE) for name in deleted)
+        log.debug(f"Deleted {len(deleted)} stored backup(s), freed {freed} bytes")
+        return len(deleted), freed
+
+    @staticmethod
+    def _collect(db) -> int:
+        freed = db.execute("SELECT coalesce(sum(length(data)), 0) FROM chunks WHERE refs <= 0").fetchone()[0]
+        db.execute("DELETE FROM chunks WHERE refs <= 0")
+        return freed
+
+    def stats(self) -> dict:
+        """Backups, their total size, and the bytes the store takes on disk."""
+        with closing(self._connect()) as db:
+            backups, logical = db.execute("SELECT count(*), coalesce(sum(size), 0) FROM backups").fetchone()
+            chunks, stored = db.execute("SELECT count(*), coalesce(sum(length(data)), 0) FROM chunks").fetchone()
+        return {"backups": backups, "size": logical, "chunks": chunks, "stored_bytes": stored,
+                "file_bytes": os.path.getsize(self.path)}
+
+
+_stores: Dict[str, BackupStore] = {}
+_stores_lock = threading.Lock()
+
+
+def backup_store(folder="backups") -> Optional[BackupStore]:
+    """The backup store in a folder, or None when disabled with GC_CLI_BACKUP_STORE=0."""
+    if os.getenv("GC_CLI_BACKUP_STORE", "1") == "0":
+        return None
+    path = os.path.abspath(os.path.join(folder, STORE_FILE))
+    with _stores_lock:
+        if path not in _stores:
+            os.makedirs(folder, exist_ok=True)
+            _stores[path] = BackupStore(path, catalog=backup_catalog(folder))
+        return _stores[path]
+
+
+def format_size(size: int) -> str:
+    """Bytes as a short human-readable size."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
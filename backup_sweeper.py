@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import logging
+import shutil
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from colorama import Fore
+
+from backup_catalog import STORE, backup_time, file_checksum, remove_backups
+
+log = logging.getLogger(__name__)
+
+MOVE = "move"      # backup in the working directory: move it to backups/ (or into the store)
+DELETE = "delete"  # backup in backups/: delete it
+RETAIN = "retain"  # apply the retention policy to the store and backups/
+
+# Heap key of the retention run, which is not a file
+RETENTION = "retention"
+
+
+class BackupSweeper:
+    """
+    Moves backup files to the backups folder once they are sweep_age old, and deletes
+    them from there once they are purge_days old, exactly when that falls due. With
+    a backup store, backups go into the store instead. With a retention policy, the
+    backups in the store and in backups/ are thinned out to it every
+    retention_interval and after backups were added.
+
+    The directories are scanned once at start. After that, watchdog reports new
+    backup files and each file gets a due entry in a heap ordered by due time. One
+    task sleeps until the earliest entry is due (or a new file arrives) and runs the
+    due moves/deletes on a worker thread. Nothing is rescanned unless rescan_interval
+    is set, as a safety net for missed filesystem events. The backup catalog is kept
+    in step with every file seen, moved or deleted.
+    """
+
+    def __init__(self, workdir: Path, backups: Path, sweep_age: timedelta, purge_age: timedelta,
+                 run_blocking, rescan_interval: Optional[float] = None, store=None,
+                 catalog=None, retention=None, retention_interval: float = 3600):
+        """
+        Args:
+            workdir: Directory GnuCash/piecash writes backups to
+            backups: Folder backups are moved to
+            sweep_age: Age at which backups are moved to the backups folder
+            purge_age: Age at which backups in the backups folder are deleted
+            run_blocking: Coroutine function run_blocking(func, *args) that runs file
+                operations off the event loop
+            rescan_interval: Seconds between full rescans (None: never)
+            store: backup_store.BackupStore that swept backups are added to
+            catalog: backup_catalog.BackupCatalog to keep in step
+            retention: Retention policy (backup_catalog.parse_policy; None: keep all);
+                needs a catalog
+            retention_interval: Seconds between retention runs
+        """
+        self.workdir = Path(workdir)
+        self.backups = Path(backups)
+        self.sweep_age = sweep_age
+        self.purge_age = purge_age
+        self.run_blocking = run_blocking
+        self.rescan_interval = rescan_interval
+        self.store = store
+        self.catalog = catalog
+        self.retention = retention if catalog is not None else None
+        self.retention_interval = retention_interval
+        self._folders = {self.workdir.resolve(): MOVE, self.backups.resolve(): DELETE}
+        # (due, path, action); _due keeps paths already in the heap to skip duplicate events
+        self._heap: List[Tuple[datetime, str, str]] = []
+        self._due: Dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._wake = None
+        self._observer = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, path: Path) -> bool:
+        """Add a backup file to the heap; returns False for other files and known backups."""
+        path = Path(path)
+        stamp = backup_time(path.name)
+        if stamp is None:
+            return False
+        action = self._folders.get(path.parent.resolve())
+        if action is None:
+            return False
+        if self.catalog is not None:
+            try:
+                self.catalog.add(path.name, path.parent, path.stat().st_size)
+            except OSError:
+                return False  # Gone already
+        due = stamp + (self.sweep_age if action == MOVE else self.purge_age)
+        return self._push(str(path), due, action)
+
+    def schedule_retention(self, delay: float = 0) -> bool:
+        """Run the retention policy in delay seconds."""
+        if self.retention is None:
+            return False
+        return self._push(RETENTION, datetime.now() + timedelta(seconds=delay), RETAIN)
+
+    def _push(self, key: str, due: datetime, action: str) -> bool:
+        with self._lock:
+            if self._due.get(key) == due:
+                return False
+            self._due[key] = due
+            earliest = self._heap[0][0] if self._heap else None
+            heapq.heappush(self._heap, (due, key, action))
+        if self._wake is not None and (earliest is None or due < earliest):
+            self._loop.call_soon_threadsafe(self._wake.set)
+        return True
+
+    def scan(self) -> int:
+        """Schedule every backup file in both directories; returns the number added."""
+        added = 0
+        if self.catalog is not None:
+            # Reconciles the catalog with the directories and the store
+            self.catalog.refresh((self.workdir, self.backups), self.store)
+        for folder in (self.workdir, self.backups):
+            for path in folder.glob('*.*.gnucash'):
+                added += self.schedule(path)
+        log.debug(f"Backup scan: {added} new backup(s) scheduled, {len(self._heap)} pending")
+        return added
+
+    def _pop_due(self, now: datetime) -> List[Tuple[str, str]]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                when, key, action = heapq.heappop(self._heap)
+                if self._due.get(key) == when:
+                    del self._due[key]
+                    due.append((key, action))
+        return due
+
+    def _next_due(self) -> Optional[datetime]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _forget(self, path: Path):
+        if self.catalog is not None:
+            self.catalog.remove(path.name, path.parent)
+
+    def apply(self, entries: List[Tuple[str, str]]):
+        """Move/delete due backups and run due retention (blocking)."""
+        added = False
+        for key, action in entries:
+            if action == RETAIN:
+                continue
+            path = Path(key)
+            try:
+                if not path.exists():
+                    self._forget(path)  # Removed or moved by someone else
+                    continue
+                if action == MOVE and self.store is not None:
+                    # Raises rather than returns if the file is not in the store
+                    self.store.keep(path)
+                    path.unlink()
+                    self._forget(path)
+                    added = True
+                elif action == MOVE:
+                    dest = self.backups / path.name
+                    log.info(f"Moving backup from {path} to {dest}")
+                    shutil.move(str(path), str(dest))
+                    self._forget(path)
+                    # Scheduled here rather than on the watchdog event, which may come later
+                    self.schedule(dest)
+                    if self.catalog is not None:
+                        self.catalog.add(dest.name, dest.parent, dest.stat().st_size, file_checksum(dest))
+                    added = True
+                else:
+                    print(Fore.YELLOW + f"DEBUG: Deleting old backup {path}")
+                    path.unlink()
+                    self._forget(path)
+            except (OSError, sqlite3.Error) as e:
+                log.error(f"Backup processing error for {path}: {str(e)}")
+        if any(action == RETAIN for _, action in entries):
+            self.retain()
+            self.schedule_retention(self.retention_interval)
+        elif added:
+            # Thin out right away rather than at the next hourly run
+            self.schedule_retention()
+
+    def retain(self) -> Tuple[int, int]:
+        """Delete the backups in the store and backups/ the retention policy does not keep (blocking)."""
+        if self.retention is None:
+            return 0, 0
+        try:
+            expired = self.catalog.expired(self.retention, locations=(STORE, self.backups))
+            deleted, freed = remove_backups(expired, self.catalog, self.store)
+            if deleted:
+                log.info(f"Retention removed {deleted} backup(s), freed {freed} bytes")
+            return deleted, freed
+        except (OSError, sqlite3.Error) as e:
+            log.error(f"Backup retention error: {str(e)}")
+            return 0, 0
+
+    def _watch(self):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        sweeper = self
+
+        class Handler(FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    sweeper.schedule(Path(event.src_path))
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    sweeper.schedule(Path(event.dest_path))
+
+            def on_closed(self, event):
+                # Records the final size of a file that was still being written when created
+                if not event.is_directory:
+                    sweeper.schedule(Path(event.src_path))
+
+        observer = Observer()
+        for folder in (self.workdir, self.backups):
+            observer.schedule(Handler(), str(folder), recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    async def start(self):
+        """Start watching (raises ImportError without watchdog) and the sweep task."""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.backups.mkdir(exist_ok=True)
+        # Watch before the initial scan so no file falls between the two
+        self._observer = self._watch()
+        await self.run_blocking(self.scan)
+        self.schedule_retention()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._observer:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+            self._observer = None
+
+    async def _run(self):
+        last_scan = self._loop.time()
+        while True:
+            try:
+                # Cleared before looking at the heap: a file scheduled after this wakes us
+                self._wake.clear()
+                now = datetime.now()
+                entries = self._pop_due(now)
+                if entries:
+                    await self.run_blocking(self.apply, entries)
+                    continue
+                timeout = None
+                next_due = self._next_due()
+                if next_due is not None:
+                    timeout = max(0.0, (next_due - now).total_seconds())
+                if self.rescan_interval:
+                    until_scan = max(0.0, last_scan + self.rescan_interval - self._loop.time())
+                    timeout = until_scan if timeout is None else min(timeout, until_scan)
+                    if until_scan == 0:
+                        await self.run_blocking(self.scan)
+                        last_scan = self._loop.time()
+                        continue
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Sweep error: {str(e)}")
+                await asyncio.sleep(60)  # Wait before retrying after error
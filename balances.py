@@ -0,0 +1,240 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import piecash
+from piecash import Account, Split, Transaction
+from piecash._common import GncConversionError
+from sqlalchemy import func
+
+from checkpoints import checkpoint_store, day_start, sum_split_quantities
+from prices import price_history
+
+
+def _report_frame(book):
+    """Split frame to compute from, or None to aggregate in SQL (see PooledBook.report_frame)."""
+    getter = getattr(book, "report_frame", None)
+    return getter() if getter is not None else None
+
+
+def to_decimal(num: int, denom: int) -> Decimal:
+    """
+    An amount stored as num/denom, keeping the scale of its denominator: 6023470/100
+    is 60234.70, not 60234.7, so totals print like the split amounts they add up.
+    """
+    num, denom = int(num), int(denom)
+    scale = len(str(denom)) - 1
+    if denom == 10 ** scale:
+        return Decimal(num).scaleb(-scale)
+    return Decimal(num) / Decimal(denom)
+
+
+def load_split_totals(book: piecash.Book, at_date: Optional[date] = None) -> Dict[str, Decimal]:
+    """
+    Sum split quantities per account.
+
+    Quantities are stored as num/denom pairs; numerators are summed per
+    (account, denominator) so the totals stay exact decimals. A read session that
+    serves repeated reports computes them from its split frame (see
+    :class:`report_engine.SplitFrame`); otherwise, for SQLite books, the sums come
+    from the month-end checkpoint before at_date plus the splits posted after it
+    (see :class:`checkpoints.CheckpointStore`) instead of a full scan.
+
+    Args:
+        book: An opened piecash Book object
+        at_date: Optional date, only splits posted on or before it are counted
+
+    Returns:
+        Dictionary of account guid -> own balance (in the account's commodity)
+    """
+    if isinstance(at_date, datetime):
+        at_date = at_date.date()
+    frame = _report_frame(book)
+    if frame is not None:
+        return frame.own_totals(at_date)
+    store = checkpoint_store(book)
+    if store is not None:
+        sums = store.split_sums(book, at_date)
+    else:
+        sums = sum_split_quantities(book, upto=at_date)
+
+    totals = defaultdict(Decimal)
+    for (account_guid, denom), num in sums.items():
+        totals[account_guid] += to_decimal(num, denom)
+    return totals
+
+
+def load_flow_totals(book: piecash.Book, start_date: date, end_date: date,
+                     account_types: Iterable[str]) -> Dict[str, Tuple[str, str, Decimal]]:
+    """
+    Sum absolute split values per account for transactions posted in a date range.
+
+    The date range and account type filters are applied in SQL, so only the
+    splits of the requested period are read (or in the session's split frame,
+    when it has one).
+
+    Args:
+        book: An opened piecash Book object
+        start_date: First posting date included
+        end_date: Last posting date included
+        account_types: Account types to include (e.g. INCOME, EXPENSE)
+
+    Returns:
+        Dictionary of account guid -> (account name, account type, total)
+    """
+    frame = _report_frame(book)
+    if frame is not None:
+        return frame.flow_totals(start_date, end_date, account_types)
+
+    query = book.session.query(
+        Split.account_guid,
+        Account.name,
+        Account.type,
+        Split._value_denom,
+        func.sum(func.abs(Split._value_num)),
+    ).join(
+        Transaction, Split.transaction_guid == Transaction.guid
+    ).join(
+        Account, Split.account_guid == Account.guid
+    ).filter(
+        Transaction._post_date >= day_start(start_date),
+        Transaction._post_date < day_start(end_date + timedelta(days=1)),
+        Account.type.in_(list(account_types)),
+    ).group_by(Split.account_guid, Account.name, Account.type, Split._value_denom)
+
+    totals = {}
+    for account_guid, name, account_type, denom, num in query:
+        _, _, total = totals.get(account_guid, (name, account_type, Decimal('0')))
+        totals[account_guid] = (name, account_type, total + to_decimal(num, denom))
+    return totals
+
+
+def period_label(day: date, freq: str = "M") -> str:
+    """Label of the period containing day, as pandas prints periods: 2024-03, 2024Q1, 2024."""
+    if freq == "M":
+        return f"{day.year}-{day.month:02d}"
+    if freq == "Q":
+        return f"{day.year}Q{(day.month - 1) // 3 + 1}"
+    if freq == "Y":
+        return str(day.year)
+    raise ValueError(f"Unknown period frequency: {freq}")
+
+
+def load_period_flow_totals(book: piecash.Book, start_date: date, end_date: date,
+                            account_types: Iterable[str], freq: str = "M") -> Dict[Tuple[str, str], Decimal]:
+    """
+    Sum absolute split values per (period, account) for a date range in one pass.
+
+    The splits of the range are aggregated per account and posting day in SQL and
+    the days are bucketed into periods here (or grouped in the session's split
+    frame, when it has one).
+
+    Args:
+        book: An opened piecash Book object
+        start_date: First posting date included
+        end_date: Last posting date included
+        account_types: Account types to include (e.g. INCOME, EXPENSE)
+        freq: M (months), Q (quarters) or Y (years)
+
+    Returns:
+        Dictionary of (period label, account guid) -> total
+    """
+    frame = _report_frame(book)
+    if frame is not None:
+        return frame.period_flow_totals(start_date, end_date, account_types, freq)
+
+    query = book.session.query(
+        Split.account_guid,
+        Transaction._post_date,
+        Split._value_denom,
+        func.sum(func.abs(Split._value_num)),
+    ).join(
+        Transaction, Split.transaction_guid == Transaction.guid
+    ).join(
+        Account, Split.account_guid == Account.guid
+    ).filter(
+        Transaction._post_date >= day_start(start_date),
+        Transaction._post_date < day_start(end_date + timedelta(days=1)),
+        Account.type.in_(list(account_types)),
+    ).group_by(Split.account_guid, Transaction._post_date, Split._value_denom)
+
+    totals = defaultdict(Decimal)
+    for account_guid, post_date, denom, num in query:
+        totals[(period_label(post_date, freq), account_guid)] += to_decimal(num, denom)
+    return dict(totals)
+
+
+class AccountBalances:
+    """
+    Balances of every account in a book, computed in one pass over the splits table.
+
+    Own balances come from :func:`load_split_totals`; rolled-up balances are
+    derived in memory by walking the parent tree, following the same rules as
+    piecash's ``Account.get_balance`` (children converted to the parent's
+    commodity, natural sign applied on the requested account only). Conversions
+    use the price as of ``at_date`` (latest price when no date is given).
+    """
+
+    def __init__(self, book: piecash.Book, at_date: Optional[date] = None):
+        self.book = book
+        self.accounts: List[Account] = list(book.accounts)
+        self.by_guid: Dict[str, Account] = {acc.guid: acc for acc in self.accounts}
+        self.children: Dict[str, List[Account]] = defaultdict(list)
+        for acc in self.accounts:
+            if acc.parent_guid:
+                self.children[acc.parent_guid].append(acc)
+        self.at_date = at_date
+        self.own = load_split_totals(book, at_date)
+        self.prices = price_history(book)
+        self._rolled: Dict[Tuple[str, str], Decimal] = {}
+        self._factors: Dict[Tuple[str, str], Decimal] = {}
+
+    def _factor(self, account: Account, commodity) -> Decimal:
+        """Conversion factor from the account's commodity to commodity."""
+        key = (account.commodity_guid, commodity.guid)
+        if key not in self._factors:
+            convert = self.prices.conversion
+            try:
+                factor = convert(account.commodity, commodity, self.at_date)
+            except GncConversionError:
+                parent = self.by_guid[account.parent_guid]
+                factor = (convert(account.commodity, parent.commodity, self.at_date) *
+                          convert(parent.commodity, commodity, self.at_date))
+            self._factors[key] = factor
+        return self._factors[key]
+
+    def _rolled_balance(self, account: Account, commodity) -> Decimal:
+        key = (account.guid, commodity.guid)
+        if key in self._rolled:
+            return self._rolled[key]
+
+        balance = self.own.get(account.guid, Decimal('0'))
+        if balance and account.commodity_guid != commodity.guid:
+            balance = balance * self._factor(account, commodity)
+        for child in self.children.get(account.guid, ()):
+            balance += self._rolled_balance(child, commodity)
+
+        self._rolled[key] = balance
+        return balance
+
+    def get_balance(self, account: Account, recurse: bool = True, natural_sign: bool = True) -> Decimal:
+        """
+        Balance of an account, equivalent to ``account.get_balance()``.
+
+        Args:
+            account: Account of the book the balances were computed for
+            recurse: Include children accounts (default True)
+            natural_sign: Reverse the sign for credit-natured account types (default True)
+
+        Returns:
+            Balance expressed in the account's commodity
+        """
+        if recurse:
+            balance = self._rolled_balance(account, account.commodity)
+        else:
+            balance = self.own.get(account.guid, Decimal('0'))
+        if natural_sign:
+            balance = balance * account.sign
+        # Like piecash, zero balances of credit accounts are 0, not -0
+        return balance if balance else balance.copy_abs()
@@ -0,0 +1,254 @@
+"""
+Benchmark suite: times the main tools on synthetic books of increasing size and
+records the results as JSON, so runs before and after a change can be compared.
+
+    python benchmarks.py --sizes 1k,100k --output bench.json
+    python benchmarks.py --sizes 1k,100k --output new.json --compare bench.json
+"""
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')  # the agent is built at import, never called
+
+import gnucash_cli as cli
+from executor import READ, tool_executor
+from synthetic_book import generate_book, parse_size
+
+log = logging.getLogger(__name__)
+
+# Book shape per size (splits); transactions are derived from the split count
+SIZES = {
+    "1k": dict(accounts=50, depth=3, splits_per_transaction=2, stocks=5, price_days=365, backups=50),
+    "100k": dict(accounts=200, depth=3, splits_per_transaction=2, stocks=20, price_days=3 * 365, backups=500),
+    "1M": dict(accounts=1000, depth=4, splits_per_transaction=2, stocks=50, price_days=5 * 365, backups=5000),
+}
+# A best time this much slower than the baseline is reported as a regression
+REGRESSION_THRESHOLD = 1.10
+
+SAMPLE_YAML = Path(__file__).resolve().parent / "SampleAccounts.yaml"
+
+
+def _size_shape(size: str) -> dict:
+    if size in SIZES:
+        return dict(SIZES[size])
+    # Any other size gets the shape of the nearest smaller preset
+    splits = parse_size(size)
+    preset = max((s for s in SIZES if parse_size(s) <= splits), key=parse_size, default="1k")
+    return dict(SIZES[preset])
+
+
+def ensure_book(workdir: Path, size: str, regenerate: bool = False, seed: int = 0) -> Path:
+    """Generate the synthetic book of a size, unless it is already in workdir."""
+    path = workdir / f"synthetic_{size}.gnucash"
+    if path.exists() and not regenerate:
+        return path
+    shape = _size_shape(size)
+    shape.pop("backups")
+    print(f"Generating {path.name} ...", file=sys.stderr)
+    transactions = max(1, parse_size(size) // shape["splits_per_transaction"])
+    stats = generate_book(str(path), transactions=transactions, seed=seed, **shape)
+    print(f"  {stats}", file=sys.stderr)
+    return path
+
+
+def _make_backups(workdir: Path, book: Path, count: int):
+    """Empty GnuCash-style backup files: half recent, half old enough to move or delete."""
+    backups = workdir / "backups"
+    backups.mkdir(exist_ok=True)
+    now = datetime.now()
+    for i in range(count):
+        if i % 2:
+            stamp, folder = now - timedelta(seconds=i), workdir
+        else:
+            stamp, folder = now - timedelta(days=3, seconds=i), backups if i % 4 else workdir
+        (folder / f"{book.stem}.{stamp:%Y%m%d%H%M%S}.gnucash").touch()
+
+
+def _clear_backups(workdir: Path, book: Path):
+    for folder in (workdir, workdir / "backups"):
+        for path in folder.glob(f"{book.stem}.*.gnucash"):
+            path.unlink()
+
+
+class Case:
+    """A timed tool call, with optional untimed setup before each run."""
+
+    def __init__(self, name, call, setup=None):
+        self.name = name
+        self.call = call
+        self.setup = setup
+
+
+def _cases(workdir: Path, book: Path, backups: int):
+    today = date.today()
+    year_ago = (today - timedelta(days=365)).isoformat()
+    scratch = workdir / f"{book.stem}-import.gnucash"
+    scheduler = cli.BackupScheduler()
+
+    async def open_scratch():
+        shutil.copyfile(book, scratch)
+        await cli.open_book(None, str(scratch))
+
+    async def import_yaml():
+        try:
+            return await cli.create_accounts_from_file(None, str(SAMPLE_YAML))
+        finally:
+            await cli.open_book(None, str(book))
+            # The import backs the scratch book up first
+            for path in workdir.glob(f"{scratch.name}*"):
+                path.unlink()
+
+    async def reset_backups():
+        _clear_backups(workdir, book)
+        _make_backups(workdir, book, backups)
+
+    return [
+        Case("list_accounts", lambda: cli.list_accounts(None)),
+        Case("search_accounts", lambda: cli.search_accounts(None, "account 1")),
+        Case("list_transactions", lambda: cli.list_transactions(None, 50)),
+        Case("cashflow_statement", lambda: cli.generate_cashflow_statement(None, year_ago, today.isoformat())),
+        Case("cashflow_trend", lambda: cli.generate_cashflow_statement(None, period="month")),
+        Case("balance_sheet", lambda: cli.generate_balance_sheet(None)),
+        Case("export_reports_pdf", lambda: cli.export_reports_pdf(None, str(workdir / "benchmark.pdf"))),
+        Case("yaml_import", import_yaml, setup=open_scratch),
+        Case("backup_sweep", lambda: tool_executor.run(READ, scheduler.sweep_old_backups), setup=reset_backups),
+    ]
+
+
+async def _time_case(case: Case, repeat: int) -> dict:
+    times = []
+    error = None
+    for _ in range(repeat):
+        with redirect_stdout(io.StringIO()):
+            if case.setup:
+                await case.setup()
+            started = time.perf_counter()
+            result = await case.call()
+            times.append((time.perf_counter() - started) * 1000)
+        if isinstance(result, str) and "error" in result.lower() and error is None:
+            error = result.strip().splitlines()[0]
+    timing = {
+        "first_ms": round(times[0], 2),
+        "best_ms": round(min(times), 2),
+        "median_ms": round(statistics.median(times), 2),
+        "runs": repeat,
+    }
+    if error:
+        timing["error"] = error
+    return timing
+
+
+async def run_size(workdir: Path, size: str, repeat: int, only=None, regenerate: bool = False) -> dict:
+    """Time every case on the book of one size."""
+    book = ensure_book(workdir, size, regenerate)
+    with redirect_stdout(io.StringIO()):
+        result = await cli.open_book(None, str(book))
+    if "Error" in result:
+        raise RuntimeError(result)
+    cases = {}
+    for case in _cases(workdir, book, _size_shape(size)["backups"]):
+        if only and case.name not in only:
+            continue
+        cases[case.name] = timing = await _time_case(case, repeat)
+        flag = f"  {timing['error']}" if "error" in timing else ""
+        print(f"  {case.name:<22}{timing['first_ms']:>10.1f}{timing['best_ms']:>10.1f}"
+              f"{timing['median_ms']:>10.1f} ms{flag}")
+    _clear_backups(workdir, book)
+    return {"book": book.name, "bytes": book.stat().st_size, "cases": cases}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float = REGRESSION_THRESHOLD) -> int:
+    """
+    Print best-time ratios of current against baseline results.
+
+    Returns:
+        int: Number of cases slower than the baseline by more than the threshold
+    """
+    regressions = 0
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}):")
+    for size, results in current["results"].items():
+        old_cases = baseline["results"].get(size, {}).get("cases", {})
+        for name, timing in results["cases"].items():
+            if name not in old_cases:
+                continue
+            old, new = old_cases[name]["best_ms"], timing["best_ms"]
+            ratio = new / old if old else float("inf")
+            slower = ratio > threshold
+            regressions += slower
+            print(f"  {size:>5} {name:<22}{old:>10.1f}{new:>10.1f} ms  x{ratio:.2f}"
+                  + ("  REGRESSION" if slower else ""))
+    return regressions
+
+
+async def main(args) -> int:
+    workdir = Path(args.workdir).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    output = Path(args.output).resolve() if args.output else None
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    only = set(args.cases.split(",")) if args.cases else None
+
+    # Tools create files (PDFs, backups/) relative to the working directory
+    os.chdir(workdir)
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "workers": tool_executor.max_workers,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    try:
+        for size in args.sizes.split(","):
+            print(f"{size} splits:{'first':>20}{'best':>10}{'median':>10}")
+            report["results"][size] = await run_size(workdir, size, args.repeat, only, args.regenerate)
+    finally:
+        tool_executor.shutdown()
+
+    if output:
+        output.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nResults written to {output}")
+    if baseline:
+        regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"{regressions} case(s) regressed by more than {(args.threshold - 1) * 100:.0f}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the GnuCash CLI tools on synthetic books")
+    parser.add_argument("--sizes", default="1k,100k,1M", help="Book sizes in splits (default: 1k,100k,1M)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case (default: 3)")
+    parser.add_argument("--cases", help="Comma-separated case names to run (default: all)")
+    parser.add_argument("--workdir", default="benchmark_books", help="Where books and scratch files go")
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate books that already exist")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Best-time ratio reported as a regression (default: 1.10)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,11 +1,17 @@
 from datetime import datetime
 from decimal import Decimal
 import json
-from typing import Dict, List, Optional, Union, Set
+import time
+from typing import Dict, List, Optional, Union
 import piecash
+from piecash._common import GncConversionError
 from tabulate import tabulate
 from collections import defaultdict
 
+from balances import load_split_totals
+from metrics import tool_metrics
+from prices import price_history
+
 def calculate_balance_sheet(book: Union[str, piecash.Book], date: Optional[datetime] = None) -> dict:
     """
     Calculate a comprehensive balance sheet from a GnuCash book.
@@ -22,7 +28,9 @@ def calculate_balance_sheet(book: Union[str, piecash.Book], date: Optional[datet
 
     # Handle string path vs Book object
     if isinstance(book, str):
+        opened = time.perf_counter()
         book_obj = piecash.open_book(book, open_if_lock=True)
+        tool_metrics.add_open_time(time.perf_counter() - opened)
         should_close = True
     else:
         book_obj = book
@@ -46,103 +54,97 @@ def calculate_balance_sheet(book: Union[str, piecash.Book], date: Optional[datet
         except Exception as e:
             print(f"Warning: Could not determine book currency: {str(e)}")
 
-        def get_latest_price(commodity) -> Decimal:
-            """Helper function to get latest stock price"""
+        # Sorted price series per commodity; prices are taken as of the balance sheet date
+        prices = price_history(book_obj)
+
+        def get_price(commodity) -> Decimal:
+            """Helper function to get the stock/currency price in book currency as of the date"""
             try:
-                if not commodity.prices:
-                    return Decimal('0')
-                latest_price = max(commodity.prices, key=lambda p: p.date)
-                return Decimal(str(latest_price.value))
-            except Exception as e:
-                print(f"Warning: Could not get price for {commodity.mnemonic}: {str(e)}")
+                return prices.conversion(commodity, book_obj.default_currency, date)
+            except GncConversionError:
                 return Decimal('0')
 
-        def calculate_account_balance(account, at_date, processed_accounts: Set[str]) -> Decimal:
-            """
-            Calculate account balance considering splits up to given date.
-            Handles both leaf accounts and parent accounts.
-            """
-            # Prevent double counting
-            if account.fullname in processed_accounts:
-                return Decimal('0')
+        # Own balance of every account from one aggregated query over the splits
+        split_totals = load_split_totals(book_obj, date)
 
-            processed_accounts.add(account.fullname)
+        accounts = list(book_obj.accounts)
+        by_guid = {account.guid: account for account in accounts}
+        children = defaultdict(list)
+        for account in accounts:
+            if account.parent_guid in by_guid:
+                children[account.parent_guid].append(account)
 
+        def leaf_balance(account) -> Decimal:
+            """Balance of a leaf account in book currency, from its split total."""
             try:
-                # For parent accounts, sum up child accounts
-                if account.children:
-                    balance = sum(
-                        calculate_account_balance(child, at_date, processed_accounts)
-                        for child in account.children
-                        if not child.placeholder
-                    )
-                    return balance
-
-                # For leaf accounts, calculate from splits
-                balance = Decimal('0')
-                for split in account.splits:
-                    if split.transaction.post_date and split.transaction.post_date <= at_date.date():
-                        quantity = Decimal(str(split.quantity))
-
-                        # Handle stock/mutual fund accounts
-                        if account.type in ['STOCK', 'MUTUAL']:
-                            price = get_latest_price(account.commodity)
-                            balance += quantity * price
-                        else:
-                            balance += quantity
+                quantity = split_totals.get(account.guid, Decimal('0'))
+
+                # Handle stock/mutual fund accounts
+                if account.type in ['STOCK', 'MUTUAL']:
+                    return quantity * get_price(account.commodity) if quantity else Decimal('0')
 
                 # Convert to book currency if needed
                 if (hasattr(book_obj, 'default_currency') and
-                        account.commodity != book_obj.default_currency and
-                        account.type not in ['STOCK', 'MUTUAL']):  # Skip conversion for already-valued stocks
+                        account.commodity != book_obj.default_currency):
                     try:
-                        price = get_latest_price(account.commodity)
-                        balance *= price
+                        quantity *= get_price(account.commodity)
                     except Exception as e:
                         print(f"Warning: Currency conversion failed for {account.name}: {str(e)}")
 
-                return balance
+                return quantity
 
             except Exception as e:
                 print(f"Warning: Error calculating balance for {account.name}: {str(e)}")
                 return Decimal('0')
 
-        # Track processed accounts to prevent double counting
-        processed_accounts: Set[str] = set()
-
-        # Process root accounts only
-        for account in book_obj.accounts:
+        # Single post-order traversal: parents are the sum of their non-placeholder
+        # children, leaf accounts are valued from their own splits
+        balances: Dict[str, Decimal] = {}
+        roots = [account for account in accounts if account.parent_guid not in by_guid]
+        stack = [(account, False) for account in roots]
+        while stack:
+            account, children_done = stack.pop()
+            if not children[account.guid]:
+                balances[account.guid] = leaf_balance(account)
+            elif children_done:
+                balances[account.guid] = sum(
+                    (balances[child.guid] for child in children[account.guid] if not child.placeholder),
+                    Decimal('0')
+                )
+            else:
+                stack.append((account, True))
+                stack.extend((child, False) for child in children[account.guid])
+
+        # Process top-level accounts only
+        for account in accounts:
             try:
-                # Skip if already processed or placeholder
-                if account.fullname in processed_accounts or account.placeholder:
+                if account.placeholder or account.type == 'ROOT':
                     continue
 
-                # Only process root accounts of each type
-                if not account.parent or account.parent.type == 'ROOT':
-                    # Determine account type category
-                    if account.type in ['ASSET', 'BANK', 'CASH', 'STOCK', 'MUTUAL']:
-                        category = "assets"
-                    elif account.type in ['LIABILITY', 'CREDIT', 'PAYABLE']:
-                        category = "liabilities"
-                    elif account.type in ['EQUITY']:
-                        category = "equity"
-                    else:
-                        continue
-
-                    # Calculate balance including all children
-                    balance = calculate_account_balance(account, date, processed_accounts)
-
-                    # Add to appropriate category if balance is non-zero
-                    if balance != 0:
-                        parent_name = account.name
-                        balance_sheet[category][parent_name]["Total"] = float(balance)
-
-                        # Add individual child accounts if they exist
-                        for child in account.children:
-                            if not child.placeholder and child.fullname in processed_accounts:
-                                child_balance = calculate_account_balance(child, date, set())  # New set to allow recalculation
-                                if child_balance != 0:
-                                    balance_sheet[category][parent_name][child.name] = float(child_balance)
+                parent = by_guid.get(account.parent_guid)
+                if parent is not None and parent.type != 'ROOT':
+                    continue
+
+                # Determine account type category
+                if account.type in ['ASSET', 'BANK', 'CASH', 'STOCK', 'MUTUAL']:
+                    category = "assets"
+                elif account.type in ['LIABILITY', 'CREDIT', 'PAYABLE']:
+                    category = "liabilities"
+                elif account.type in ['EQUITY']:
+                    category = "equity"
+                else:
+                    continue
+
+                # Add to appropriate category if balance is non-zero
+                balance = balances[account.guid]
+                if balance != 0:
+                    parent_name = account.name
+                    balance_sheet[category][parent_name]["Total"] = float(balance)
+
+                    # Add individual child accounts if they exist
+                    for child in children[account.guid]:
+                        if not child.placeholder and balances[child.guid] != 0:
+                            balance_sheet[category][parent_name][child.name] = float(balances[child.guid])
 
             except Exception as e:
                 print(f"Warning: Error processing account {account.name}: {str(e)}")
@@ -240,19 +242,20 @@ def render_balance_sheet(balance_sheet: Dict) -> str:
     header = f"Balance Sheet as of {balance_sheet['metadata']['date']}\n"
     return header + table
 
-def generate_balance_sheet(book_path: str, as_of_date: Optional[datetime] = None) -> tuple[dict, str]:
+@tool_metrics.measured(name="bs.generate_balance_sheet")
+def generate_balance_sheet(book: Union[str, piecash.Book], as_of_date: Optional[datetime] = None) -> tuple[dict, str]:
     """
     Generate both JSON and table format balance sheets.
 
     Args:
-        book_path: Path to GnuCash book
+        book: Either a path to GnuCash book (str) or an opened piecash Book object
         as_of_date: Optional date for balance sheet
 
     Returns:
         Tuple of (balance sheet dict, formatted table string)
     """
     try:
-        balance_sheet = calculate_balance_sheet(book_path, as_of_date)
+        balance_sheet = calculate_balance_sheet(book, as_of_date)
         table = render_balance_sheet(balance_sheet)
         return balance_sheet, table
     except Exception as e:
@@ -0,0 +1,156 @@
+import csv
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import piecash
+from colorama import Fore
+
+from balances import load_period_flow_totals, period_label
+
+PERIODS = {"month": "M", "quarter": "Q", "year": "Y"}
+SECTIONS = [("INCOME", "Income"), ("EXPENSE", "Expenses")]
+
+
+def _period_start(day: date, freq: str) -> date:
+    if freq == "M":
+        return day.replace(day=1)
+    if freq == "Q":
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def period_buckets(end_date: date, freq: str, periods: int = 12,
+                   start_date: Optional[date] = None) -> List[Tuple[str, date, date]]:
+    """
+    Consecutive periods ending with the one that contains end_date, oldest first.
+
+    Args:
+        end_date: Last day included (the last period is cut at this date)
+        freq: M, Q or Y
+        periods: Number of periods, when start_date is not given
+        start_date: First day included (the first period is cut at this date)
+
+    Returns:
+        List of (period label, first day, last day)
+    """
+    buckets = []
+    last = end_date
+    while True:
+        first = _period_start(last, freq)
+        if start_date is not None:
+            if last < start_date:
+                break
+            first = max(first, start_date)
+        elif len(buckets) == periods:
+            break
+        buckets.append((period_label(last, freq), first, last))
+        last = first - timedelta(days=1)
+    buckets.reverse()
+    return buckets
+
+
+class CashFlowTrend:
+    """
+    Income and expense flows per period, rolled up through the account hierarchy.
+
+    All periods come from one aggregated pass over the splits of the whole range
+    (see :func:`balances.load_period_flow_totals`). Amounts follow the cash flow
+    statement: absolute split values in transaction currency.
+    """
+
+    def __init__(self, book: piecash.Book, period: str = "month", periods: int = 12,
+                 end_date: Optional[date] = None, start_date: Optional[date] = None):
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period '{period}', use one of: {', '.join(PERIODS)}")
+        freq = PERIODS[period]
+        self.period = period
+        self.currency = book.default_currency.mnemonic
+        self.buckets = period_buckets(end_date or date.today(), freq, periods, start_date)
+        self.labels = [label for label, _, _ in self.buckets]
+        flows = load_period_flow_totals(book, self.buckets[0][1], self.buckets[-1][2],
+                                        [account_type for account_type, _ in SECTIONS], freq)
+
+        self.accounts = {account.guid: account for account in book.accounts}
+        self.children = defaultdict(list)
+        for account in self.accounts.values():
+            self.children[account.parent_guid].append(account)
+
+        # Each account's flows include its sub-accounts of the same type
+        self.rolled: Dict[str, Dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+        for (label, guid), amount in flows.items():
+            account = self.accounts.get(guid)
+            account_type = account.type if account is not None else None
+            while account is not None and account.type == account_type:
+                self.rolled[account.guid][label] += amount
+                account = self.accounts.get(account.parent_guid)
+
+    def _top_level(self, account_type: str) -> List[piecash.Account]:
+        return sorted((account for account in self.accounts.values()
+                       if account.type == account_type and account.guid in self.rolled and
+                       getattr(self.accounts.get(account.parent_guid), "type", None) != account_type),
+                      key=lambda account: account.name)
+
+    def _walk(self, account, depth: int):
+        yield depth, account
+        for child in sorted(self.children.get(account.guid, ()), key=lambda a: a.name):
+            if child.type == account.type and child.guid in self.rolled:
+                yield from self._walk(child, depth + 1)
+
+    def section_totals(self, account_type: str) -> List[Decimal]:
+        tops = self._top_level(account_type)
+        return [sum((self.rolled[a.guid][label] for a in tops), Decimal('0')) for label in self.labels]
+
+    def rows(self) -> List[Tuple[str, int, List[Decimal]]]:
+        """
+        Report rows: (label, depth, amounts per period + total). Section headers and
+        section/net totals have depth -1.
+        """
+        rows = []
+        totals = {}
+        for account_type, title in SECTIONS:
+            rows.append((title, -1, []))
+            for account in self._top_level(account_type):
+                for depth, sub in self._walk(account, 0):
+                    amounts = [self.rolled[sub.guid][label] for label in self.labels]
+                    rows.append((sub.name, depth, amounts + [sum(amounts, Decimal('0'))]))
+            totals[account_type] = self.section_totals(account_type)
+            rows.append((f"Total {title}", -1, totals[account_type] + [sum(totals[account_type], Decimal('0'))]))
+        net = [income - expense for income, expense in zip(totals["INCOME"], totals["EXPENSE"])]
+        rows.append(("Net Cash Flow", -1, net + [sum(net, Decimal('0'))]))
+        return rows
+
+    def table_data(self, decimals: int = 2) -> List[List[str]]:
+        """Header and rows as strings, accounts indented by depth."""
+        data = [["Account"] + self.labels + ["Total"]]
+        for name, depth, amounts in self.rows():
+            label = ("  " * (depth + 1) + name) if depth >= 0 else name
+            cells = [f"{amount:,.{decimals}f}" for amount in amounts] or [""] * (len(self.labels) + 1)
+            data.append([label] + cells)
+        return data
+
+    def render(self) -> str:
+        """Console table of the trend."""
+        data = self.table_data()
+        widths = [max(len(row[i]) for row in data) for i in range(len(data[0]))]
+        first, last = self.buckets[0][1], self.buckets[-1][2]
+        lines = [Fore.CYAN + f"Cash Flow Trend by {self.period} ({self.currency}), {first} to {last}" + Fore.RESET]
+        for index, row in enumerate(data):
+            line = "  ".join([row[0].ljust(widths[0])] + [cell.rjust(w) for cell, w in zip(row[1:], widths[1:])])
+            lines.append(line.rstrip())
+            if index == 0:
+                lines.append("-" * len(line))
+        return "\n".join(lines)
+
+    def write_csv(self, path: str):
+        """Write the trend as CSV: section, account, depth, one column per period, total."""
+        section = ""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Section", "Account", "Depth"] + self.labels + ["Total"])
+            for name, depth, amounts in self.rows():
+                if depth < 0 and not amounts:
+                    section = name
+                    continue
+                writer.writerow([section, name, depth if depth >= 0 else ""] + [str(amount) for amount in amounts])
@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import piecash
+from piecash import Split, Transaction
+from piecash.sa_extra import _DateTime
+from sqlalchemy import event, func, literal
+from sqlalchemy.orm.attributes import get_history
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_SUFFIX = ".checkpoints"
+
+# session.info key: first post date touched by flushed but uncommitted changes
+PENDING_FROM = "checkpoints_pending_from"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS periods (period_end TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    period_end TEXT NOT NULL,
+    account_guid TEXT NOT NULL,
+    denom INTEGER NOT NULL,
+    num INTEGER NOT NULL,
+    PRIMARY KEY (period_end, account_guid, denom)
+);
+"""
+
+# (account guid, quantity denominator) -> sum of quantity numerators
+SplitSums = Dict[Tuple[str, int], int]
+
+
+def file_signature(path):
+    """Return a cheap fingerprint of the book file used to detect changes on disk."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def day_start(day: date):
+    """
+    SQL bound for the first instant of a posting day, to compare post dates with.
+
+    piecash stores post dates as UTC timestamps (10:59 for the dates it writes, other
+    times of day for books written by GnuCash desktop or imported) and reads them back
+    as the date in the local timezone. Bounds at local midnight select the same days
+    (``>= day_start(first)``, ``< day_start(last + 1 day)``) whatever the stored time.
+    """
+    return literal(datetime.combine(day, time()), _DateTime())
+
+
+def sum_split_quantities(book: piecash.Book, after: Optional[date] = None,
+                         upto: Optional[date] = None) -> SplitSums:
+    """
+    Sum split quantity numerators per (account, denominator) in one aggregated query.
+
+    Args:
+        book: An opened piecash Book object
+        after: Only splits posted after this date
+        upto: Only splits posted on or before this date
+
+    Returns:
+        Dictionary of (account guid, denominator) -> summed numerator
+    """
+    query = book.session.query(
+        Split.account_guid,
+        Split._quantity_denom,
+        func.sum(Split._quantity_num),
+    )
+    if after is not None or upto is not None:
+        query = query.join(Transaction, Split.transaction_guid == Transaction.guid)
+        if after is not None:
+            query = query.filter(Transaction._post_date >= day_start(after + timedelta(days=1)))
+        if upto is not None:
+            query = query.filter(Transaction._post_date < day_start(upto + timedelta(days=1)))
+    query = query.group_by(Split.account_guid, Split._quantity_denom)
+    return {(account_guid, denom): num for account_guid, denom, num in query}
+
+
+def period_end(day: date) -> date:
+    """Checkpoint date used for balances as of day: the end of the previous month."""
+    return day.replace(day=1) - timedelta(days=1)
+
+
+def _add(sums: SplitSums, more: SplitSums) -> SplitSums:
+    for key, num in more.items():
+        sums[key] = sums.get(key, 0) + num
+    return sums
+
+
+class CheckpointStore:
+    """
+    Per-account cumulative split totals at month ends, kept in a SQLite file next to
+    the book (``<book>.checkpoints``).
+
+    Balances as of a date are the checkpoint of the previous month end plus the
+    splits posted since, so only the current month's splits are read from the book.
+    Missing checkpoints are built on demand from the latest earlier one.
+
+    Commits through a watched session (see :func:`watch_session`) drop the
+    checkpoints at or after the earliest post date they touched; splits posted after
+    the last checkpoint (the usual case) leave every checkpoint valid. Any other
+    change of the book file (GnuCash, a restore) drops all checkpoints.
+    """
+
+    def __init__(self, book_path: str):
+        self.book_path = book_path
+        self.path = book_path + CHECKPOINT_SUFFIX
+        self._lock = threading.Lock()
+        self._ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        if not self._ready:
+            with self._lock:
+                db.executescript(SCHEMA)
+                self._ready = True
+        return db
+
+    @staticmethod
+    def _meta(db, key, default=None):
+        row = db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    @staticmethod
+    def _set_meta(db, key, value):
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _check_signature(self, db, signature) -> int:
+        """Drop everything if the book changed behind our back; returns the generation."""
+        known = self._meta(db, "signature")
+        generation = self._meta(db, "generation", 0)
+        if known is None or tuple(known) != signature:
+            log.debug(f"Book changed outside of the checkpoint hooks, dropping checkpoints: {self.book_path}")
+            generation += 1
+            db.execute("DELETE FROM checkpoints")
+            db.execute("DELETE FROM periods")
+            self._set_meta(db, "signature", signature)
+            self._set_meta(db, "generation", generation)
+        return generation
+
+    def _load(self, db, day: date) -> SplitSums:
+        rows = db.execute("SELECT account_guid, denom, num FROM checkpoints WHERE period_end = ?",
+                          (day.isoformat(),))
+        return {(account_guid, denom): num for account_guid, denom, num in rows}
+
+    def split_sums(self, book: piecash.Book, at_date: Optional[date] = None) -> SplitSums:
+        """
+        Split quantity sums per (account, denominator), from a checkpoint plus the
+        splits posted after it.
+
+        Args:
+            book: An opened piecash Book object on this store's book file
+            at_date: Only splits posted on or before this date (default: all splits)
+
+        Returns:
+            Same result as ``sum_split_quantities(book, upto=at_date)``
+        """
+        target = period_end(at_date or date.today())
+        pending = pending_from(book.session)
+        if pending is not None and pending <= target:
+            # Uncommitted back-dated changes (batch mode): checkpoints do not include them
+            return sum_split_quantities(book, upto=at_date)
+        # Checkpoints built from uncommitted state are not saved
+        clean = pending is None
+
+        signature = file_signature(self.book_path)
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                generation = self._check_signature(db, signature)
+                row = db.execute("SELECT max(period_end) FROM periods WHERE period_end <= ?",
+                                 (target.isoformat(),)).fetchone()
+                base = date.fromisoformat(row[0]) if row[0] else None
+                sums = self._load(db, base) if base else {}
+            finally:
+                db.execute("COMMIT")
+
+        if base != target:
+            # Build the missing checkpoint from the latest earlier one
+            _add(sums, sum_split_quantities(book, after=base, upto=target))
+            if clean:
+                self._store(target, sums, generation, signature)
+            base = target
+        return _add(dict(sums), sum_split_quantities(book, after=base, upto=at_date))
+
+    def _store(self, day: date, sums: SplitSums, generation: int, signature):
+        """Save a checkpoint unless the book changed while it was being computed."""
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if (self._meta(db, "generation", 0) != generation or
+                        file_signature(self.book_path) != signature):
+                    log.debug(f"Book changed while building checkpoint {day}, not saving it")
+                    return
+                db.execute("DELETE FROM checkpoints WHERE period_end = ?", (day.isoformat(),))
+                db.executemany(
+                    "INSERT INTO checkpoints (period_end, account_guid, denom, num) VALUES (?, ?, ?, ?)",
+                    [(day.isoformat(), account_guid, denom, num) for (account_guid, denom), num in sums.items()]
+                )
+                db.execute("INSERT OR REPLACE INTO periods (period_end) VALUES (?)", (day.isoformat(),))
+                log.debug(f"Saved balance checkpoint {day} ({len(sums)} rows): {self.path}")
+            finally:
+                db.execute("COMMIT")
+
+    def committed(self, changed_from: Optional[date]):
+        """
+        Record a commit of the book by a watched session.
+
+        Args:
+            changed_from: Earliest post date the commit touched (None: no splits changed)
+        """
+        if not os.path.exists(self.path):
+            # No checkpoints yet, nothing to keep in step
+            return
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if changed_from is not None:
+                    # Stored and ORM post dates can be a day apart for non-neutral times
+                    cutoff = max(changed_from, date.min + timedelta(days=1)) - timedelta(days=1)
+                    cutoff = cutoff.isoformat()
+                    dropped = db.execute("DELETE FROM periods WHERE period_end >= ?", (cutoff,)).rowcount
+                    if dropped:
+                        log.debug(f"Back-dated change on {changed_from}, dropped {dropped} checkpoint(s)")
+                        db.execute("DELETE FROM checkpoints WHERE period_end >= ?", (cutoff,))
+                        self._set_meta(db, "generation", self._meta(db, "generation", 0) + 1)
+                known = self._meta(db, "signature")
+                if known is not None:
+                    # Keep the checkpoints that are still valid for the new file
+                    self._set_meta(db, "signature", file_signature(self.book_path))
+            finally:
+                db.execute("COMMIT")
+
+
+_stores: Dict[str, CheckpointStore] = {}
+_stores_lock = threading.Lock()
+
+
+def _book_path(book) -> Optional[str]:
+    bind = book.session.bind
+    url = getattr(bind, "url", None)
+    if url is None or url.get_backend_name() != "sqlite" or not url.database:
+        return None
+    return os.path.abspath(url.database)
+
+
+def checkpoint_store(book) -> Optional[CheckpointStore]:
+    """Checkpoint store of a book, or None when the book is not a SQLite file."""
+    if os.getenv("GC_CLI_CHECKPOINTS", "1") == "0":
+        return None
+    path = _book_path(book)
+    if path is None:
+        return None
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CheckpointStore(path)
+        return _stores[path]
+
+
+def _post_dates(objects: Iterable) -> Iterable[date]:
+    """Post dates touched by changed splits and transactions, including previous ones."""
+    for obj in objects:
+        if isinstance(obj, Split):
+            transaction = obj.transaction
+            if transaction is not None and transaction.post_date is not None:
+                yield transaction.post_date
+            previous = get_history(obj, "transaction").deleted
+            for transaction in previous or ():
+                if transaction is not None and transaction.post_date is not None:
+                    yield transaction.post_date
+        elif isinstance(obj, Transaction):
+            if obj.post_date is not None:
+                yield obj.post_date
+            for value in get_history(obj, "_post_date").deleted or ():
+                if value is not None:
+                    yield value.date() if isinstance(value, datetime) else value
+
+
+def _earliest(session, objects) -> Optional[date]:
+    dates = list(_post_dates(objects))
+    known = session.info.get(PENDING_FROM)
+    if known is not None:
+        dates.append(known)
+    return min(dates) if dates else None
+
+
+def pending_from(session) -> Optional[date]:
+    """Earliest post date touched by changes of the session that are not committed yet."""
+    if not (session.new or session.dirty or session.deleted):
+        return session.info.get(PENDING_FROM)
+    return _earliest(session, list(session.new) + list(session.dirty) + list(session.deleted))
+
+
+def note_change(session, day: date):
+    """Record a change posted on `day` made without the ORM (e.g. a bulk insert of splits)."""
+    known = session.info.get(PENDING_FROM)
+    session.info[PENDING_FROM] = day if known is None else min(known, day)
+
+
+def watch_session(book: piecash.Book):
+    """Keep the book's checkpoints in step with the commits of this (read-write) session."""
+    store = checkpoint_store(book)
+    if store is None:
+        return
+    session = book.session
+
+    @event.listens_for(session, "before_flush")
+    def _before_flush(session, flush_context, instances):
+        changed = list(session.new) + list(session.dirty) + list(session.deleted)
+        if any(isinstance(obj, (Split, Transaction)) for obj in changed):
+            session.info[PENDING_FROM] = _earliest(session, changed) or date.min
+
+    @event.listens_for(session, "after_commit")
+    def _after_commit(session):
+        changed_from = session.info.pop(PENDING_FROM, None)
+        try:
+            store.committed(changed_from)
+        except sqlite3.Error as e:
+            log.error(f"Could not update balance checkpoints: {e}")
+
+    @event.listens_for(session, "after_rollback")
+    def _after_rollback(session):
+        session.info.pop(PENDING_FROM, None)
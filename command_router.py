@@ -0,0 +1,192 @@
+import inspect
+import json
+import logging
+import shlex
+import time
+import typing
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+TRUE_WORDS = ("true", "yes", "y", "1", "on")
+FALSE_WORDS = ("false", "no", "n", "0", "off")
+
+
+class CommandError(ValueError):
+    """A line names a tool but its arguments do not fit the tool's signature."""
+
+
+def agent_tools(agent) -> Dict[str, Any]:
+    """Registered function tools of an agent, keyed by tool name."""
+    tools = getattr(agent, "_function_tools", None)
+    if tools is None:
+        # Newer pydantic-ai keeps them in a toolset
+        tools = agent._function_toolset.tools
+    return tools
+
+
+def _unwrap_optional(annotation):
+    """Optional[X] / Union[X, None] -> X."""
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _convert(value: str, annotation, name: str):
+    """Convert a command-line token to the type a tool parameter is annotated with."""
+    annotation = _unwrap_optional(annotation)
+    try:
+        if annotation is bool:
+            lowered = value.lower()
+            if lowered in TRUE_WORDS:
+                return True
+            if lowered in FALSE_WORDS:
+                return False
+            raise ValueError(f"'{value}' is not a yes/no value")
+        if annotation is int:
+            return int(value)
+        if annotation is float:
+            return float(value)
+        if annotation is Decimal:
+            return Decimal(value)
+        if annotation in (list, dict) or typing.get_origin(annotation) in (list, dict):
+            return json.loads(value)
+    except (ValueError, InvalidOperation) as e:
+        raise CommandError(f"{name}: {e}")
+    return value
+
+
+class CommandRouter:
+    """
+    Runs exact tool invocations locally, without a model round-trip.
+
+    A line is routed when its first word is the name of a registered tool and the
+    rest fits the tool signature (documented syntax, e.g. ``list_transactions 20``,
+    ``transfer_funds Assets:Checking Expenses:Food 12.50``,
+    ``purge_backups mybook --days 30``):
+
+        - positional words fill the parameters in order (quote names with spaces)
+        - ``--name value``, ``--name=value`` or ``name=value`` set a parameter by name;
+          a unique prefix is enough (``--before`` for ``before_date``)
+        - ``--flag`` alone sets a yes/no parameter (``--dry-run``)
+
+    Anything else is left for the agent.
+    """
+
+    def __init__(self, tools: Dict[str, Any]):
+        self.tools = tools
+        self._signatures: Dict[str, List[inspect.Parameter]] = {}
+
+    def _parameters(self, name: str) -> List[inspect.Parameter]:
+        if name not in self._signatures:
+            tool = self.tools[name]
+            params = list(inspect.signature(tool.function).parameters.values())
+            if getattr(tool, "takes_ctx", False) and params:
+                params = params[1:]
+            self._signatures[name] = params
+        return self._signatures[name]
+
+    @staticmethod
+    def _match(params: List[inspect.Parameter], option: str) -> Optional[inspect.Parameter]:
+        option = option.replace("-", "_")
+        for param in params:
+            if param.name == option:
+                return param
+        candidates = [p for p in params if p.name.startswith(option)]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def parse(self, line: str) -> Optional[Tuple[str, Callable, Dict[str, Any]]]:
+        """
+        Parse a command line into a tool call.
+
+        Args:
+            line: Input line
+
+        Returns:
+            Tuple of (tool name, function, keyword arguments), or None when the line
+            is not an exact invocation of a registered tool
+        """
+        try:
+            words = shlex.split(line)
+        except ValueError:
+            return None
+        if not words or words[0] not in self.tools:
+            return None
+
+        name = words[0]
+        params = self._parameters(name)
+        by_name = {p.name: p for p in params}
+        kwargs: Dict[str, Any] = {}
+        positional = [p for p in params if p.name != "ctx"]
+
+        try:
+            position = 0
+            i = 1
+            while i < len(words):
+                word = words[i]
+                i += 1
+                option, value = None, None
+                if word.startswith("--") and len(word) > 2:
+                    option, _, value = word[2:].partition("=")
+                    param = self._match(params, option)
+                    if param is None:
+                        raise CommandError(f"unknown option --{option}")
+                    if not value:
+                        if _unwrap_optional(param.annotation) is bool:
+                            value = "true"
+                        elif i < len(words):
+                            value = words[i]
+                            i += 1
+                        else:
+                            raise CommandError(f"--{option} needs a value")
+                elif "=" in word and word.partition("=")[0] in by_name:
+                    option, _, value = word.partition("=")
+                    param = by_name[option]
+                else:
+                    while position < len(positional) and positional[position].name in kwargs:
+                        position += 1
+                    if position >= len(positional):
+                        raise CommandError(f"unexpected argument '{word}'")
+                    param = positional[position]
+                    value = word
+                if param.name in kwargs:
+                    raise CommandError(f"{param.name} given twice")
+                kwargs[param.name] = _convert(value, param.annotation, param.name)
+
+            for param in params:
+                if param.name == "ctx":
+                    # Tools run outside an agent run, there is no run context
+                    kwargs["ctx"] = None
+                elif param.name not in kwargs and param.default is inspect.Parameter.empty:
+                    raise CommandError(f"missing {param.name}")
+        except CommandError as e:
+            log.debug(f"Not routing '{line}' to {name}: {e}")
+            return None
+
+        return name, self.tools[name].function, kwargs
+
+    async def run(self, line: str) -> Tuple[bool, Any]:
+        """
+        Run a line locally if it is an exact tool invocation.
+
+        Returns:
+            Tuple of (handled, tool result). When handled is False the caller
+            should hand the line to the agent.
+        """
+        parsed = self.parse(line)
+        if parsed is None:
+            return False, None
+        name, function, kwargs = parsed
+        log.debug(f"Routing '{line}' to {name}({kwargs})")
+        started = time.perf_counter()
+        if getattr(self.tools[name], "takes_ctx", False):
+            result = function(None, **kwargs)
+        else:
+            result = function(**kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        log.debug(f"{name} ran locally in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return True, result
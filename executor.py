@@ -0,0 +1,220 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from metrics import tool_metrics
+from shared_vars import get_active_book
+
+log = logging.getLogger(__name__)
+
+# Kinds of tool work
+READ = "read"            # reads the book or the filesystem; runs in parallel with other reads
+WRITE = "write"          # writes the active book; serialized with other writes to the same book
+EXCLUSIVE = "exclusive"  # changes the active book or replaces its file; runs alone
+
+
+class ReadWriteGate:
+    """Shared/exclusive gate. Waiting exclusive holders block new shared holders."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting_exclusive = 0
+
+    @contextmanager
+    def shared(self):
+        with self._condition:
+            while self._exclusive or self._waiting_exclusive:
+                self._condition.wait()
+            self._shared += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._shared -= 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def exclusive(self):
+        with self._condition:
+            self._waiting_exclusive += 1
+            while self._exclusive or self._shared:
+                self._condition.wait()
+            self._waiting_exclusive -= 1
+            self._exclusive = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._exclusive = False
+                self._condition.notify_all()
+
+
+class CallSequencer:
+    """
+    Keeps tool calls that are issued together (e.g. several tool calls of one model
+    response) in issue order where it matters: a read waits for the writes issued
+    before it, a write waits for everything issued before it. Reads issued between
+    two writes run concurrently, and all of them see the book as the earlier writes
+    left it.
+
+    Calls are registered synchronously when they are issued, so the order is the
+    order in which the agent (or router) started them.
+    """
+
+    def __init__(self):
+        # Completion of the last write issued, and of the reads issued after it
+        self._last_write: Optional[asyncio.Future] = None
+        self._reads: List[asyncio.Future] = []
+
+    def issue(self, kind: str) -> Tuple[List[asyncio.Future], asyncio.Future]:
+        """Register a call; returns (calls to wait for, future to resolve when done)."""
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        if kind == READ:
+            waits = [self._last_write] if self._last_write else []
+            self._reads = [f for f in self._reads if not f.done()]
+            self._reads.append(done)
+        else:
+            waits = ([self._last_write] if self._last_write else []) + self._reads
+            self._last_write = done
+            self._reads = []
+        # Futures of an earlier event loop (e.g. a finished asyncio.run) cannot be awaited here
+        return [f for f in waits if not f.done() and f.get_loop() is loop], done
+
+
+class ToolExecutor:
+    """
+    Runs blocking tool bodies (piecash/SQLite I/O, PDF rendering, file globbing) on
+    worker threads so the event loop only awaits their results.
+
+    Reads run on a bounded thread pool, in parallel, each on its own pooled read-only
+    session; e.g. the reports of one "give me an overview" turn take about as long
+    as the slowest of them. Writes to a book run one at a
+    time on that book's own writer thread. Exclusive work waits for everything in
+    flight and blocks new work until it is done.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or int(os.getenv('GC_CLI_WORKERS', '4'))
+        self._readers = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gnucash-read")
+        self._writers: Dict[str, ThreadPoolExecutor] = {}
+        self._writers_lock = threading.Lock()
+        self._gate = ReadWriteGate()
+        self._local = threading.local()
+        self._sequencer = CallSequencer()
+        # Called before a read is dispatched, once the writes issued before it are done;
+        # returns work to run on the book's writer thread first, or None
+        self.read_barrier: Optional[Callable[[], Optional[Callable]]] = None
+
+    def _writer_for(self, path) -> ThreadPoolExecutor:
+        with self._writers_lock:
+            if path not in self._writers:
+                self._writers[path] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gnucash-write")
+            return self._writers[path]
+
+    def _execute(self, func: Callable, args, kwargs):
+        """Call func on the current worker thread, driving it if it is a coroutine."""
+        result = func(*args, **kwargs)
+        if inspect.isawaitable(result):
+            loop = getattr(self._local, "loop", None)
+            if loop is None:
+                loop = self._local.loop = asyncio.new_event_loop()
+            result = loop.run_until_complete(result)
+        return result
+
+    def _call(self, kind: str, func: Callable, args, kwargs):
+        gate = self._gate.exclusive() if kind == EXCLUSIVE else self._gate.shared()
+        with gate:
+            return self._execute(func, args, kwargs)
+
+    async def run(self, kind: str, func: Callable, *args, **kwargs):
+        """
+        Run func on a worker thread and await its result, after the calls it must
+        follow (see :class:`CallSequencer`).
+
+        Args:
+            kind: READ, WRITE or EXCLUSIVE
+            func: Blocking function or coroutine function (run with its own event loop)
+
+        Returns:
+            Whatever func returns
+        """
+        waits, done = self._sequencer.issue(kind)
+        try:
+            if waits:
+                await asyncio.wait(waits)
+            if kind == READ and self.read_barrier is not None:
+                await self._before_read()
+            return await self._dispatch(kind, func, args, kwargs)
+        finally:
+            done.set_result(None)
+
+    async def _dispatch(self, kind: str, func: Callable, args, kwargs):
+        if kind == WRITE:
+            pool = self._writer_for(get_active_book())
+        else:
+            pool = self._readers
+        loop = asyncio.get_running_loop()
+        # The worker sees the caller's context, e.g. the tool call being measured
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(pool, functools.partial(context.run, self._call, kind, func, args, kwargs))
+
+    async def _before_read(self):
+        """Run the read barrier's work (e.g. a group commit) on the writer thread.
+
+        Writes issued after the read wait for it, so nothing else is written in between.
+        If the work fails the read goes ahead on the last committed state.
+        """
+        barrier = self.read_barrier()
+        if barrier is None:
+            return
+        try:
+            await self._dispatch(WRITE, barrier, (), {})
+        except Exception as e:
+            log.error(f"Error before read: {str(e)}")
+
+    def tool(self, kind: str):
+        """Decorator for agent tools: the body runs on a worker thread of the given kind.
+
+        Put it below ``@gnucash_agent.tool`` so the agent sees the original signature.
+        Calls are recorded in :data:`metrics.tool_metrics`.
+        """
+        def decorate(func):
+            @tool_metrics.measured
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await self.run(kind, func, *args, **kwargs)
+            wrapper.tool_kind = kind
+            return wrapper
+        return decorate
+
+    @property
+    def reads(self):
+        return self.tool(READ)
+
+    @property
+    def writes(self):
+        return self.tool(WRITE)
+
+    @property
+    def exclusive(self):
+        return self.tool(EXCLUSIVE)
+
+    def shutdown(self):
+        self._readers.shutdown(wait=True)
+        with self._writers_lock:
+            for pool in self._writers.values():
+                pool.shutdown(wait=True)
+            self._writers.clear()
+
+
+tool_executor = ToolExecutor()
@@ -1,5 +1,17 @@
+import sys
+
+if "--profile-startup" in sys.argv:
+    # Installed before anything else is imported so every import is timed
+    from startup_profile import ImportProfiler
+    _import_profiler = ImportProfiler()
+    _import_profiler.install()
+
+import asyncio
+import functools
 import logging
+import shlex
 import shutil
+import sqlite3
 import warnings
 from pathlib import Path
 from typing import Union
@@ -21,17 +33,12 @@ init(autoreset=True)  # Auto reset colors after each print
 from datetime import date, timedelta
 import glob
 import os
-import yaml
 from decimal import Decimal
 from piecash import Account, Transaction, Split, Price, Commodity
 from datetime import datetime
 import piecash
-import pandas as pd
 import sqlalchemy as sa
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+# pandas, reportlab, yaml and tabulate are slow to import: the tools that need them import them
 
 # Configure logging
 log = logging.getLogger(__name__)
@@ -59,11 +66,45 @@ warnings.filterwarnings('ignore', category=sa.exc.SAWarning)
 DEFAULT_CURRENCY = os.getenv('GC_CLI_DEFAULT_CURRENCY', 'INR')
 log.info(f"Initialized app with default currency: {DEFAULT_CURRENCY}")
 
+# List of valid GnuCash account types with descriptions
+VALID_ACCOUNT_TYPES = {
+    "ASSET": "Assets (e.g., Bank Accounts, Investments)",
+    "BANK": "Bank Accounts",
+    "CASH": "Cash Accounts",
+    "CREDIT": "Credit Cards",
+    "EXPENSE": "Expenses",
+    "INCOME": "Income",
+    "LIABILITY": "Liabilities",
+    "EQUITY": "Equity",
+    "TRADING": "Trading Accounts",
+    "STOCK": "Stock/Investment Accounts",
+    "MUTUAL": "Mutual Fund Accounts",
+    "CURRENCY": "Currency Trading Accounts",
+    "RECEIVABLE": "Accounts Receivable",
+    "PAYABLE": "Accounts Payable"
+}
+
 class GnuCashQuery(BaseModel):
     query: str
     results: list[str]
 
-from shared_vars import get_active_book, set_active_book
+from shared_vars import get_active_book, set_active_book, get_book, book_pool
+from balances import AccountBalances, load_flow_totals
+from ledger import fetch_recent_transactions, parse_cursor, format_cursor
+from account_import import validate_account_tree, import_account_tree
+from prices import BASIC_CURRENCIES, read_quotes
+from command_router import CommandRouter, agent_tools
+from backup_catalog import DEFAULT_RETENTION, STORE, backup_catalog, parse_policy, remove_backups
+from backup_store import backup_store, format_size
+from backup_sweeper import BackupSweeper
+from checkpoints import file_signature
+from snapshot import snapshot_book as take_snapshot
+from executor import READ, WRITE, tool_executor
+from metrics import tool_metrics
+import posting_journal
+from posting_journal import GroupCommitter, attach_journal, journaled, posting_time, replay_journal, tag_posting
+from statement_import import (ImportStats, parse_csv, parse_ofx, load_rules, map_accounts,
+                              validate_postings, insert_postings)
 
 # Create the GnuCash agent
 system_prompt = (
@@ -74,8 +115,12 @@ system_prompt = (
     f"\n{os.getenv('GC_CLI_SYSTEM_PROMPT', '')}"
 )
 
+# The model is passed on each run rather than to the Agent, so its SDK (openai) is only
+# imported when a line actually goes to the model - not for exact commands or scripts
+AGENT_MODEL = 'openai:gpt-4o-mini'
+
 gnucash_agent = Agent(
-    'openai:gpt-4o-mini',
+    None,
     # "ollama:llama3.2",
     # deps_type=Optional[GnuCashQuery], # type: ignore
     # result_type=str,  # type: ignore
@@ -87,6 +132,7 @@ gnucash_agent = Agent(
 log.info(f"Agent created with system prompt: {system_prompt}")
 
 @gnucash_agent.tool
+@tool_executor.exclusive
 async def create_book(ctx: RunContext[GnuCashQuery], book_name: str = "sample_accounts") -> str:
     """Create a new GnuCash book and set it as the active book.
     
@@ -107,13 +153,19 @@ async def create_book(ctx: RunContext[GnuCashQuery], book_name: str = "sample_ac
     try:
         log.info(f"Creating book: {book_name}.gnucash")
         active_book = f"{book_name}.gnucash"
+        if active_book == get_active_book():
+            # Warm sessions would point at the file we are about to overwrite
+            book_pool.invalidate()
         book = piecash.create_book(
             f"{book_name}.gnucash",
             overwrite=True,
             currency=DEFAULT_CURRENCY,
             keep_foreign_keys=False
         )
+        book.close()
         set_active_book(active_book)
+        # A journal of the overwritten book must not be replayed into the new one
+        attach_journal(active_book, remove=True)
         log.info(f"Book created and set as active: {get_active_book()}")
         log.debug(f"Create book completed: {book_name}")
         return "Successfully created a new GnuCash book."
@@ -122,6 +174,7 @@ async def create_book(ctx: RunContext[GnuCashQuery], book_name: str = "sample_ac
         return Fore.RED + f"Error creating book: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.reads
 async def get_book_name(ctx: RunContext[GnuCashQuery]) -> str:
     """Get the name of the currently active GnuCash book.
     
@@ -140,6 +193,7 @@ async def get_book_name(ctx: RunContext[GnuCashQuery]) -> str:
     return "No active book - create or open one first"
 
 @gnucash_agent.tool
+@tool_executor.exclusive
 async def open_book(ctx: RunContext[GnuCashQuery], book_name: str) -> str:
     """Open an existing GnuCash book and set it as active.
     
@@ -159,21 +213,34 @@ async def open_book(ctx: RunContext[GnuCashQuery], book_name: str) -> str:
     # global active_book
     try:
         print(f"Attempting to open book: {book_name}")
-        # Try to open the book to verify it exists, ignoring lock
-        book = piecash.open_book(sqlite_file=book_name, open_if_lock=True, readonly=False)
-        log.debug(f"Book opened successfully: {book}")
-        book.close()
-        
+        # Switch the session pool over and warm up the write session, ignoring lock
         set_active_book(book_name)
+        try:
+            with get_book(readonly=False) as book:
+                log.debug(f"Book opened successfully: {book}")
+        except Exception:
+            set_active_book(None)
+            raise
+
+        # Postings accepted but not committed when the CLI last stopped
+        replayed = ""
+        if attach_journal(book_name).needs_replay:
+            stats = await replay_journal()
+            replayed = (f"\nRecovered {stats['replayed']} journaled posting(s)"
+                        f" ({stats['skipped']} already in the book)")
+            if stats["failed"]:
+                replayed += "\nCould not replay:\n" + "\n".join(f"  - {f}" for f in stats["failed"])
+        
         print(f"Active book set to: {get_active_book()}")
         log.debug(f"Open book completed: {book_name}")
         print(Fore.YELLOW + f"DEBUG: Completed open_book for {book_name}")
-        return f"Successfully opened book: {book_name} (ignored lock if present)"
+        return f"Successfully opened book: {book_name} (ignored lock if present){replayed}"
     except Exception as e:
         print(f"Error opening book: {str(e)}")
         return Fore.RED + f"Error opening book: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.reads
 async def list_accounts(ctx: RunContext[GnuCashQuery]) -> str:
     """List all accounts in the active GnuCash book with balances.
     
@@ -197,19 +264,19 @@ async def list_accounts(ctx: RunContext[GnuCashQuery]) -> str:
     log.debug("Check completed ..........")
 
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        accounts = []
-        log.debug("Opened piecash book ........")
-        for account in book.accounts:
-            if account.type != "ROOT":  # Skip root account
-                accounts.append({
-                    'Account': account.fullname,
-                    'Type': account.type,
-                    'Balance': account.get_balance(),
-                    'Description': account.description
-                })
-        
-        book.close()
+        with get_book(readonly=True) as book:
+            accounts = []
+            log.debug("Opened piecash book ........")
+            # All balances in one aggregated query instead of a split scan per account
+            balances = AccountBalances(book)
+            for account in balances.accounts:
+                if account.type != "ROOT":  # Skip root account
+                    accounts.append({
+                        'Account': account.fullname,
+                        'Type': account.type,
+                        'Balance': balances.get_balance(account),
+                        'Description': account.description
+                    })
 
         log.debug(f"Found {len(accounts)} accounts")
 
@@ -218,6 +285,7 @@ async def list_accounts(ctx: RunContext[GnuCashQuery]) -> str:
             return "No accounts found in the book."
             
         # Format as a table
+        import pandas as pd
         df = pd.DataFrame(accounts)
         log.debug("List accounts completed")
         return "Accounts in the book:\n" + df.to_string(index=False)
@@ -227,6 +295,8 @@ async def list_accounts(ctx: RunContext[GnuCashQuery]) -> str:
         return f"Error listing accounts: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
+@journaled
 async def transfer_funds(ctx: RunContext[GnuCashQuery], from_account: str, to_account: str, amount: float, description: str = "Fund transfer") -> str:
     """Transfer funds between two accounts in the active GnuCash book.
     
@@ -256,34 +326,30 @@ async def transfer_funds(ctx: RunContext[GnuCashQuery], from_account: str, to_ac
         return "Amount must be positive."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        
-        # Find the accounts
-        from_acc = book.accounts.get(fullname=from_account)
-        to_acc = book.accounts.get(fullname=to_account)
-        
-        if not from_acc:
-            book.close()
-            return f"Source account '{from_account}' not found."
-        if not to_acc:
-            book.close()
-            return f"Destination account '{to_account}' not found."
-        
-        # Create the transaction
-        with book:
-            Transaction(
+        with get_book(readonly=False) as book:
+            # Find the accounts
+            accounts = book.account_index
+            from_acc = accounts.get(from_account)
+            to_acc = accounts.get(to_account)
+
+            if not from_acc:
+                return accounts.not_found("Source account", from_account)
+            if not to_acc:
+                return accounts.not_found("Destination account", to_account)
+
+            # Create the transaction
+            tag_posting(Transaction(
                 currency=book.default_currency,
                 description=description,
                 splits=[
                     Split(account=from_acc, value=Decimal(-amount)),
                     Split(account=to_acc, value=Decimal(amount))
                 ],
-                post_date=date.today(),
-                enter_date=datetime.now(),
-            )
+                post_date=posting_time().date(),
+                enter_date=posting_time(),
+            ))
             book.save()
 
-        book.close()
         log.debug(f"Transfer funds completed from {from_account} to {to_account} amount: {amount}")
         return f"Successfully transferred ${amount:.2f} from {from_account} to {to_account}"
     
@@ -291,6 +357,8 @@ async def transfer_funds(ctx: RunContext[GnuCashQuery], from_account: str, to_ac
         return f"Error transferring funds: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
+@journaled
 async def create_subaccount(
     ctx: RunContext[GnuCashQuery],
     parent_account: str,
@@ -327,23 +395,7 @@ async def create_subaccount(
         return "No active book. Please create or open a book first."
     
     # Validate account type
-    # List of valid GnuCash account types with descriptions
-    valid_types = {
-        "ASSET": "Assets (e.g., Bank Accounts, Investments)",
-        "BANK": "Bank Accounts",
-        "CASH": "Cash Accounts",
-        "CREDIT": "Credit Cards",
-        "EXPENSE": "Expenses",
-        "INCOME": "Income",
-        "LIABILITY": "Liabilities",
-        "EQUITY": "Equity",
-        "TRADING": "Trading Accounts",
-        "STOCK": "Stock/Investment Accounts",
-        "MUTUAL": "Mutual Fund Accounts",
-        "CURRENCY": "Currency Trading Accounts",
-        "RECEIVABLE": "Accounts Receivable",
-        "PAYABLE": "Accounts Payable"
-    }
+    valid_types = VALID_ACCOUNT_TYPES
     
     # Normalize and validate account type
     account_type = account_type.upper()
@@ -354,32 +406,32 @@ async def create_subaccount(
     
     try:
         print(Fore.YELLOW + f"DEBUG: Attempting to open book: {get_active_book()}")
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        log.debug("Book opened successfully")
-        
-        # Find the parent account
-        log.debug(f"Looking for parent account: {parent_account}")
-        parent = book.accounts.get(fullname=parent_account)
-        if not parent:
-            log.error(f"Parent account not found: {parent_account}")
-            book.close()
-            print(Fore.YELLOW + f"DEBUG: Parent account '{parent_account}' not found - returning error")
-            return f"Parent account '{parent_account}' not found."
-        log.debug(f"Found parent account: {parent.fullname}, type: {parent.type}")
-        
-        # Create the subaccount
-        with book:
+        with get_book(readonly=False) as book:
+            log.debug("Book opened successfully")
+
+            # Find the parent account
+            log.debug(f"Looking for parent account: {parent_account}")
+            accounts = book.account_index
+            parent = accounts.get(parent_account)
+            if not parent:
+                log.error(f"Parent account not found: {parent_account}")
+                print(Fore.YELLOW + f"DEBUG: Parent account '{parent_account}' not found - returning error")
+                return accounts.not_found("Parent account", parent_account)
+            log.debug(f"Found parent account: {parent.fullname}, type: {parent.type}")
+
+            # Create the subaccount
             log.debug(f"Starting account creation: {account_name}")
             
             log.debug(f"Creating regular account: {account_name}, type: {account_type}")
-            new_account = Account(
+            new_account = tag_posting(Account(
                 name=account_name,
                 type=account_type,
                 commodity=book.default_currency,
                 parent=parent or book.root_account,
                 description=description or f"{account_name} account"
-            )
+            ))
             log.debug(f"Created account: {new_account}")
+            accounts.add(new_account)
             
             # Create opening transaction if initial balance is provided
             if initial_balance != 0:
@@ -388,7 +440,7 @@ async def create_subaccount(
                 # Determine the offset account based on account type
                 if account_type.upper() in ["ASSET", "BANK"]:
                     log.debug("Creating asset/bank transaction")
-                    equity_acc = book.accounts.get(fullname="Equity")
+                    equity_acc = accounts.get("Equity")
                     if not equity_acc:
                         log.error("Equity account not found")
                         raise ValueError("Equity account not found")
@@ -401,13 +453,13 @@ async def create_subaccount(
                             Split(account=new_account, value=Decimal(str(initial_balance))),
                             Split(account=equity_acc, value=Decimal(str(-initial_balance)))
                         ],
-                        post_date=date.today(),
-                        enter_date=datetime.now(),
+                        post_date=posting_time().date(),
+                        enter_date=posting_time(),
                     )
                 
                 elif account_type.upper() in ["LIABILITY", "CREDIT"]:
                     log.debug("Creating liability/credit transaction")
-                    equity_acc = book.accounts.get(fullname="Equity")
+                    equity_acc = accounts.get("Equity")
                     if not equity_acc:
                         log.error("Equity account not found")
                         raise ValueError("Equity account not found")
@@ -420,15 +472,14 @@ async def create_subaccount(
                             Split(account=new_account, value=Decimal(str(-initial_balance))),
                             Split(account=equity_acc, value=Decimal(str(initial_balance)))
                         ],
-                        post_date=date.today(),
-                        enter_date=datetime.now(),
+                        post_date=posting_time().date(),
+                        enter_date=posting_time(),
                     )
             
             log.debug("Saving book changes")
             book.save()
             log.debug("Book saved successfully")
         
-        book.close()
         if initial_balance != 0:
             log.debug(f"Subaccount created with balance: {account_name}, parent: {parent_account}, initial balance: {initial_balance}")
             return f"Successfully created subaccount '{account_name}' under '{parent_account}' with initial balance of {initial_balance}"
@@ -441,6 +492,8 @@ async def create_subaccount(
 
 
 @gnucash_agent.tool
+@tool_executor.writes
+@journaled
 async def add_transaction(
     ctx: RunContext[GnuCashQuery],
     from_account: str,
@@ -486,45 +539,39 @@ async def add_transaction(
         return "Total amount must be positive."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        
-        # Find the from account
-        from_acc = book.accounts.get(fullname=from_account)
-        if not from_acc:
-            book.close()
-            return f"Source account '{from_account}' not found."
-        
-        # Verify all to accounts exist
-        to_accs = []
-        for acc_name, amount in to_accounts:
-            acc = book.accounts.get(fullname=acc_name)
-            if not acc:
-                book.close()
-                return f"Destination account '{acc_name}' not found."
-            if amount <= 0:
-                book.close()
-                return f"Amount for account '{acc_name}' must be positive."
-            to_accs.append((acc, amount))
-        
-        # Create the transaction
-        with book:
+        with get_book(readonly=False) as book:
+            # Find the from account
+            accounts = book.account_index
+            from_acc = accounts.get(from_account)
+            if not from_acc:
+                return accounts.not_found("Source account", from_account)
+
+            # Verify all to accounts exist
+            to_accs = []
+            for acc_name, amount in to_accounts:
+                acc = accounts.get(acc_name)
+                if not acc:
+                    return accounts.not_found("Destination account", acc_name)
+                if amount <= 0:
+                    return f"Amount for account '{acc_name}' must be positive."
+                to_accs.append((acc, amount))
+
+            # Create the transaction
             splits = [
                 Split(account=from_acc, value=Decimal(-total_amount))
             ]
             for acc, amount in to_accs:
                 splits.append(Split(account=acc, value=Decimal(amount)))
             
-            Transaction(
+            tag_posting(Transaction(
                 currency=book.default_currency,
                 description=description,
                 splits=splits,
-                post_date=date.today(),
-                enter_date=datetime.now(),
-            )
+                post_date=posting_time().date(),
+                enter_date=posting_time(),
+            ))
             book.save()
         
-        book.close()
-        
         # Format success message
         details = "\n".join(f"  - {acc_name}: ${amount:.2f}" for acc_name, amount in to_accounts)
         log.debug("Add transaction completed")
@@ -534,7 +581,38 @@ async def add_transaction(
         return f"Error adding transaction: {str(e)}"
 
 @gnucash_agent.tool
-async def list_transactions(ctx: RunContext[GnuCashQuery], limit: int = 10) -> str:
+@tool_executor.writes
+async def flush(ctx: RunContext[GnuCashQuery]) -> str:
+    """Commit the postings that were accepted but not written to the book yet.
+
+    transfer_funds, add_transaction, create_subaccount and add_stock_transaction
+    write each posting to a journal and commit them to the book in groups
+    (every GC_CLI_GROUP_COMMIT postings, or GC_CLI_COMMIT_MS after the first one).
+    Reading the book commits them too, so this is only needed before other
+    programs read the book file.
+
+    Returns - str: Number of postings committed
+    """
+    log.debug("Entering flush")
+    if not get_active_book():
+        return "No active book. Please create or open a book first."
+    try:
+        committer = posting_journal.group_committer or GroupCommitter()
+        stats = await committer.flush()
+    except Exception as e:
+        log.exception("Error flushing postings")
+        return f"Error committing postings: {str(e)}"
+    result = f"Committed {stats['committed']} pending posting(s)"
+    if stats["replayed"] or stats["failed"]:
+        result += f"\nReplayed {stats['replayed']} rolled-back posting(s) from the journal"
+    if stats["failed"]:
+        result += "\nCould not replay:\n" + "\n".join(f"  - {f}" for f in stats["failed"])
+    log.debug(f"Flush completed: {stats}")
+    return result
+
+@gnucash_agent.tool
+@tool_executor.reads
+async def list_transactions(ctx: RunContext[GnuCashQuery], limit: int = 10, before: str = None) -> str:
     """List recent transactions in the active GnuCash book.
 
     Returns formatted transaction details including:
@@ -543,43 +621,55 @@ async def list_transactions(ctx: RunContext[GnuCashQuery], limit: int = 10) -> s
     - Splits showing account and amount
     - Memo (if present)
 
-    Transactions are sorted by date (newest first).
+    Transactions are sorted by date (newest first). The output ends with a
+    cursor that can be passed back as `before` to fetch the next (older) page.
 
     Args:
         limit (int): Maximum number of transactions to return (default: 10)
+        before (str, optional): Page cursor "YYYY-MM-DD,guid" (or just "YYYY-MM-DD");
+            only transactions older than it are listed
 
     Returns - str: Formatted list of transactions with splits or error message
 
     Raises:
         piecash.BookError: If book access fails
     """
-    log.debug(f"Entering list_transactions with limit: {limit}")
+    log.debug(f"Entering list_transactions with limit: {limit}, before: {before}")
     # global active_book
     if not get_active_book():
         return "No active book. Please create or open a book first."
+    if limit < 1:
+        return "Limit must be at least 1."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        transactions = []
-        
-        # Get transactions sorted by date (newest first)
-        for tx in sorted(book.transactions, key=lambda t: t.post_date, reverse=True)[:limit]:
-            tx_info = {
-                'Date': tx.post_date.strftime('%Y-%m-%d'),
-                'Description': tx.description,
-                'Splits': []
-            }
-            
-            for split in tx.splits:
-                tx_info['Splits'].append({
-                    'Account': split.account.fullname,
-                    'Amount': float(split.value),
-                    'Memo': split.memo or ''
-                })
-            
-            transactions.append(tx_info)
-        
-        book.close()
+        cursor = parse_cursor(before) if before else None
+    except ValueError:
+        return "Invalid 'before' cursor. Use YYYY-MM-DD or YYYY-MM-DD,guid."
+
+    try:
+        with get_book(readonly=True) as book:
+            transactions = []
+            next_cursor = None
+
+            # Get transactions sorted by date (newest first)
+            recent = fetch_recent_transactions(book, limit, before=cursor)
+            if recent and len(recent) == limit:
+                next_cursor = format_cursor(recent[-1])
+            for tx in recent:
+                tx_info = {
+                    'Date': tx.post_date.strftime('%Y-%m-%d'),
+                    'Description': tx.description,
+                    'Splits': []
+                }
+
+                for split in tx.splits:
+                    tx_info['Splits'].append({
+                        'Account': split.account.fullname,
+                        'Amount': float(split.value),
+                        'Memo': split.memo or ''
+                    })
+
+                transactions.append(tx_info)
         
         if not transactions:
             return "No transactions found in the book."
@@ -591,6 +681,8 @@ async def list_transactions(ctx: RunContext[GnuCashQuery], limit: int = 10) -> s
             for split in tx['Splits']:
                 color = Fore.RED if split['Amount'] < 0 else Fore.GREEN
                 output.append(f"  {split['Account']}: {color}{split['Amount']:+.2f} {Fore.RESET}{split['Memo']}")
+        if next_cursor:
+            output.append(Fore.CYAN + f"\nOlder transactions: list_transactions {limit} before={next_cursor}")
         
         log.debug(f"List transactions completed, limit: {limit}")
         return "\n".join(output)
@@ -599,8 +691,42 @@ async def list_transactions(ctx: RunContext[GnuCashQuery], limit: int = 10) -> s
         return Fore.RED + f"Error listing transactions: {str(e)}"
 
 
+def cashflow_trend(start_date: str, end_date: str, period: str, periods: int, output_file: str = None) -> str:
+    """Multi-period mode of generate_cashflow_statement: console table, optionally CSV."""
+    log.debug(f"Cashflow trend: {period} x {periods}, start: {start_date}, end: {end_date}")
+    from cashflow_trend import CashFlowTrend
+
+    try:
+        start = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD"
+    if periods < 1:
+        return "Invalid number of periods, must be at least 1"
+    if start and start > (end or date.today()):
+        return f"Start date {start} is after end date {end or date.today()}"
+
+    book = get_book(readonly=True)
+    try:
+        trend = CashFlowTrend(book, period, periods, end_date=end, start_date=start)
+        output = trend.render()
+        if output_file:
+            trend.write_csv(output_file)
+            output += f"\n\nTrend written to {output_file}"
+        return output
+    except ValueError as e:
+        return f"Error: {str(e)}"
+    except Exception as e:
+        log.exception("Error generating cash flow trend")
+        return Fore.RED + f"Error generating cash flow trend: {str(e)}"
+    finally:
+        book.close()
+
+
 @gnucash_agent.tool
-async def generate_cashflow_statement(ctx: RunContext[GnuCashQuery], start_date: str = None, end_date: str = None) -> str:
+@tool_executor.reads
+async def generate_cashflow_statement(ctx: RunContext[GnuCashQuery], start_date: str = None, end_date: str = None,
+                                      period: str = None, periods: int = 12, output_file: str = None) -> str:
     """Generate a cash flow statement for a given period.
     
     The statement shows cash flows in three categories:
@@ -610,9 +736,16 @@ async def generate_cashflow_statement(ctx: RunContext[GnuCashQuery], start_date:
     
     Defaults to Year-to-Date if no dates provided.
 
+    With `period` set, produces an income/expense trend instead: one column per
+    month/quarter/year, accounts rolled up through the hierarchy, e.g. the last 12
+    months with period="month". Use it for trends rather than one call per period.
+
     Args:
         start_date (str, optional): Start date in YYYY-MM-DD format
         end_date (str, optional): End date in YYYY-MM-DD format
+        period (str, optional): month, quarter or year - one column per period
+        periods (int, optional): Number of periods up to end_date when start_date is not given (default 12)
+        output_file (str, optional): Also write the trend to this CSV file
         
     Returns - str: Formatted cash flow statement or error message
 
@@ -624,95 +757,80 @@ async def generate_cashflow_statement(ctx: RunContext[GnuCashQuery], start_date:
     if not get_active_book():
         return "No active book. Please create or open a book first."
     
+    if period:
+        return cashflow_trend(start_date, end_date, period, periods, output_file)
+
     try:
         log.debug(f"Cashflow statement start, active book: {get_active_book()}")
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        print(Fore.YELLOW + f"DEBUG: Book opened successfully")
-        
-        # Default to YTD if no dates provided
-        today = date.today()
-        if not start_date:
-            start_date = date(today.year, 1, 1).strftime('%Y-%m-%d')
-            log.debug(f"Using default start date: {start_date}")
-        if not end_date:
-            end_date = today.strftime('%Y-%m-%d')
-            log.debug(f"Using default end date: {end_date}")
-            
-        # Convert to date objects
-        start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-        end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-        log.debug(f"Date range set: start: {start_date}, end: {end_date}")
-        
-        # Initialize totals
-        money_in = Decimal('0.00')
-        money_out = Decimal('0.00')
-        log.debug("Initialized totals")
-        
-        # Track subcategories
-        income_categories = {}
-        expense_categories = {}
-        
-        # Categorize transactions
-        transaction_count = 0
-        for tx in book.transactions:
-            transaction_count += 1
-            log.debug(f"Processing transaction {transaction_count}: {tx.description}, post date: {tx.post_date}")
-            
-            if start_date <= tx.post_date <= end_date:
-                print(Fore.YELLOW + "DEBUG: Transaction within date range")
-                for split in tx.splits:
-                    account = split.account
-                    amount = split.value
-                    log.debug(f"Processing split: account: {account.fullname}, type: {account.type}, amount: {amount}")
-                    
-                    # Income accounts (money in)
-                    if account.type == "INCOME":
-                        money_in += abs(amount)  # Use absolute value for consistent sign
-                        category = account.name
-                        income_categories[category] = income_categories.get(category, Decimal('0.00')) + abs(amount)
-                        log.debug(f"Updated money in: {money_in}")
-                    
-                    # Expense accounts (money out)
-                    elif account.type == "EXPENSE":
-                        money_out += abs(amount)  # Use absolute value for consistent sign
-                        category = account.name
-                        expense_categories[category] = expense_categories.get(category, Decimal('0.00')) + abs(amount)
-                        log.debug(f"Updated money out: {money_out}")
-            else:
-                log.debug(f"Skipped transaction outside range: post date: {tx.post_date}, start: {start_date}, end: {end_date}")
-        
-        # Calculate net cash flow
-        net_cash_flow = money_in - money_out
-        
-        # Build the ASCII table
-        output = []
-        output.append(Fore.YELLOW + "=" * 60)
-        output.append(Fore.CYAN + " CASH FLOW STATEMENT".center(60))
-        output.append(Fore.YELLOW + f"Period: {start_date} to {end_date}".center(60))
-        output.append(Fore.YELLOW + "=" * 60)
-        
-        # Money Incoming Section
-        output.append(Fore.GREEN + "\nMONEY INCOMING")
-        curr_symbol = book.default_currency.mnemonic
-        for category, amount in sorted(income_categories.items()):
-            output.append(f"  {category:<30} {Fore.GREEN}{curr_symbol} {amount:>12.2f}")
-        output.append(Fore.GREEN + "-" * 60)
-        output.append(f"  {'Total Money In':<30} {Fore.GREEN}{curr_symbol} {money_in:>12.2f}")
-        
-        # Money Outflow Section
-        output.append(Fore.RED + "\nMONEY OUTFLOW")
-        for category, amount in sorted(expense_categories.items()):
-            output.append(f"  {category:<30} {Fore.RED}{curr_symbol} {amount:>12.2f}")
-        output.append(Fore.RED + "-" * 60)
-        output.append(f"  {'Total Money Out':<30} {Fore.RED}{curr_symbol} {money_out:>12.2f}")
-        
-        # Net Cash Flow
-        output.append(Fore.YELLOW + "=" * 60)
-        color = Fore.GREEN if net_cash_flow >= 0 else Fore.RED
-        output.append(f"  {'Net Cash Flow':<30} {color}{curr_symbol} {net_cash_flow:>12.2f}")
-        output.append(Fore.YELLOW + "=" * 60)
-
-        book.close()
+        with get_book(readonly=True) as book:
+            # Default to YTD if no dates provided
+            today = date.today()
+            if not start_date:
+                start_date = date(today.year, 1, 1).strftime('%Y-%m-%d')
+                log.debug(f"Using default start date: {start_date}")
+            if not end_date:
+                end_date = today.strftime('%Y-%m-%d')
+                log.debug(f"Using default end date: {end_date}")
+
+            # Convert to date objects
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+            log.debug(f"Date range set: start: {start_date}, end: {end_date}")
+
+            # Initialize totals
+            money_in = Decimal('0.00')
+            money_out = Decimal('0.00')
+            log.debug("Initialized totals")
+
+            # Track subcategories
+            income_categories = {}
+            expense_categories = {}
+
+            # Aggregate the period's INCOME/EXPENSE splits per account in the database
+            flow_totals = load_flow_totals(book, start_date, end_date, ["INCOME", "EXPENSE"])
+            log.debug(f"Aggregated cash flows for {len(flow_totals)} accounts")
+
+            for category, account_type, amount in flow_totals.values():
+                # Income accounts (money in)
+                if account_type == "INCOME":
+                    money_in += amount
+                    income_categories[category] = income_categories.get(category, Decimal('0.00')) + amount
+
+                # Expense accounts (money out)
+                elif account_type == "EXPENSE":
+                    money_out += amount
+                    expense_categories[category] = expense_categories.get(category, Decimal('0.00')) + amount
+
+            # Calculate net cash flow
+            net_cash_flow = money_in - money_out
+
+            # Build the ASCII table
+            output = []
+            output.append(Fore.YELLOW + "=" * 60)
+            output.append(Fore.CYAN + " CASH FLOW STATEMENT".center(60))
+            output.append(Fore.YELLOW + f"Period: {start_date} to {end_date}".center(60))
+            output.append(Fore.YELLOW + "=" * 60)
+
+            # Money Incoming Section
+            output.append(Fore.GREEN + "\nMONEY INCOMING")
+            curr_symbol = book.default_currency.mnemonic
+            for category, amount in sorted(income_categories.items()):
+                output.append(f"  {category:<30} {Fore.GREEN}{curr_symbol} {amount:>12.2f}")
+            output.append(Fore.GREEN + "-" * 60)
+            output.append(f"  {'Total Money In':<30} {Fore.GREEN}{curr_symbol} {money_in:>12.2f}")
+
+            # Money Outflow Section
+            output.append(Fore.RED + "\nMONEY OUTFLOW")
+            for category, amount in sorted(expense_categories.items()):
+                output.append(f"  {category:<30} {Fore.RED}{curr_symbol} {amount:>12.2f}")
+            output.append(Fore.RED + "-" * 60)
+            output.append(f"  {'Total Money Out':<30} {Fore.RED}{curr_symbol} {money_out:>12.2f}")
+
+            # Net Cash Flow
+            output.append(Fore.YELLOW + "=" * 60)
+            color = Fore.GREEN if net_cash_flow >= 0 else Fore.RED
+            output.append(f"  {'Net Cash Flow':<30} {color}{curr_symbol} {net_cash_flow:>12.2f}")
+            output.append(Fore.YELLOW + "=" * 60)
         
         return "\n".join(output)
     
@@ -720,74 +838,85 @@ async def generate_cashflow_statement(ctx: RunContext[GnuCashQuery], start_date:
         return Fore.RED + f"Error generating cash flow statement: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.exclusive
 async def purge_backups(
     ctx: RunContext[GnuCashQuery],
     book_name: str,
     days: int = None,
-    before_date: str = None
+    before_date: str = None,
+    policy: str = None
 ) -> str:
-    """Purge old backup files for a GnuCash book.
+    """Purge old backups of a GnuCash book.
 
-    Deletes backup files matching the pattern {book_name}.gnucash.YYYYMMDDHHMMSS.gnucash
-    that are either:
+    Deletes the backups of the book that are either:
     - Older than N days (if days parameter provided)
     - Older than a specific date (if before_date provided)
+    - Not kept by a tiered retention policy (if policy provided), e.g.
+      'hourly:1d,daily:30d,monthly:1y' keeps the newest backup of every hour for a
+      day, of every day for 30 days and of every month for a year
+
+    Both backup files ({book_name}.gnucash.YYYYMMDDHHMMSS.gnucash in the current
+    directory and in backups/) and backups in the backup store are purged, looked up
+    in the backup catalog. Store chunks no remaining backup uses are garbage-collected.
 
     Args:
         book_name (str): Base name of the book (without .gnucash extension)
         days (int, optional): Delete backups older than this many days
         before_date (str, optional): Delete backups before this date (YYYY-MM-DD format)
+        policy (str, optional): Retention policy: comma-separated tier:window with tiers
+            all, hourly, daily, weekly, monthly, yearly and windows like 12h, 30d, 6m, 1y
 
-    Returns - str: Summary of deleted files and remaining backups
+    Returns - str: Summary of deleted backups, remaining backups and space freed
 
     Raises:
-        ValueError: If neither days nor before_date provided
-        FileNotFoundError: If no backups found
+        ValueError: If none of days, before_date or policy provided
     """
-    log.debug(f"Entering purge_backups with book_name: {book_name}, days: {days}, before_date: {before_date}")
+    log.debug(f"Entering purge_backups with book_name: {book_name}, days: {days}, before_date: {before_date}, "
+              f"policy: {policy}")
 
     print(Fore.YELLOW + f"DEBUG: Starting purge_backups for {book_name}")
 
-    if not days and not before_date:
-        raise ValueError("Must specify either days or before_date parameter")
-    
-    # Calculate cutoff date
+    if not days and not before_date and not policy:
+        raise ValueError("Must specify either days, before_date or policy parameter")
+    try:
+        retention = parse_policy(policy) if policy else None
+    except ValueError as e:
+        return f"Invalid retention policy: {str(e)}"
     if days:
         cutoff = datetime.now() - timedelta(days=days)
-    else:
-        cutoff = datetime.strptime(before_date, '%Y-%m-%d')
+    elif before_date:
+        try:
+            cutoff = datetime.strptime(before_date, '%Y-%m-%d')
+        except ValueError:
+            return "Invalid date format. Please use YYYY-MM-DD"
     
-    # Find matching backup files
-    pattern = f"{book_name}.gnucash.*.gnucash"
-    backups = glob.glob(pattern)
+    book = _backup_book(book_name)
+    catalog = _backup_catalog()
+    store = backup_store()
+    if not catalog.count(book):
+        return f"No backups found for {book}"
     
-    if not backups:
-        return f"No backup files found matching pattern: {pattern}"
+    # Range scan of the backups before the cutoff, plus those the policy drops
+    doomed = {}
+    if days or before_date:
+        for entry in catalog.entries(book, end=cutoff):
+            doomed[(entry["location"], entry["name"])] = entry
+    if retention:
+        for entry in catalog.expired(retention, book=book):
+            doomed[(entry["location"], entry["name"])] = entry
     
-    deleted = []
-    remaining = []
-    
-    for backup in backups:
-        # Extract timestamp from filename
-        try:
-            timestamp_str = backup.split('.')[-2]
-            timestamp = datetime.strptime(timestamp_str, '%Y%m%d%H%M%S')
-            
-            if timestamp < cutoff:
-                os.remove(backup)
-                deleted.append(backup)
-            else:
-                remaining.append(backup)
-        except (IndexError, ValueError):
-            continue
+    deleted = [_backup_label(entry) for entry in doomed.values()]
+    _, freed = remove_backups(doomed.values(), catalog, store)
+    remaining = [_backup_label(entry) for entry in catalog.entries(book)]
     
     # Build result message
     result = []
     if deleted:
         result.append(Fore.YELLOW + f"Deleted {len(deleted)} backups:")
         result.extend(f"  - {f}" for f in deleted)
+        result.append(Fore.YELLOW + f"Freed {format_size(freed)}")
     else:
-        result.append(Fore.YELLOW + "No backups older than cutoff found")
+        result.append(Fore.YELLOW + "No backups to purge found")
     
     if remaining:
         result.append(Fore.GREEN + f"\n{len(remaining)} backups remain:")
@@ -796,7 +925,137 @@ async def purge_backups(
     log.debug(f"Purge backups completed for book: {book_name}")
     return "\n".join(result)
 
+
+def _backup_catalog():
+    """
+    The backup catalog. The sweeper keeps it current while the CLI runs; otherwise
+    (and on first use) it is refreshed from the directories and the store here.
+    """
+    catalog = backup_catalog()
+    if not catalog.built() or backup_scheduler is None or backup_scheduler._sweeper is None:
+        catalog.refresh(('.', 'backups'), backup_store())
+    return catalog
+
+
+def _backup_label(entry: dict) -> str:
+    """Where a catalogued backup is: its file path, or 'name (store)'."""
+    if entry["location"] == STORE:
+        return f"{entry['name']} (store)"
+    return os.path.relpath(entry["path"])
+
+
+def _backup_book(book_name: str = None) -> str:
+    """Book file name backups are named after: 'mybook' or 'mybook.gnucash' -> 'mybook.gnucash'."""
+    name = book_name or get_active_book()
+    if not name:
+        return None
+    name = os.path.basename(name)
+    return name if name.endswith('.gnucash') else f"{name}.gnucash"
+
+
+@gnucash_agent.tool
+@tool_executor.reads
+async def list_backups(ctx: RunContext[GnuCashQuery], book_name: str = None) -> str:
+    """List the backups of a book from the backup catalog: backup files in the current
+    directory and in backups/, and backups in the backup store.
+
+    Args:
+        book_name (str, optional): Book name, with or without .gnucash (default: the active book)
+
+    Returns - str: Table of backups (timestamp, size, space used in the store) and store totals
+    """
+    log.debug(f"Entering list_backups with book_name: {book_name}")
+    book = _backup_book(book_name)
+    if not book:
+        return "No active book. Please give a book name or open a book first."
+    from tabulate import tabulate
+
+    try:
+        store = backup_store()
+        stored_bytes = {entry["name"]: entry["stored_bytes"] for entry in store.list(book)} if store else {}
+        rows = []
+        for entry in _backup_catalog().entries(book):
+            new_bytes = stored_bytes.get(entry["name"]) if entry["location"] == STORE else None
+            rows.append((entry["timestamp"], format_size(entry["size"] or 0),
+                         "-" if new_bytes is None else format_size(new_bytes),
+                         "store" if entry["location"] == STORE else os.path.relpath(entry["path"])))
+        if not rows:
+            return f"No backups found for {book}"
+        table = tabulate([(f"{stamp:%Y-%m-%d %H:%M:%S}", *rest) for stamp, *rest in rows],
+                         headers=["Backup", "Size", "New in store", "Where"], tablefmt="simple")
+        output = Fore.CYAN + f"Backups of {book}\n" + Fore.RESET + table
+        if store:
+            stats = store.stats()
+            output += (f"\n\nBackup store: {stats['backups']} backups of {format_size(stats['size'])} "
+                       f"stored in {format_size(stats['file_bytes'])}")
+        log.debug(f"List backups completed: {len(rows)} backups")
+        return output
+    except Exception as e:
+        log.exception("Error listing backups")
+        return f"Error listing backups: {str(e)}"
+
+
 @gnucash_agent.tool
+@tool_executor.exclusive
+async def restore_backup(ctx: RunContext[GnuCashQuery], timestamp: str, book_name: str = None,
+                         output_file: str = None) -> str:
+    """Restore a backup from the backup store.
+
+    Without output_file the book itself is replaced; its current state is first added
+    to the backup store, so a restore can be undone with another restore.
+    Double check with the user before restoring over the book.
+
+    Args:
+        timestamp (str): Backup timestamp, YYYYMMDDHHMMSS or a unique prefix (e.g. 20240315, 2024-03-15 14:30)
+        book_name (str, optional): Book name, with or without .gnucash (default: the active book)
+        output_file (str, optional): Write the backup to this file instead of replacing the book
+
+    Returns - str: Success message or error details
+    """
+    log.debug(f"Entering restore_backup with timestamp: {timestamp}, book_name: {book_name}, output_file: {output_file}")
+    book = _backup_book(book_name)
+    if not book:
+        return "No active book. Please give a book name or open a book first."
+    store = backup_store()
+    if store is None:
+        return "The backup store is disabled (GC_CLI_BACKUP_STORE=0)."
+
+    try:
+        matches = store.find(timestamp, book)
+        if not matches:
+            return f"No stored backup of {book} matches {timestamp}. Use list_backups to see them."
+        if len(matches) > 1:
+            listed = "\n".join(f"  - {name}" for name in matches[:20])
+            return f"{len(matches)} backups of {book} match {timestamp}, please be more specific:\n{listed}"
+        name = matches[0]
+
+        if output_file:
+            size = store.restore(name, output_file)
+            return f"Restored backup {name} to {output_file} ({format_size(size)})"
+
+        active = get_active_book()
+        target = active if active and os.path.basename(active) == book else book
+        if target == active:
+            # Accepted postings (group commit, --script batch) belong in the state being
+            # replaced; warm sessions would keep reading the replaced file
+            book_pool.commit_batch()
+            book_pool.invalidate()
+        undo = ""
+        if os.path.exists(target):
+            # Keep the state being replaced
+            safety = store.unused_name(book)
+            store.add(target, name=safety)
+            log.debug(f"Saved current book as {safety}")
+            undo = f"; its previous state is backup {safety}"
+        size = store.restore(name, target)
+        log.debug(f"Restore backup completed: {name} -> {target}")
+        return f"Restored {target} from backup {name} ({format_size(size)}){undo}"
+    except Exception as e:
+        log.exception("Error restoring backup")
+        return f"Error restoring backup: {str(e)}"
+
+@gnucash_agent.tool
+@tool_executor.writes
 async def create_stock_sub_account(
     ctx: RunContext[GnuCashQuery],
     ticker_symbol: str,
@@ -827,56 +1086,50 @@ async def create_stock_sub_account(
         return "No active book. Please create or open a book first."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        
-        # Use ticker symbol as account name if none provided
-        if account_name is None:
-            account_name = ticker_symbol
-            
-        # Use default namespace if none provided
-        if namespace is None:
-            namespace = os.getenv('GC_CLI_COMMODITY_NAMESPACE', 'NASDAQ')
-            
-        log.debug(f"Creating stock account: {account_name} ({namespace}:{ticker_symbol})")
-        
-        # First ensure the commodity (stock) exists
-        create_commodity = False
-        try:
-            stock = book.commodities(namespace=namespace, mnemonic=ticker_symbol)
-            log.debug(f"Found existing stock commodity: {stock.mnemonic}")
-        except KeyError:
-            # Create new stock commodity if it doesn't exist
-            create_commodity = True
-
-        if create_commodity:
-            log.debug(f"Creating new stock commodity: {ticker_symbol}")
-            stock = piecash.Commodity(
-                namespace=namespace,
-                mnemonic=ticker_symbol,
-                fullname=account_name,
-                fraction=1000,  # Standard fraction for stocks
-                book=book
-            )
-            book.save()
-            log.debug(f"Created new stock commodity: {stock.mnemonic}")
-            
-        # Check if stock account already exists
-        try:
-            existing_account = book.accounts.get(fullname=f"{parent_path}:{account_name}")
-            log.debug(f"Stock account already exists: {existing_account.fullname}")
-            return f"Stock account already exists: {existing_account.fullname}"
-        except KeyError:
-            pass
-
-        # Find parent account
-        try:
-            parent = book.accounts.get(fullname=parent_path)
-        except KeyError:
-            log.error(f"Parent account not found: {parent_path}")
-            return f"Parent account path {parent_path} does not exist"
-            
-        # Create the stock account
-        with book:
+        with get_book(readonly=False) as book:
+            # Use ticker symbol as account name if none provided
+            if account_name is None:
+                account_name = ticker_symbol
+
+            # Use default namespace if none provided
+            if namespace is None:
+                namespace = os.getenv('GC_CLI_COMMODITY_NAMESPACE', 'NASDAQ')
+
+            log.debug(f"Creating stock account: {account_name} ({namespace}:{ticker_symbol})")
+
+            # First ensure the commodity (stock) exists
+            prices = book.price_store
+            stock = prices.commodity(namespace, ticker_symbol)
+            if stock is not None:
+                log.debug(f"Found existing stock commodity: {stock.mnemonic}")
+            else:
+                # Create new stock commodity if it doesn't exist
+                log.debug(f"Creating new stock commodity: {ticker_symbol}")
+                stock = piecash.Commodity(
+                    namespace=namespace,
+                    mnemonic=ticker_symbol,
+                    fullname=account_name,
+                    fraction=1000,  # Standard fraction for stocks
+                    book=book
+                )
+                book.save()
+                prices.add_commodity(stock)
+                log.debug(f"Created new stock commodity: {stock.mnemonic}")
+
+            # Check if stock account already exists
+            accounts = book.account_index
+            existing_account = accounts.get(f"{parent_path}:{account_name}")
+            if existing_account:
+                log.debug(f"Stock account already exists: {existing_account.fullname}")
+                return f"Stock account already exists: {existing_account.fullname}"
+
+            # Find parent account
+            parent = accounts.get(parent_path)
+            if not parent:
+                log.error(f"Parent account not found: {parent_path}")
+                return f"Parent account path {parent_path} does not exist"
+
+            # Create the stock account
             stock_account = Account(
                 name=account_name,
                 type="STOCK",
@@ -887,6 +1140,7 @@ async def create_stock_sub_account(
                 book=book
             )
             stock_account_name = stock_account.fullname
+            accounts.add(stock_account)
             
             # Set initial price if provided
             if initial_price is not None:
@@ -899,13 +1153,12 @@ async def create_stock_sub_account(
                 #     "value": initial_price, # Decimal(str(initial_price)),
                 #     "currency": book.default_currency
                 # }])
-                set_commodity_price(book, "NSE", stock.mnemonic,
+                set_commodity_price(book, stock.namespace, stock.mnemonic,
                                     book.default_currency.mnemonic,
                                     Decimal(str(initial_price)), datetime.now())
                 
             book.save()
             
-        book.close()
         log.debug(f"Stock account created successfully: {stock_account_name}")
         return f"Successfully created stock account: {stock_account_name}"
         
@@ -915,15 +1168,15 @@ async def create_stock_sub_account(
 
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def create_currencies(ctx):
 
     """
     Create basic currencies (INR, GBP, EUR, USD) if they don't exist.
     """
     log.debug("Entering create_currencies method")
-    book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-    ensure_basic_currencies(book)
-    book.close()
+    with get_book(readonly=False) as book:
+        ensure_basic_currencies(book)
     log.debug("Exiting create_currencies ...")
 
 def ensure_basic_currencies(book):
@@ -931,67 +1184,40 @@ def ensure_basic_currencies(book):
     Ensures that basic currencies (INR, GBP, EUR, USD) exist in the book.
     Creates them if missing.
 
+    Currencies are looked up once per session through the book's price store,
+    so repeated calls are cheap and only save when something was created.
+
     Args:
-        book: GnuCash book instance
+        book: Pooled GnuCash book (see shared_vars.get_book)
     Returns:
         dict: Dictionary of currency objects keyed by mnemonic
     """
     log.debug("Entering ensure_basic_currencies method")
 
-    with book:
-        # Currency definitions
-        currencies = {
-            "INR": {"fullname": "Indian Rupee", "fraction": 100},
-            "GBP": {"fullname": "British Pound", "fraction": 100},
-            "EUR": {"fullname": "Euro", "fraction": 100},
-            "USD": {"fullname": "US Dollar", "fraction": 100}
-        }
-
-        currency_objects = {}
-
-        try:
-            for mnemonic, details in currencies.items():
-                create_commodity = False
-                try:
-                    # Try to get existing currency
-                    currency = book.commodities(namespace="CURRENCY", mnemonic=mnemonic)
-                    log.debug(f"Found existing currency {mnemonic}")
-                except KeyError:
-                    # Currency doesn't exist, create it
-                    log.debug(f"Did not find currency {mnemonic}")
-                    create_commodity = True
-
-                if create_commodity:
-                    log.debug(f"Creating new currency {mnemonic}")
-                    currency = Commodity(namespace="CURRENCY",
-                                         mnemonic=mnemonic,
-                                         fullname=details["fullname"],
-                                         fraction=details["fraction"],
-                                         book=book)
-                    # book.flush()
-                    log.debug(f"Created new currency {mnemonic}")
-
-                currency_objects[mnemonic] = currency
-            log.debug(currency_objects)
-
+    try:
+        currencies = book.price_store.currencies()
+        currency_objects = {mnemonic: currencies[mnemonic] for mnemonic in BASIC_CURRENCIES}
+        if not book.is_saved:
             book.save()
-            log.debug("All basic currencies ensured")
-            return currency_objects
+        log.debug("All basic currencies ensured")
+        return currency_objects
 
-        except Exception as e:
-            log.exception(f"Failed to ensure basic currencies: {str(e)}")
-            raise
+    except Exception as e:
+        log.exception(f"Failed to ensure basic currencies: {str(e)}")
+        raise
 
-        finally:
-            log.debug("Exiting ensure_basic_currencies ...")
+    finally:
+        log.debug("Exiting ensure_basic_currencies ...")
 
 def set_commodity_price(book, namespace, commodity_mnemonic, currency_mnemonic, price_value, price_date):
     """
     Set or update the price of a commodity for a specific date, ensuring the currency exists.
-    If a price already exists for the given date and commodity, it will be updated.
+    If a price already exists for the given commodity, currency and date, it will be updated.
+
+    The change is not saved: the caller commits it together with its own changes.
 
     Args:
-        book: GnuCash book instance
+        book: Pooled GnuCash book (see shared_vars.get_book)
         namespace (str): Namespace of the commodity (e.g., "NSE")
         commodity_mnemonic (str): Symbol/mnemonic of the commodity
         currency_mnemonic (str): Symbol of the currency
@@ -1000,40 +1226,16 @@ def set_commodity_price(book, namespace, commodity_mnemonic, currency_mnemonic,
     """
     log.debug(f"Entering set_commodity_price method !! {namespace} {commodity_mnemonic} {currency_mnemonic} {price_value} {price_date}")
     try:
-        # Ensure currency exists
-        currencies = ensure_basic_currencies(book)
-
-        # Get the commodity
-        commodity = book.commodities(namespace=namespace, mnemonic=commodity_mnemonic)
-        currency = currencies[currency_mnemonic]  # Use the currency we ensured exists
-
-        if isinstance(price_date, datetime):
-            price_date = price_date.date()
-
-        # Check if a price already exists for this date and commodity
-        existing_price = None
-        for price in book.prices:
-            if (price.commodity == commodity and
-                    price.date == price_date):
-                existing_price = price
-                break
+        prices = book.price_store
+        commodity = prices.commodity(namespace, commodity_mnemonic)
+        if commodity is None:
+            raise KeyError(f"Commodity {namespace}:{commodity_mnemonic} not found")
+        currency = prices.currency(currency_mnemonic)
 
-        if existing_price:
-            # Update existing price
-            existing_price.value = price_value
-            existing_price.currency = currency
-            log.debug(f"Updated existing price to {price_value} {currency_mnemonic} for {namespace}:{commodity_mnemonic}")
-        else:
-            # Create new price
-            new_price = Price(commodity=commodity,
-                              currency=currency,
-                              date=price_date,
-                              value=price_value,
-                              type='last')
-            book.prices.append(new_price)
+        if prices.upsert(commodity, currency, price_date, price_value):
             log.debug(f"Set new price {price_value} {currency_mnemonic} for {namespace}:{commodity_mnemonic}")
-
-        book.save()
+        else:
+            log.debug(f"Updated existing price to {price_value} {currency_mnemonic} for {namespace}:{commodity_mnemonic}")
 
     except Exception as e:
         log.exception(f"Failed to set commodity price: {str(e)}")
@@ -1043,12 +1245,62 @@ def set_commodity_price(book, namespace, commodity_mnemonic, currency_mnemonic,
 
 
 @gnucash_agent.tool
-async def create_accounts_from_file(ctx: RunContext[GnuCashQuery], file_path: str) -> str:
+@tool_executor.writes
+async def set_prices(ctx: RunContext[GnuCashQuery], file_path: str, namespace: str = None,
+                     date_format: str = "%Y-%m-%d") -> str:
+    """Load many commodity prices (e.g. a nightly quote file) from a CSV file in one commit.
+
+    The CSV needs a header with symbol, date and price columns; currency and namespace
+    columns are optional. Existing prices for the same commodity, currency and date are
+    updated, others are created.
+
+    Args:
+        file_path (str): Path to the CSV quote file
+        namespace (str, optional): Commodity namespace for rows without one (default: GC_CLI_COMMODITY_NAMESPACE or NASDAQ)
+        date_format (str, optional): strptime format of the dates (default: %Y-%m-%d)
+
+    Returns - str: Number of prices created/updated and any skipped quotes
+    """
+    log.debug(f"Entering set_prices with file_path: {file_path}, namespace: {namespace}")
+    if not get_active_book():
+        return "No active book. Please create or open a book first."
+
+    try:
+        namespace = namespace or os.getenv('GC_CLI_COMMODITY_NAMESPACE', 'NASDAQ')
+        errors = []
+        quotes = read_quotes(file_path, namespace, date_format, errors)
+
+        with get_book(readonly=False) as book:
+            created, updated, skipped = book.price_store.upsert_many(quotes)
+            book.save()
+
+        errors.extend(skipped)
+        result = f"Prices loaded: {created} created, {updated} updated, {len(errors)} skipped"
+        if errors:
+            result += "\n" + "\n".join(f"  - {e}" for e in errors[:20])
+            if len(errors) > 20:
+                result += f"\n  ... and {len(errors) - 20} more"
+        log.debug(result)
+        return result
+
+    except Exception as e:
+        log.exception("Error loading prices")
+        return f"Error loading prices: {str(e)}"
+
+
+@gnucash_agent.tool
+@tool_executor.writes
+async def create_accounts_from_file(ctx: RunContext[GnuCashQuery], file_path: str, dry_run: bool = False) -> str:
     """Create account hierarchy from a YAML file. This process is also called initialization. The user will provide
     the names of the files to use. It should read and processed.
 
+    The whole file is validated first. Accounts, stock commodities, prices and opening
+    balances are then built in memory and committed in a single transaction, so either
+    the whole file is imported or nothing is.
+
     Args:
         file_path (str): Path to YAML file containing account structure
+        dry_run (bool, optional): Only validate the file and report what would be created
 
     Returns - str: Summary of created accounts and any errors
 
@@ -1056,7 +1308,7 @@ async def create_accounts_from_file(ctx: RunContext[GnuCashQuery], file_path: st
         FileNotFoundError: If YAML file doesn't exist
         yaml.YAMLError: If YAML is invalid
     """
-    log.debug(f"Entering create_accounts_from_file with file_path: {file_path}")
+    log.debug(f"Entering create_accounts_from_file with file_path: {file_path}, dry_run: {dry_run}")
     # global active_book
     if not get_active_book():
         log.debug("No active book. Please create or open a book first.")
@@ -1065,6 +1317,7 @@ async def create_accounts_from_file(ctx: RunContext[GnuCashQuery], file_path: st
     try:
         print(Fore.YELLOW + f"DEBUG: Attempting to load YAML file from {file_path}")
         # Load YAML file
+        import yaml
         with open(file_path, 'r') as f:
             account_data = yaml.safe_load(f)
         
@@ -1073,176 +1326,32 @@ async def create_accounts_from_file(ctx: RunContext[GnuCashQuery], file_path: st
             return "Invalid YAML format - missing 'accounts' section"
             
         print(Fore.YELLOW + f"DEBUG: YAML file loaded successfully, found {len(account_data['accounts'])} root accounts")
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        results = []
-        
-        def create_accounts(accounts, parent=None):
-            print(Fore.YELLOW + f"DEBUG: Processing {len(accounts)} accounts under parent: {parent.fullname if parent else 'root'}")
-            
-            for acc in accounts:
-                try:
-                    # Check if account already exists
-                    fullname = f"{parent.fullname}:{acc['name']}" if parent else acc['name']
-                    existing = next(
-                        (a for a in book.accounts
-                         if a.name == acc['name'] and
-                         (parent is None or a.parent == parent)),
-                        None
-                    )
-
-                    if existing:
-                        print(Fore.YELLOW + f"DEBUG: Account already exists: {fullname} - checking for children")
-                        results.append(f"Account already exists: {fullname} - checking for children")
-                        new_acc = existing
-                    else:
-                        # Handle stock accounts differently
-                        if acc.get('type', '').upper() == "STOCK":
-                            print(Fore.YELLOW + f"DEBUG: Creating stock account: {acc['name']}")
-                            namespace = acc.get('namespace', os.getenv('GC_CLI_COMMODITY_NAMESPACE', 'NSE'))
-                            create_commodity = False
-                            try:
-                                stock_commodity = book.commodities(namespace=namespace, mnemonic=acc['name'])
-                                print(Fore.YELLOW + f"DEBUG: Found existing commodity: {stock_commodity.mnemonic}")
-                            except KeyError:
-                                create_commodity = True
-
-                            if create_commodity:
-                                print(Fore.YELLOW + f"DEBUG: Creating new commodity: {acc['name']} in namespace {namespace}")
-                                stock_commodity = piecash.Commodity(
-                                    namespace=namespace,
-                                    mnemonic=acc['name'],
-                                    fullname=acc['name'],
-                                    fraction=1000,
-                                    book=book
-                                )
-                                book.save()
-                                print(Fore.YELLOW + f"DEBUG: !!! Created new commodity: {stock_commodity.mnemonic}")
-                                set_commodity_price(book,
-                                                    "NSE",
-                                                    stock_commodity.mnemonic,
-                                                    book.default_currency.mnemonic,
-                                                    Decimal(str(acc.get('initial_price', 0.0))),
-                                                    datetime.now())
-
-                            new_acc = Account(
-                                name=acc['name'],
-                                type="STOCK",
-                                commodity=stock_commodity,
-                                commodity_scu=1000,
-                                parent=parent or book.root_account,
-                                description=acc.get('description', '')
-                            )
-                            book.save()
-                            print(Fore.YELLOW + f"DEBUG: Created and saved new stock account: {new_acc.fullname}")
-                        else:
-                            # Create new account
-                            print(Fore.YELLOW + f"DEBUG: Creating new account: {acc['name']} of type {acc.get('type', 'ASSET')}")
-                            new_acc = Account(
-                                name=acc['name'],
-                                type=acc.get('type', parent.type if parent is not None else "ASSET").upper(), # default to parent account type
-                                commodity=book.default_currency,
-                                parent=parent or book.root_account,
-                                description=acc.get('description', '')
-                            )
-                            # Save immediately after account creation
-                            book.save()
-                            print(Fore.YELLOW + f"DEBUG: Created and saved new account: {new_acc.fullname}")
-
-                    # Handle initial balance if provided
-                    if 'initial_balance' in acc:
-                        print(Fore.YELLOW + f"DEBUG: Setting initial balance of {acc['initial_balance']} for account {acc['name']} (type: {new_acc.type})")
-                        if new_acc.type == "ASSET":
-                            print(Fore.YELLOW + f"DEBUG: Processing ASSET account {new_acc.fullname}")
-                        balance = Decimal(str(acc['initial_balance']))
-                        # Handle balance date with debug logging
-                        balance_date_str = acc.get('balance_date', date.today().isoformat())
-                        print(Fore.YELLOW + f"DEBUG: Processing balance date string: {balance_date_str}")
-                        try:
-                            balance_date = datetime.strptime(balance_date_str, '%Y-%m-%d').date()
-                            enter_date = datetime.combine(balance_date, datetime.min.time())  # Convert to datetime
-                            print(Fore.YELLOW + f"DEBUG: Parsed balance date: {balance_date} (type: {type(balance_date)})")
-                            print(Fore.YELLOW + f"DEBUG: Using enter_date: {enter_date} (type: {type(enter_date)})")
-                        except Exception as e:
-                            print(Fore.RED + f"ERROR: Failed to parse balance date '{balance_date_str}': {str(e)}")
-                            raise
-
-                        # Create offsetting transaction with specified date
-                        book.save()
-                        print(Fore.YELLOW + f"DEBUG: Account saved successfully before creating transaction")
-
-                        # Refresh account references to ensure they're in the current session
-                        new_acc = book.accounts.get(fullname=new_acc.fullname)
-                        equity_acc = book.accounts.get(fullname="Equity")
-                        if not new_acc or not equity_acc:
-                            raise ValueError("Failed to refresh account references in session")
-
-                        print(Fore.YELLOW + f"DEBUG: Checking account type for transaction creation: {new_acc.type}")
-                        if new_acc.type in ["ASSET", "BANK"]:
-                            print(Fore.YELLOW + f"DEBUG: Creating ASSET/BANK transaction for {new_acc.fullname}")
-                            # with book:
-                            print(Fore.YELLOW + f"DEBUG: Creating transaction for {new_acc.fullname} with balance {balance} on {balance_date}")
-                            tx = Transaction(
-                                currency=book.default_currency,
-                                description="Initial balance",
-                                splits=[
-                                    Split(account=new_acc, value=balance),
-                                    Split(account=equity_acc, value=-balance)
-                                ],
-                                post_date=balance_date,
-                                enter_date=enter_date,  # Use the datetime version
-                            )
-                            print(Fore.YELLOW + f"DEBUG: Transaction created: {tx}")
-                            book.save()
-                            print(Fore.YELLOW + f"DEBUG: Transaction saved successfully")
-                        elif new_acc.type in ["LIABILITY", "CREDIT"]:
-                            # with book:
-                            print(Fore.YELLOW + f"DEBUG: Creating liability transaction for {new_acc.fullname} with balance {balance} on {balance_date}")
-                            tx = Transaction(
-                                currency=book.default_currency,
-                                description="Initial balance",
-                                splits=[
-                                    Split(account=new_acc, value=-balance),
-                                    Split(account=equity_acc, value=balance)
-                                ],
-                                post_date=balance_date,
-                                enter_date=enter_date,  # Use the datetime version
-                            )
-                            print(Fore.YELLOW + f"DEBUG: Liability transaction created: {tx}")
-                            book.save()
-                            print(Fore.YELLOW + f"DEBUG: Liability transaction saved successfully")
-
-                    print(Fore.YELLOW + f"DEBUG: Successfully created account: {fullname}")
-                    results.append(f"Created account: {fullname}")
-
-                    # Recursively create child accounts (even if account already existed)
-                    if 'children' in acc:
-                        print(Fore.YELLOW + f"DEBUG: Found {len(acc['children'])} child accounts for {fullname}")
-                        print(Fore.YELLOW + f"DEBUG: Child accounts: {[c['name'] for c in acc['children']]}")
-
-                        # Process children accounts
-                        parent_acc = book.accounts.get(fullname=new_acc.fullname)
-                        if not parent_acc:
-                            raise ValueError(f"Parent account {new_acc.fullname} not found in session")
-                        create_accounts(acc['children'], parent_acc)
-                    else:
-                        print(Fore.YELLOW + f"DEBUG: No children found for {fullname}")
-
-                except Exception as e:
-                    results.append(f"Error creating account {acc.get('name', '')}: {str(e)}")
-                    continue
-        # Create accounts in the book
-        with book:
-            create_accounts(account_data['accounts'])
+        with get_book(readonly=dry_run) as book:
+            index = book.account_index
+
+            # Validate the whole file before touching the book
+            errors, stats = validate_account_tree(account_data['accounts'], VALID_ACCOUNT_TYPES, index)
+            summary = (f"{stats['new']} accounts to create, {stats['existing']} already exist, "
+                       f"{stats['opening_balances']} opening balances, {stats['stocks']} stock accounts")
+            if errors:
+                log.debug(f"Validation of {file_path} failed with {len(errors)} errors")
+                return f"Validation failed, nothing was imported ({len(errors)} errors):\n" + "\n".join(f"  - {e}" for e in errors)
+            if dry_run:
+                return f"Dry run OK for {file_path}: {summary}"
+
+            # Build everything in the session and commit once
+            namespace = os.getenv('GC_CLI_COMMODITY_NAMESPACE', 'NSE')
+            results = import_account_tree(book, account_data['accounts'], index, namespace)
             book.save()
         
-        book.close()
         log.debug(f"Create accounts from file completed: {file_path}")
-        return "\n".join(results)
+        return "\n".join(results + [f"Imported {file_path} in one commit: {summary}"])
     
     except Exception as e:
         return f"Error creating accounts from file: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.reads
 async def get_default_currency(ctx: RunContext[GnuCashQuery]) -> str:
     """Get the default currency for the active book.
 
@@ -1257,9 +1366,8 @@ async def get_default_currency(ctx: RunContext[GnuCashQuery]) -> str:
         return "No active book. Please create or open a book first."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        currency_code = book.default_currency.mnemonic
-        book.close()
+        with get_book(readonly=True) as book:
+            currency_code = book.default_currency.mnemonic
         log.debug(f"Got default currency: {currency_code}")
         return f"Default currency is {currency_code}"
         
@@ -1267,6 +1375,7 @@ async def get_default_currency(ctx: RunContext[GnuCashQuery]) -> str:
         return f"Error getting default currency: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def set_accounts_currency(ctx: RunContext[GnuCashQuery], currency_code: str) -> str:
     """Set the currency for all accounts in the active book.
 
@@ -1288,10 +1397,9 @@ async def set_accounts_currency(ctx: RunContext[GnuCashQuery], currency_code: st
         return "Invalid currency code. Must be a 3-letter ISO code (e.g., USD, EUR, GBP)"
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        currency_code = currency_code.upper()
-        
-        with book:
+        with get_book(readonly=False) as book:
+            currency_code = currency_code.upper()
+
             # Attempt to get the currency (will raise if invalid)
             new_currency = book.currencies(mnemonic=currency_code)
             if not new_currency:
@@ -1306,7 +1414,6 @@ async def set_accounts_currency(ctx: RunContext[GnuCashQuery], currency_code: st
                     
             book.save()
             
-        book.close()
         log.debug(f"Changed accounts currency to {currency_code} for {updated} accounts")
         return f"Successfully set currency to {currency_code} for {updated} accounts"
         
@@ -1314,6 +1421,7 @@ async def set_accounts_currency(ctx: RunContext[GnuCashQuery], currency_code: st
         return f"Error setting accounts currency: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def set_accounts_precision(ctx: RunContext[GnuCashQuery], precision: int = 1000) -> str:
     """Set the precision (number of decimal places) for all non-top-level accounts.
 
@@ -1335,11 +1443,10 @@ async def set_accounts_precision(ctx: RunContext[GnuCashQuery], precision: int =
         return "Precision must be a positive integer."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        updated = 0
-        
-        affected_accounts = []
-        with book:
+        with get_book(readonly=False) as book:
+            updated = 0
+
+            affected_accounts = []
             # Get all accounts except root and top-level accounts
             top_level_accounts = [acc.name for acc in book.root_account.children]
             
@@ -1352,7 +1459,6 @@ async def set_accounts_precision(ctx: RunContext[GnuCashQuery], precision: int =
                     
             book.save()
             
-        book.close()
         log.debug(f"Set accounts precision to {precision} for {updated} accounts")
         return f"Successfully set precision to {precision} for {updated} accounts:\n" + "\n".join(f"  - {acc}" for acc in affected_accounts)
         
@@ -1360,6 +1466,7 @@ async def set_accounts_precision(ctx: RunContext[GnuCashQuery], precision: int =
         return f"Error setting accounts precision: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def set_default_currency(ctx: RunContext[GnuCashQuery], currency_code: str) -> str:
     """Set the default currency for the active book.
 
@@ -1381,10 +1488,9 @@ async def set_default_currency(ctx: RunContext[GnuCashQuery], currency_code: str
         return "Invalid currency code. Must be a 3-letter ISO code (e.g., USD, EUR, GBP)"
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        currency_code = currency_code.upper()
-        
-        with book:
+        with get_book(readonly=False) as book:
+            currency_code = currency_code.upper()
+
             # Attempt to get the currency (will raise if invalid)
             new_currency = book.currencies(mnemonic=currency_code)
             if not new_currency:
@@ -1394,7 +1500,6 @@ async def set_default_currency(ctx: RunContext[GnuCashQuery], currency_code: str
             book.default_currency = new_currency
             book.save()
             
-        book.close()
         log.debug(f"Changed default currency to {currency_code}")
         return f"Successfully set default currency to {currency_code}"
         
@@ -1402,6 +1507,7 @@ async def set_default_currency(ctx: RunContext[GnuCashQuery], currency_code: str
         return f"Error setting default currency: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def save_as_template(ctx: RunContext[GnuCashQuery], template_name: str) -> str:
     """Save current book as a template by copying account structure without transactions.
 
@@ -1431,47 +1537,45 @@ async def save_as_template(ctx: RunContext[GnuCashQuery], template_name: str) ->
         
     try:
         # Open source book
-        source_book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        
-        # Create new template book
-        template_path = f"{template_name}.gnucash"
-        template_book = piecash.create_book(
-            template_path,
-            overwrite=True,
-            currency=source_book.default_currency.mnemonic,
-            keep_foreign_keys=False
-        )
-        
-        print(Fore.YELLOW + f"DEBUG: Creating template {template_path} from {get_active_book()}")
-        
-        def copy_account_structure(src_account, parent=None):
-            """Recursively copy account hierarchy without transactions."""
-            if src_account.type == "ROOT":
-                dest_parent = template_book.root_account
-            else:
-                # Create new account in template
-                dest_account = Account(
-                    name=src_account.name,
-                    type=src_account.type,
-                    commodity=template_book.default_currency,
-                    parent=parent or template_book.root_account,
-                    description=src_account.description,
-                    code=src_account.code,
-                    placeholder=src_account.placeholder
-                )
-                dest_parent = dest_account
-            
-            # Recursively copy children
-            for child in src_account.children:
-                copy_account_structure(child, dest_parent)
-        
-        # Copy account hierarchy
-        with template_book:
-            copy_account_structure(source_book.root_account)
-            template_book.save()
-        
-        source_book.close()
-        template_book.close()
+        with get_book(readonly=True) as source_book:
+            # Create new template book
+            template_path = f"{template_name}.gnucash"
+            template_book = piecash.create_book(
+                template_path,
+                overwrite=True,
+                currency=source_book.default_currency.mnemonic,
+                keep_foreign_keys=False
+            )
+
+            print(Fore.YELLOW + f"DEBUG: Creating template {template_path} from {get_active_book()}")
+
+            def copy_account_structure(src_account, parent=None):
+                """Recursively copy account hierarchy without transactions."""
+                if src_account.type == "ROOT":
+                    dest_parent = template_book.root_account
+                else:
+                    # Create new account in template
+                    dest_account = Account(
+                        name=src_account.name,
+                        type=src_account.type,
+                        commodity=template_book.default_currency,
+                        parent=parent or template_book.root_account,
+                        description=src_account.description,
+                        code=src_account.code,
+                        placeholder=src_account.placeholder
+                    )
+                    dest_parent = dest_account
+
+                # Recursively copy children
+                for child in src_account.children:
+                    copy_account_structure(child, dest_parent)
+
+            # Copy account hierarchy
+            with template_book:
+                copy_account_structure(source_book.root_account)
+                template_book.save()
+
+            template_book.close()
         
         log.debug(f"Template saved: {template_path}")
         return f"Successfully created template {template_path} from {get_active_book()}"
@@ -1480,6 +1584,8 @@ async def save_as_template(ctx: RunContext[GnuCashQuery], template_name: str) ->
         return f"Error creating template: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
+@journaled
 async def add_stock_transaction(
     ctx: RunContext[GnuCashQuery],
     stock_symbol: str,
@@ -1527,49 +1633,47 @@ async def add_stock_transaction(
         total_amount = abs(units) * price
         is_purchase = units > 0
 
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
+        with get_book(readonly=False) as book:
+            # Find the stock account
+            accounts = book.account_index
+            stock_acc = accounts.get(stock_account)
+            if not stock_acc:
+                return accounts.not_found("Stock account", stock_account)
+
+            # Handle credit account
+            if credit_account is None:
+                if not stock_acc.parent:
+                    return f"Stock account '{stock_acc.fullname}' has no parent account to use as default credit account"
+                credit_acc = stock_acc.parent
+            else:
+                credit_acc = accounts.get(credit_account)
+                if not credit_acc:
+                    return accounts.not_found("Credit account", credit_account)
 
-        # Find the stock account
-        stock_acc = book.accounts.get(fullname=stock_account)
-        if not stock_acc:
-            book.close()
-            return f"Stock account '{stock_account}' not found."
-
-        # Handle credit account
-        if credit_account is None:
-            if not stock_acc.parent:
-                book.close()
-                return f"Stock account '{stock_acc.fullname}' has no parent account to use as default credit account"
-            credit_acc = stock_acc.parent
-        else:
-            try:
-                credit_acc = book.accounts.get(fullname=credit_account)
-            except:
-                book.close()
-                return f"Credit account '{credit_account}' not found."
-
-        # Handle commission account
-        commission_acc = None
-        if commission > 0:
-            try:
-                commission_acc = book.accounts.get(fullname="Expenses:Commissions")
-            except:
-                commission_acc = Account(
-                    name="Commissions",
-                    type="EXPENSE",
-                    commodity=book.default_currency,
-                    parent=book.accounts.get(fullname="Expenses"),
-                    description="Trading commissions and fees"
-                )
+            # Handle commission account
+            commission_acc = None
+            if commission > 0:
+                commission_acc = accounts.get("Expenses:Commissions")
+                if not commission_acc:
+                    expenses_acc = accounts.get("Expenses")
+                    if not expenses_acc:
+                        return accounts.not_found("Account", "Expenses")
+                    commission_acc = Account(
+                        name="Commissions",
+                        type="EXPENSE",
+                        commodity=book.default_currency,
+                        parent=expenses_acc,
+                        description="Trading commissions and fees"
+                    )
+                    accounts.add(commission_acc)
 
-        with book:
             # First create the transaction
-            transaction = Transaction(
+            transaction = tag_posting(Transaction(
                 currency=book.default_currency,
                 description=f"{'Buy' if is_purchase else 'Sell'} {abs(units)} {stock_symbol} @ {price}",
                 post_date=transaction_date,
-                enter_date=datetime.now(),
-            )
+                enter_date=posting_time(),
+            ))
 
             # Now create and add splits to the transaction
             if is_purchase:
@@ -1614,7 +1718,7 @@ async def add_stock_transaction(
             # Update price database
             set_commodity_price(
                 book,
-                "NSE",
+                stock_acc.commodity.namespace,
                 stock_acc.commodity.mnemonic,
                 book.default_currency.mnemonic,
                 Decimal(str(price)),
@@ -1623,8 +1727,6 @@ async def add_stock_transaction(
 
             book.save()
 
-        book.close()
-
         action = "purchased" if is_purchase else "sold"
         result = (f"Successfully {action} {abs(units)} shares of {stock_symbol} "
                   f"at {price} on {transaction_date} for total {total_amount:.2f} "
@@ -1636,6 +1738,91 @@ async def add_stock_transaction(
         return f"Error adding stock transaction: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
+async def import_transactions(
+    ctx: RunContext[GnuCashQuery],
+    file_path: str,
+    account: str,
+    rules_file: str = None,
+    default_account: str = None,
+    date_format: str = "%Y-%m-%d",
+    chunk_size: int = 1000,
+    dry_run: bool = False
+) -> str:
+    """Import a bank/card statement (CSV or OFX) into an account in bulk.
+
+    The file is streamed through parse -> map accounts via rules -> validate -> insert,
+    creating one two-split transaction per statement line and committing once per
+    chunk of `chunk_size` transactions. Use this for large statements instead of
+    calling transfer_funds per line.
+
+    CSV files need a header with a date column and either an amount column or
+    debit/credit columns; description, memo and account (counter account) are optional.
+    Positive amounts are money coming into `account`.
+
+    Args:
+        file_path (str): Path to the .csv or .ofx/.qfx statement file
+        account (str): Full name of the account the statement belongs to (e.g. Assets:Bank:Checking)
+        rules_file (str, optional): YAML file with `rules: [{match: regex, account: name}]` and optional `default`
+        default_account (str, optional): Counter account for lines no rule matches
+        date_format (str, optional): strptime format of CSV dates (default: %Y-%m-%d)
+        chunk_size (int, optional): Transactions per commit (default: 1000)
+        dry_run (bool, optional): Parse, map and validate only, without writing
+
+    Returns - str: Import summary with throughput and skipped lines
+    """
+    log.debug(f"Entering import_transactions with file_path: {file_path}, account: {account}, rules_file: {rules_file}, chunk_size: {chunk_size}, dry_run: {dry_run}")
+    if not get_active_book():
+        return "No active book. Please create or open a book first."
+    if chunk_size <= 0:
+        return "Chunk size must be positive."
+
+    stats = ImportStats()
+    try:
+        rules = None
+        if rules_file:
+            import yaml
+            with open(rules_file, 'r') as f:
+                rules = yaml.safe_load(f)
+        patterns, rules_default = load_rules(rules)
+        default_account = default_account or rules_default
+
+        with get_book(readonly=dry_run) as book:
+            accounts = book.account_index
+            statement_acc = accounts.get(account)
+            if not statement_acc:
+                return accounts.not_found("Statement account", account)
+            if statement_acc.commodity != book.default_currency:
+                # Statement amounts are posted as values in the book currency
+                return (f"Statement account {statement_acc.fullname} is in {statement_acc.commodity.mnemonic}, "
+                        f"not the book currency {book.default_currency.mnemonic}; nothing was imported")
+            if statement_acc.placeholder:
+                return f"Statement account {statement_acc.fullname} is a placeholder account; nothing was imported"
+
+            if file_path.lower().endswith(('.ofx', '.qfx')):
+                lines = parse_ofx(file_path, stats)
+            else:
+                lines = parse_csv(file_path, stats, date_format)
+
+            postings = map_accounts(lines, patterns, default_account, accounts, stats)
+            postings = validate_postings(postings, statement_acc, book.default_currency, stats)
+            insert_postings(book, postings, statement_acc, stats, chunk_size, dry_run)
+
+        log.debug(f"Import transactions completed: {stats.imported} imported, {stats.skipped} skipped")
+        prefix = "Dry run: " if dry_run else ""
+        return prefix + stats.summary()
+
+    except Exception as e:
+        log.exception("Error importing transactions")
+        message = f"Error importing transactions: {str(e)}"
+        if stats.chunks and not book_pool.deferring:
+            # Saved chunks are committed; importing the whole file again would duplicate them
+            message += (f"\n{stats.imported} transactions in {stats.chunks} chunks were committed before the error, "
+                        f"up to line {stats.saved_through}. Import the lines after it to finish.")
+        return message
+
+@gnucash_agent.tool
+@tool_executor.reads
 async def search_accounts(ctx: RunContext[GnuCashQuery], pattern: str) -> str:
     """Search for accounts matching a name pattern (supports regex).
 
@@ -1658,50 +1845,47 @@ async def search_accounts(ctx: RunContext[GnuCashQuery], pattern: str) -> str:
     
     try:
         import re
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        
-        # Try to determine if the pattern is meant to be regex
-        is_regex = any(c in pattern for c in '.^$*+?{}[]\\|()')
-        
-        if is_regex:
-            try:
-                regex = re.compile(pattern, re.IGNORECASE)
-            except re.error as e:
-                return f"Invalid regex pattern: {str(e)}"
-        else:
-            # Treat as simple substring search
-            regex = re.compile(f".*{re.escape(pattern)}.*", re.IGNORECASE)
-        
-        # Search for matching accounts
-        matches = []
-        for account in book.accounts:
-            # log.debug(f"Checking {account.fullname}")
-            if account.type != "ROOT" and regex.search(account.fullname):
-                matches.append({
-                    'fullname': account.fullname,
-                    'type': account.type,
-                    'balance': account.get_balance()
-                })
-        
+        with get_book(readonly=True) as book:
+            # Try to determine if the pattern is meant to be regex
+            is_regex = any(c in pattern for c in '.^$*+?{}[]\\|()')
 
-        if not matches:
-            book.close()
-            log.debug(f"No accounts found matching pattern: {pattern}")
-            return f"No accounts found matching pattern: {pattern}"
-        
-        # Format results
-        output = [f"Found {len(matches)} matching accounts:"]
-        curr_symbol = book.default_currency.mnemonic
-        for acc in sorted(matches, key=lambda x: x['fullname']):
-            color = Fore.GREEN if acc['balance'] >= 0 else Fore.RED
-            if acc['type'] == "STOCK":
-                output.append(f"{acc['fullname']} ({acc['type']}) - {color}{acc['balance']:,.2f} Units")
+            if is_regex:
+                try:
+                    regex = re.compile(pattern, re.IGNORECASE)
+                except re.error as e:
+                    return f"Invalid regex pattern: {str(e)}"
             else:
-                output.append(f"{acc['fullname']} ({acc['type']}) - {color}{curr_symbol} {acc['balance']:,.2f}")
-        
-        log.debug(f"Search accounts completed for pattern: {pattern}")
+                # Treat as simple substring search
+                regex = re.compile(f".*{re.escape(pattern)}.*", re.IGNORECASE)
+
+            # Search for matching accounts
+            matches = []
+            balances = AccountBalances(book)
+            for account in balances.accounts:
+                # log.debug(f"Checking {account.fullname}")
+                if account.type != "ROOT" and regex.search(account.fullname):
+                    matches.append({
+                        'fullname': account.fullname,
+                        'type': account.type,
+                        'balance': balances.get_balance(account)
+                    })
+
+
+            if not matches:
+                log.debug(f"No accounts found matching pattern: {pattern}")
+                return f"No accounts found matching pattern: {pattern}"
+
+            # Format results
+            output = [f"Found {len(matches)} matching accounts:"]
+            curr_symbol = book.default_currency.mnemonic
+            for acc in sorted(matches, key=lambda x: x['fullname']):
+                color = Fore.GREEN if acc['balance'] >= 0 else Fore.RED
+                if acc['type'] == "STOCK":
+                    output.append(f"{acc['fullname']} ({acc['type']}) - {color}{acc['balance']:,.2f} Units")
+                else:
+                    output.append(f"{acc['fullname']} ({acc['type']}) - {color}{curr_symbol} {acc['balance']:,.2f}")
 
-        book.close()
+            log.debug(f"Search accounts completed for pattern: {pattern}")
         return "\n".join(output)
         
     except Exception as e:
@@ -1709,6 +1893,7 @@ async def search_accounts(ctx: RunContext[GnuCashQuery], pattern: str) -> str:
         return f"Error searching accounts: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.writes
 async def move_account(ctx: RunContext[GnuCashQuery], account_name: str, new_parent_name: str) -> str:
     """Move an account to a new parent account.
 
@@ -1735,37 +1920,34 @@ async def move_account(ctx: RunContext[GnuCashQuery], account_name: str, new_par
         return "No active book. Please create or open a book first."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        
-        # Find the accounts
-        account = book.accounts.get(fullname=account_name)
-        new_parent = book.accounts.get(fullname=new_parent_name)
-        
-        if not account:
-            book.close()
-            log.debug(f"Account '{account_name}' not found.")
-            return f"Account '{account_name}' not found."
-        if not new_parent:
-            book.close()
-            log.debug(f"New parent account '{new_parent_name}' not found.")
-            return f"New parent account '{new_parent_name}' not found."
-            
-        # Check type compatibility
-        if account.type != "ROOT" and new_parent.type != "ROOT":
-            if account.type != new_parent.type:
-                book.close()
-                log.debug(f"Cannot move {account.type} account under {new_parent.type} parent.")
-                return f"Cannot move {account.type} account under {new_parent.type} parent."
-        
-        # Store old parent name for message
-        old_parent_name = account.parent.fullname if account.parent else "ROOT"
-        
-        # Perform the move
-        with book:
+        with get_book(readonly=False) as book:
+            # Find the accounts
+            accounts = book.account_index
+            account = accounts.get(account_name)
+            new_parent = accounts.get(new_parent_name)
+
+            if not account:
+                log.debug(f"Account '{account_name}' not found.")
+                return accounts.not_found("Account", account_name)
+            if not new_parent:
+                log.debug(f"New parent account '{new_parent_name}' not found.")
+                return accounts.not_found("New parent account", new_parent_name)
+
+            # Check type compatibility
+            if account.type != "ROOT" and new_parent.type != "ROOT":
+                if account.type != new_parent.type:
+                    log.debug(f"Cannot move {account.type} account under {new_parent.type} parent.")
+                    return f"Cannot move {account.type} account under {new_parent.type} parent."
+
+            # Store old parent name for message
+            old_parent_name = account.parent.fullname if account.parent else "ROOT"
+
+            # Perform the move
+            old_fullname = account.fullname
             account.parent = new_parent
             book.save()
+            accounts.move(account, old_fullname)
         
-        book.close()
         log.debug(f"Account moved: {account_name} from {old_parent_name} to {new_parent_name}")
         return f"Successfully moved account '{account_name}' from '{old_parent_name}' to '{new_parent_name}'"
         
@@ -1773,6 +1955,7 @@ async def move_account(ctx: RunContext[GnuCashQuery], account_name: str, new_par
         return f"Error moving account: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.reads
 async def export_reports_pdf(ctx: RunContext[GnuCashQuery], output_file: str = "gnucash_reports.pdf") -> str:
     """Export all financial reports to a single PDF file.
 
@@ -1797,142 +1980,169 @@ async def export_reports_pdf(ctx: RunContext[GnuCashQuery], output_file: str = "
         return "No active book. Please create or open a book first."
     
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=True)
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(
-            output_file,
-            pagesize=letter,
-            rightMargin=72,
-            leftMargin=72,
-            topMargin=72,
-            bottomMargin=72
-        )
-        
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Heading1']
-        normal_style = styles['Normal']
-        
-        # Container for PDF elements
-        elements = []
-        
-        # Add title
-        elements.append(Paragraph(f"Financial Reports (CURRENTLY BROKEN) - {get_active_book()}", title_style))
-        elements.append(Spacer(1, 20))
-        
-        # Helper function to convert DataFrame to PDF table
-        def df_to_table(df, title):
-            elements.append(Paragraph(title, styles['Heading2']))
+        import pandas as pd
+        from reportlab.lib import colors
+        from reportlab.lib.pagesizes import letter
+        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+        from reportlab.lib.styles import getSampleStyleSheet
+
+        with get_book(readonly=True) as book:
+            # Create PDF document
+            doc = SimpleDocTemplate(
+                output_file,
+                pagesize=letter,
+                rightMargin=72,
+                leftMargin=72,
+                topMargin=72,
+                bottomMargin=72
+            )
+
+            # Get styles
+            styles = getSampleStyleSheet()
+            title_style = styles['Heading1']
+            normal_style = styles['Normal']
+
+            # Container for PDF elements
+            elements = []
+
+            # Add title
+            elements.append(Paragraph(f"Financial Reports (CURRENTLY BROKEN) - {get_active_book()}", title_style))
+            elements.append(Spacer(1, 20))
+
+            # Helper function to convert DataFrame to PDF table
+            def df_to_table(df, title):
+                elements.append(Paragraph(title, styles['Heading2']))
+                elements.append(Spacer(1, 12))
+
+                # Convert DataFrame to list of lists
+                data = [df.columns.tolist()]
+                data.extend(df.values.tolist())
+
+                # Create table
+                table = Table(data)
+                table.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 14),
+                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+                    ('FONTSIZE', (0, 1), (-1, -1), 12),
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+                ]))
+                elements.append(table)
+                elements.append(Spacer(1, 20))
+
+            # All balances in one pass (checkpoint + recent splits) instead of a split scan per account
+            balances = AccountBalances(book)
+
+            # Helper function to get leaf accounts and their balances
+            def get_account_balances(acc_types):
+                accounts_data = []
+                for acc in balances.accounts:
+                    if acc.type in acc_types:
+                        # Only include leaf accounts (those without children)
+                        if not balances.children.get(acc.guid):
+                            accounts_data.append({
+                                'Account': acc.fullname,
+                                'Balance': balances.get_balance(acc),
+                                'Description': acc.description or ''
+                            })
+                return pd.DataFrame(accounts_data)
+
+            # Get assets (including bank accounts) and liabilities separately
+            assets_df = get_account_balances(["ASSET", "BANK"])
+            liabilities_df = get_account_balances(["LIABILITY"])
+
+            # Add Balance Sheet title
+            elements.append(Paragraph("Balance Sheet", styles['Heading2']))
             elements.append(Spacer(1, 12))
-            
-            # Convert DataFrame to list of lists
-            data = [df.columns.tolist()]
-            data.extend(df.values.tolist())
-            
-            # Create table
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+
+            # Create Assets table
+            assets_data = [["Assets"]] + [assets_df.columns.tolist()] + assets_df.values.tolist()
+            assets_total = assets_df['Balance'].sum() if not assets_df.empty else 0
+            assets_data.append(["Total Assets", assets_total])
+            assets_table = Table(assets_data)
+
+            # Create Liabilities table
+            liab_data = [["Liabilities"]] + [liabilities_df.columns.tolist()] + liabilities_df.values.tolist()
+            liab_total = liabilities_df['Balance'].sum() if not liabilities_df.empty else 0
+            liab_data.append(["Total Liabilities", liab_total])
+            liab_table = Table(liab_data)
+
+            # Style for both tables
+            table_style = TableStyle([
+                # Title row
+                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
                 ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
                 ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 14),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 12),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('FONTSIZE', (0, 0), (-1, 0), 16),
+                ('SPAN', (0, 0), (-1, 0)),  # Span all columns for title
+                # Header row
+                ('BACKGROUND', (0, 1), (-1, 1), colors.grey),
+                ('TEXTCOLOR', (0, 1), (-1, 1), colors.whitesmoke),
+                ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+                ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 1), (-1, 1), 14),
+                # Data rows
+                ('BACKGROUND', (0, 2), (-1, -2), colors.beige),
+                ('TEXTCOLOR', (0, 2), (-1, -2), colors.black),
+                ('FONTNAME', (0, 2), (-1, -2), 'Helvetica'),
+                ('FONTSIZE', (0, 2), (-1, -2), 12),
+                # Total row
+                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
                 ('GRID', (0, 0), (-1, -1), 1, colors.black)
+            ])
+
+            # Apply style and add tables one after another
+            assets_table.setStyle(table_style)
+            liab_table.setStyle(table_style)
+
+            elements.append(assets_table)
+            elements.append(Spacer(1, 20))  # Add space between tables
+            elements.append(liab_table)
+            elements.append(Spacer(1, 20))
+
+            # Income/expense trend over the last 12 months, one column per month
+            from cashflow_trend import CashFlowTrend
+            trend_data = CashFlowTrend(book, "month", 12).table_data(decimals=0)
+            trend_table = Table([["Cash Flow Trend (last 12 months)"]] + trend_data, repeatRows=2)
+            trend_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('SPAN', (0, 0), (-1, 0)),
+                ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
+                ('BACKGROUND', (0, 1), (-1, 1), colors.grey),
+                ('TEXTCOLOR', (0, 1), (-1, 1), colors.whitesmoke),
+                ('FONTSIZE', (0, 0), (-1, -1), 6),
+                ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+                ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
             ]))
-            elements.append(table)
+            elements.append(trend_table)
             elements.append(Spacer(1, 20))
-        
-        # Helper function to get leaf accounts and their balances
-        def get_account_balances(acc_types):
-            accounts_data = []
-            for acc in book.accounts:
-                if acc.type in acc_types:
-                    # Only include leaf accounts (those without children)
-                    if not acc.children:
-                        accounts_data.append({
-                            'Account': acc.fullname,
-                            'Balance': acc.get_balance(),
-                            'Description': acc.description or ''
-                        })
-            return pd.DataFrame(accounts_data)
-
-        # Get assets (including bank accounts) and liabilities separately
-        assets_df = get_account_balances(["ASSET", "BANK"])
-        liabilities_df = get_account_balances(["LIABILITY"])
-
-        # Add Balance Sheet title
-        elements.append(Paragraph("Balance Sheet", styles['Heading2']))
-        elements.append(Spacer(1, 12))
-
-        # Create Assets table
-        assets_data = [["Assets"]] + [assets_df.columns.tolist()] + assets_df.values.tolist()
-        assets_total = assets_df['Balance'].sum() if not assets_df.empty else 0
-        assets_data.append(["Total Assets", assets_total])
-        assets_table = Table(assets_data)
-        
-        # Create Liabilities table
-        liab_data = [["Liabilities"]] + [liabilities_df.columns.tolist()] + liabilities_df.values.tolist()
-        liab_total = liabilities_df['Balance'].sum() if not liabilities_df.empty else 0
-        liab_data.append(["Total Liabilities", liab_total])
-        liab_table = Table(liab_data)
-
-        # Style for both tables
-        table_style = TableStyle([
-            # Title row
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 16),
-            ('SPAN', (0, 0), (-1, 0)),  # Span all columns for title
-            # Header row
-            ('BACKGROUND', (0, 1), (-1, 1), colors.grey),
-            ('TEXTCOLOR', (0, 1), (-1, 1), colors.whitesmoke),
-            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 1), (-1, 1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 1), (-1, 1), 14),
-            # Data rows
-            ('BACKGROUND', (0, 2), (-1, -2), colors.beige),
-            ('TEXTCOLOR', (0, 2), (-1, -2), colors.black),
-            ('FONTNAME', (0, 2), (-1, -2), 'Helvetica'),
-            ('FONTSIZE', (0, 2), (-1, -2), 12),
-            # Total row
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ])
-
-        # Apply style and add tables one after another
-        assets_table.setStyle(table_style)
-        liab_table.setStyle(table_style)
-        
-        elements.append(assets_table)
-        elements.append(Spacer(1, 20))  # Add space between tables
-        elements.append(liab_table)
-        elements.append(Spacer(1, 20))
-        
-        # Add Recent Transactions
-        transactions_df = pd.DataFrame([
-            {
-                'Date': tx.post_date,
-                'Description': tx.description,
-                'Amount': sum(split.value for split in tx.splits if split.value > 0)
-            }
-            for tx in sorted(book.transactions, key=lambda t: t.post_date, reverse=True)[:10]
-        ])
-        if not transactions_df.empty:
-            df_to_table(transactions_df, "Recent Transactions")
-        
-        # Build PDF
-        doc.build(elements)
-        book.close()
+
+            # Add Recent Transactions
+            transactions_df = pd.DataFrame([
+                {
+                    'Date': tx.post_date,
+                    'Description': tx.description,
+                    'Amount': sum(split.value for split in tx.splits if split.value > 0)
+                }
+                for tx in fetch_recent_transactions(book, 10)
+            ])
+            if not transactions_df.empty:
+                df_to_table(transactions_df, "Recent Transactions")
+
+            # Build PDF
+            doc.build(elements)
         
         log.debug(f"PDF report generated: {output_file}")
         return f"Successfully exported reports to {output_file}"
@@ -1941,6 +2151,7 @@ async def export_reports_pdf(ctx: RunContext[GnuCashQuery], output_file: str = "
         return f"Error exporting reports to PDF: {str(e)}"
 
 @gnucash_agent.tool
+@tool_executor.reads
 async def get_accounting_hints(ctx: RunContext[GnuCashQuery]) -> str:
     """
     If you are ever stuck with how to proceed with accounting, check here.
@@ -1958,34 +2169,80 @@ async def get_accounting_hints(ctx: RunContext[GnuCashQuery]) -> str:
     return "There are no hints as of now"
 
 class BackupScheduler:
-    """Periodic scheduler for managing GnuCash backup files."""
+    """Moves GnuCash backup files into the backup store (or the backups folder), thins them out to the
+    GC_CLI_RETENTION policy and deletes very old ones.
+
+    Event-driven when watchdog is available (see :class:`backup_sweeper.BackupSweeper`),
+    otherwise a periodic sweep every sweep_interval seconds.
+    """
     
-    def __init__(self, sweep_interval: int = 120, sweep_age: int = 5):
+    def __init__(self, sweep_interval: int = 120, sweep_age: int = 5, rescan_interval: int = None):
         self.sweep_interval = sweep_interval
         self.sweep_age = sweep_age
         self.purge_days = int(os.getenv('GC_CLI_PURGE_DAYS', '2'))
+        # Swept backups go to the deduplicating store, thinned out to the retention policy
+        self.store = backup_store()
+        self.catalog = backup_catalog()
+        retention = os.getenv('GC_CLI_RETENTION', DEFAULT_RETENTION)
+        self.retention = None if retention.strip().lower() in ('', 'off', 'none') else parse_policy(retention)
+        # Full rescans catch backups whose filesystem events were missed (0: never)
+        if rescan_interval is None:
+            rescan_interval = int(os.getenv('GC_CLI_RESCAN_SECS', '3600'))
+        self.rescan_interval = rescan_interval
+        # Point-in-time snapshots of the active book (0: off), throttled to snapshot_rate MB/s
+        self.snapshot_interval = int(os.getenv('GC_CLI_SNAPSHOT_MINS', '60'))
+        self.snapshot_rate = float(os.getenv('GC_CLI_SNAPSHOT_MBPS', '50'))
+        self._snapshot_signatures = {}
+        self._snapshot_task = None
         self._sweep_task = None
+        self._sweeper = None
         # Create backups directory if it doesn't exist
         Path('backups').mkdir(exist_ok=True)
         
     async def start(self):
-        """Start the periodic sweep task."""
-        self._sweep_task = asyncio.create_task(self._run_periodic_sweep())
+        """Start watching for backups, or the periodic sweep task without watchdog."""
+        try:
+            # File moves/deletes run on a worker thread so the prompt stays responsive
+            self._sweeper = BackupSweeper(
+                Path('.'), Path('backups'),
+                sweep_age=timedelta(minutes=self.sweep_age),
+                purge_age=timedelta(days=self.purge_days),
+                run_blocking=functools.partial(tool_executor.run, READ),
+                rescan_interval=self.rescan_interval or None,
+                store=self.store,
+                catalog=self.catalog,
+                retention=self.retention,
+            )
+            await self._sweeper.start()
+            log.debug(f"Event-driven backup sweep started, {len(self._sweeper)} backup(s) pending")
+        except (ImportError, OSError) as e:
+            # No watchdog, or no more inotify watches
+            log.error(f"Backup watcher unavailable ({str(e)}), sweeping every {self.sweep_interval} seconds")
+            if self._sweeper:
+                await self._sweeper.stop()
+            self._sweeper = None
+            self._sweep_task = asyncio.create_task(self._run_periodic_sweep())
+        if self.snapshot_interval > 0:
+            self._snapshot_task = asyncio.create_task(self._run_periodic_snapshots())
         
     async def stop(self):
-        """Stop the periodic sweep task."""
-        if self._sweep_task:
-            self._sweep_task.cancel()
-            try:
-                await self._sweep_task
-            except asyncio.CancelledError:
-                pass
+        """Stop watching and the periodic sweep and snapshot tasks."""
+        if self._sweeper:
+            await self._sweeper.stop()
+            self._sweeper = None
+        for task in (self._sweep_task, self._snapshot_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
             
     async def _run_periodic_sweep(self):
         """Run the sweep task periodically."""
         while True:
             try:
-                self.sweep_old_backups()
+                await tool_executor.run(READ, self.sweep_old_backups)
                 await asyncio.sleep(self.sweep_interval)
             except asyncio.CancelledError:
                 break
@@ -1993,44 +2250,113 @@ class BackupScheduler:
                 log.error(f"Sweep error: {str(e)}")
                 await asyncio.sleep(60)  # Wait before retrying after error
     
+    async def _run_periodic_snapshots(self):
+        """Snapshot the active book every snapshot_interval minutes, when it changed."""
+        while True:
+            try:
+                await asyncio.sleep(self.snapshot_interval * 60)
+                # A read: runs next to other tools, on its own worker thread
+                await tool_executor.run(READ, self.snapshot)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                log.error(f"Snapshot error: {str(e)}")
+
+    def snapshot(self, force: bool = False):
+        """Snapshot the active book into the backup store (or backups/); None if skipped.
+
+        Run it as a read (tool_executor.run(READ, ...)): group-committed postings are
+        committed on the writer thread before reads, so the snapshot includes them.
+        """
+        book = get_active_book()
+        if not book or not os.path.exists(book):
+            return None
+        signature = file_signature(book)
+        if not force and self._snapshot_signatures.get(book) == signature:
+            log.debug(f"Book unchanged since the last snapshot, skipping: {book}")
+            return None
+        rate = self.snapshot_rate * 1024 * 1024 if self.snapshot_rate > 0 else None
+        result = take_snapshot(book, 'backups', self.store, rate)
+        self._snapshot_signatures[book] = signature
+        if self._sweeper:
+            self._sweeper.schedule_retention()
+        log.info(f"Snapshot of {book}: {result['name']}, {result['bytes']} bytes in {result['seconds']} s")
+        return result
+
     def sweep_old_backups(self):
-        """Move backup files older than sweep_age minutes to backups folder and delete very old backups."""
+        """Move backup files older than sweep_age minutes to the store (or backups folder) and delete old backups."""
         log.debug(f"Starting backup sweep: sweep age: {self.sweep_age} minutes, purge days: {self.purge_days}")
         move_cutoff = datetime.now() - timedelta(minutes=self.sweep_age)
         delete_cutoff = datetime.now() - timedelta(days=self.purge_days)
-        
-        # Look for backup files in current directory to move to backups/
-        for filepath in Path('.').glob('*.*.gnucash'):
+        # No watcher keeps the catalog current here
+        self.catalog.refresh(('.', 'backups'), self.store)
+        
+        # Backup files in current directory to move to backups/, oldest first
+        # so each one is stored as the changes since the previous one
+        swept = []
+        for entry in self.catalog.entries(end=move_cutoff, location='.'):
+            filepath = Path(entry["path"])
             try:
-                # Parse timestamp from filename
-                parts = filepath.name.split('.')
-                if len(parts) >= 3 and len(parts[-2]) == 14 and parts[-2].isdigit():
-                    timestamp_str = parts[-2]
-                    file_time = datetime.strptime(timestamp_str, '%Y%m%d%H%M%S')
+                if self.store is not None:
+                    # Raises rather than returns if the file is not in the store
+                    self.store.keep(filepath)
+                    filepath.unlink()
                 else:
-                    continue  # Skip files that don't match the expected format
-                
-                if file_time < move_cutoff:
                     # Move file to backups folder
                     dest = Path('backups') / filepath.name
                     log.info(f"Moving backup from {filepath} to {dest}")
                     shutil.move(str(filepath), str(dest))
-            except (ValueError, IndexError) as e:
+                    self.catalog.add(dest.name, 'backups', entry["size"])
+                swept.append((entry["name"], '.'))
+            except (OSError, sqlite3.Error) as e:
                 log.error(f"Backup processing error for {filepath}: {str(e)}")
+        self.catalog.remove_many(swept)
+
+        if self.retention is not None:
+            expired = self.catalog.expired(self.retention, locations=(STORE, 'backups'))
+            remove_backups(expired, self.catalog, self.store)
         
-        # Delete files older than 2 days from backups folder
-        for filepath in Path('backups').glob('*.*.gnucash'):
-            try:
-                parts = filepath.name.split('.')
-                if len(parts) >= 3 and len(parts[-2]) == 14 and parts[-2].isdigit():
-                    timestamp_str = parts[-2]
-                    file_time = datetime.strptime(timestamp_str, '%Y%m%d%H%M%S')
-                    
-                    if file_time < delete_cutoff:
-                        print(Fore.YELLOW + f"DEBUG: Deleting old backup {filepath}")
-                        filepath.unlink()
-            except (ValueError, IndexError) as e:
-                print(Fore.RED + f"Error processing backup file {filepath}: {e}")
+        # Delete files older than purge_days from backups folder
+        old = self.catalog.entries(end=delete_cutoff, location='backups')
+        for entry in old:
+            print(Fore.YELLOW + f"DEBUG: Deleting old backup {os.path.relpath(entry['path'])}")
+        remove_backups(old, self.catalog)
+
+
+# Scheduler of the running CLI (None outside run_cli)
+backup_scheduler = None
+
+
+@gnucash_agent.tool
+@tool_executor.writes
+async def snapshot_book(ctx: RunContext[GnuCashQuery]) -> str:
+    """Take a consistent point-in-time snapshot of the active book now.
+
+    Uses SQLite's online backup API: the book stays readable and writable while the
+    snapshot is taken. Postings accepted before it (group commit, or the pending
+    commands of a --script batch) are committed first, so the snapshot has them.
+    The snapshot goes into the backup store (see list_backups and restore_backup).
+    Snapshots are also taken automatically every GC_CLI_SNAPSHOT_MINS minutes when
+    the book changed.
+
+    Returns - str: Snapshot name and size, or error details
+    """
+    log.debug("Entering snapshot_book")
+    if not get_active_book():
+        return "No active book. Please create or open a book first."
+    try:
+        # Accepted postings (group commit, --script batch) go into the snapshot; on the
+        # writer thread, after the writes issued before it
+        book_pool.commit_batch()
+        scheduler = backup_scheduler or BackupScheduler()
+        result = scheduler.snapshot(force=True)
+        where = "backup store" if result["stored"] else result["path"]
+        log.debug(f"Snapshot book completed: {result}")
+        return (f"Snapshot {result['name']} saved to {where} "
+                f"({format_size(result['bytes'])} in {result['seconds']:.2f} s)")
+    except Exception as e:
+        log.exception("Error taking snapshot")
+        return f"Error taking snapshot: {str(e)}"
 
 
 async def run_cli(book_name: str = None):
@@ -2043,12 +2369,17 @@ async def run_cli(book_name: str = None):
     # Set up periodic backup sweeper
     sweep_interval = int(os.getenv('GC_CLI_SWEEP_SECS', '120'))
     sweep_age = int(os.getenv('GC_CLI_SWEEP_AGE_MINS', '5'))
+    global backup_scheduler
     backup_scheduler = BackupScheduler(sweep_interval, sweep_age)
     await backup_scheduler.start()
-    log.info(f"Backup scheduler started: sweep interval: {sweep_interval} seconds, sweep age: {sweep_age} minutes, purge days: {backup_scheduler.purge_days}")
-    
-    # Perform initial sweep immediately
-    backup_scheduler.sweep_old_backups()
+    log.info(f"Backup scheduler started: sweep interval: {sweep_interval} seconds, sweep age: {sweep_age} minutes, purge days: {backup_scheduler.purge_days}, rescan interval: {backup_scheduler.rescan_interval} seconds, snapshot interval: {backup_scheduler.snapshot_interval} minutes")
+    # Journal postings and commit them in groups (0: commit each posting)
+    group_size = int(os.getenv('GC_CLI_GROUP_COMMIT', '100'))
+    committer = None
+    if group_size > 0:
+        committer = GroupCommitter(group_size, int(os.getenv('GC_CLI_COMMIT_MS', '200')) / 1000)
+        await committer.start()
+        log.info(f"Group commit started: {group_size} postings or {committer.delay * 1000:.0f} ms")
     
     # Set up prompt session with history and auto-completion
     histfile = os.path.join(os.path.expanduser("~"), ".gnucash_history")
@@ -2087,13 +2418,12 @@ async def run_cli(book_name: str = None):
     # }
     # global active_book
     history = []
+    router = CommandRouter(agent_tools(gnucash_agent))
     
     # Try to open book if provided
     if book_name:
-        result = await gnucash_agent.run(f"open_book {book_name}", message_history=history)
-        history += result.new_messages()
-        history = history[-3:]
-        print(result.data)
+        _, output = await router.run(f"open_book {shlex.quote(book_name)}")
+        print(output)
     
     print(Fore.GREEN + "GnuCash CLI - Type 'quit' to exit, list tools to find out commands")
     # print("Available commands:")
@@ -2107,13 +2437,14 @@ async def run_cli(book_name: str = None):
     while True:
         try:
             # Use prompt_toolkit to get input with styling
-            query = session.prompt(
+            # Awaited, so the backup sweep and other tasks keep running while the user types
+            query = (await session.prompt_async(
                 "GnuCash> ",
                 mouse_support=False,
                 style=Style.from_dict({
                     'prompt': 'ansidarkgreen',
                 })
-            ).strip()
+            )).strip()
             
             if query.lower() == 'quit':
                 break
@@ -2121,10 +2452,23 @@ async def run_cli(book_name: str = None):
             if not query:
                 continue
 
+            # Exact tool invocations run locally, without a model round-trip
+            try:
+                handled, output = await router.run(query)
+            except Exception as e:
+                log.exception(f"Error running command: {query}")
+                handled, output = True, f"Error: {str(e)}"
+            if handled:
+                if output is not None:
+                    print(output)
+                if get_active_book():
+                    print(f"\n[Active book: {get_active_book()}]")
+                continue
+
             # https://ai.pydantic.dev/agents/#model-errors 
             with capture_run_messages() as messages:
                 try:
-                    result = await gnucash_agent.run(query, message_history=history)
+                    result = await gnucash_agent.run(query, message_history=history, model=AGENT_MODEL)
                     history += result.new_messages()
                     history = history[-5:]  # Keep last 5 messages
                     print(result.data)
@@ -2146,11 +2490,20 @@ async def run_cli(book_name: str = None):
         except Exception as e:
             print(f"Error: {str(e)}")
     
-    # Stop the backup scheduler
+    # Commit what is pending and stop the backup scheduler
+    if committer:
+        try:
+            await committer.stop(functools.partial(tool_executor.run, WRITE))
+        except Exception as e:
+            print(Fore.RED + f"Error committing postings: {str(e)} - they are replayed from the journal next time")
     await backup_scheduler.stop()
+    backup_scheduler = None
+    book_pool.close_all()
+    tool_executor.shutdown()
 
 @gnucash_agent.tool
-async def generate_balance_sheet(ctx) -> str:
+@tool_executor.reads
+async def generate_balance_sheet(ctx, as_of_date: str = None) -> str:
     """Generate an ASCII formatted balance sheet with proper account hierarchy and roll-up totals.
 
     Implements bottom-up calculation of account balances with:
@@ -2159,7 +2512,11 @@ async def generate_balance_sheet(ctx) -> str:
     - Subtotals at each level
     - Sign conventions maintained
 
-    All amounts are in the book's default currency.
+    All amounts are in the book's default currency. Stocks and foreign currencies
+    are valued with the last price on or before the balance sheet date.
+
+    Args:
+        as_of_date (str, optional): Balance sheet date in YYYY-MM-DD format (default: today)
 
     Returns - str: Formatted balance sheet or error message
 
@@ -2172,12 +2529,22 @@ async def generate_balance_sheet(ctx) -> str:
 
     from bs import generate_balance_sheet
 
-    (_, table) = generate_balance_sheet(get_active_book())
+    try:
+        as_of = datetime.strptime(as_of_date, '%Y-%m-%d') if as_of_date else None
+    except ValueError:
+        return "Invalid date format. Please use YYYY-MM-DD"
+
+    book = get_book(readonly=True)
+    try:
+        (_, table) = generate_balance_sheet(book, as_of)
+    finally:
+        book.close()
 
     # print(table)
     return table
 
 @gnucash_agent.tool_plain
+@tool_metrics.measured
 async def list_tools(ctx):
     """
     Lists the available tools in the agent.
@@ -2186,7 +2553,7 @@ async def list_tools(ctx):
     """
     log.debug("List Tools called .........")
     rv = "-"*50 + "\n"
-    keys = gnucash_agent._function_tools.keys()
+    keys = agent_tools(gnucash_agent).keys()
     tools = sorted(keys)
     for tool in tools:
         rv += f"- {tool}\n"
@@ -2196,6 +2563,35 @@ async def list_tools(ctx):
 
 
 @gnucash_agent.tool
+async def show_stats(ctx: RunContext[GnuCashQuery], dump_file: str = None, reset: bool = False) -> str:
+    """Show latency and database statistics of the tools called in this session.
+
+    For each tool: number of calls, errors, p50/p95/max wall time, and the average
+    book open time, SQL query count and rows fetched per call, over its last 1000
+    calls. Use this to see which commands are slow.
+
+    Args:
+        dump_file (str, optional): Also append every recorded call to this JSON lines file
+        reset (bool, optional): Clear the statistics after showing them
+
+    Returns - str: Statistics table
+    """
+    log.debug(f"Entering show_stats with dump_file: {dump_file}, reset: {reset}")
+    output = tool_metrics.render()
+    if dump_file:
+        try:
+            count = tool_metrics.dump(dump_file)
+            output += f"\n\n{count} call(s) written to {dump_file}"
+        except OSError as e:
+            output += f"\n\nError writing {dump_file}: {str(e)}"
+    if reset:
+        tool_metrics.reset()
+        output += "\nStatistics cleared."
+    return output
+
+
+@gnucash_agent.tool
+@tool_executor.writes
 async def delete_account(ctx: RunContext[GnuCashQuery], account_name: str) -> str:
     """Delete an account and all its associated transactions.
 
@@ -2220,27 +2616,23 @@ async def delete_account(ctx: RunContext[GnuCashQuery], account_name: str) -> st
         return "No active book. Please create or open a book first."
 
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        
-        # Find the account
-        try:
-            account = book.accounts.get(fullname=account_name)
-        except KeyError:
-            book.close()
-            return f"Account '{account_name}' not found."
-
-        # Check for child accounts
-        if account.children:
-            book.close()
-            return f"Cannot delete account '{account_name}' because it has child accounts. Delete children first."
-
-        # Find all transactions involving this account
-        affected_transactions = set()
-        for split in account.splits:
-            affected_transactions.add(split.transaction)
-
-        # Delete transactions and account within a single transaction
-        with book:
+        with get_book(readonly=False) as book:
+            # Find the account
+            accounts = book.account_index
+            account = accounts.get(account_name)
+            if not account:
+                return accounts.not_found("Account", account_name)
+
+            # Check for child accounts
+            if account.children:
+                return f"Cannot delete account '{account_name}' because it has child accounts. Delete children first."
+
+            # Find all transactions involving this account
+            affected_transactions = set()
+            for split in account.splits:
+                affected_transactions.add(split.transaction)
+
+            # Delete transactions and account within a single transaction
             # Delete all affected transactions
             for transaction in affected_transactions:
                 log.debug(f"Deleting transaction: {transaction.description}")
@@ -2248,16 +2640,17 @@ async def delete_account(ctx: RunContext[GnuCashQuery], account_name: str) -> st
 
             # Delete the account itself
             log.debug(f"Deleting account: {account.fullname}")
+            accounts.remove(account)
             book.delete(account)
             book.save()
 
-        book.close()
         return f"Successfully deleted account '{account_name}' and {len(affected_transactions)} associated transactions."
 
     except Exception as e:
         return f"Error deleting account: {str(e)}"
 
 @gnucash_agent.tool_plain
+@tool_executor.writes
 async def add_dummy_accounts() -> str:
     """Add dummy accounts and transactions to the active GnuCash book for testings...
     Use this tool when the user asks for Dummy or Sample or Test account creation or addition.
@@ -2279,10 +2672,9 @@ async def add_dummy_accounts() -> str:
         return "No active book. Please create or open a book first."
 
     try:
-        book = piecash.open_book(get_active_book(), open_if_lock=True, readonly=False)
-        log.info(f"Adding sample accounts to book: {get_active_book()}")
+        with get_book(readonly=False) as book:
+            log.info(f"Adding sample accounts to book: {get_active_book()}")
 
-        with book:
             # Create main account categories
             assets = Account(
                 name="Assets",
@@ -2369,6 +2761,8 @@ async def add_dummy_accounts() -> str:
             )
 
             book.save()
+            book.account_index.add_all([assets, expenses, income, liabilities, checking, savings,
+                                        credit_card, salary, groceries, utilities])
 
             # Add transactions within the same context
             Transaction(
@@ -2435,7 +2829,6 @@ async def add_dummy_accounts() -> str:
 
             book.save()
 
-        book.close()
         log.debug("Sample accounts added successfully")
         return "Successfully added sample accounts and transactions to the active book."
 
@@ -2454,26 +2847,65 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='GnuCash CLI')
     parser.add_argument('--book', type=str, help='Name of GnuCash book to open')
     parser.add_argument('--test', action='store_true', help='Run test function and exit')
+    parser.add_argument('--script', type=str, metavar='FILE',
+                        help="Run the commands in FILE ('-' for stdin) without the agent and exit")
+    parser.add_argument('--commit-every', type=int, default=0, metavar='N',
+                        help='With --script: commit every N commands (default: once per script)')
+    parser.add_argument('--keep-going', action='store_true',
+                        help='With --script: continue after a failed command')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='Print an import-time breakdown of CLI startup and exit')
     args = parser.parse_args()
 
+    if args.profile_startup:
+        _import_profiler.uninstall()
+        print(_import_profiler.report())
+        sys.exit(0)
+
     if args.test:
         def do_test():
             print("Running test function...")
-            import piecash
             # open the book mentioned in --book argument
-            book = piecash.open_book(args.book, open_if_lock=True, readonly=False)
             set_active_book(args.book)
+            book = get_book(readonly=True)
             ###################
             from bs import generate_balance_sheet
 
             ###################
             print(get_active_book())
             print("-"*50)
-            (_, table) = generate_balance_sheet(get_active_book())
+            (_, table) = generate_balance_sheet(book)
+            book.close()
+            book_pool.close_all()
             print(table)
             print("Test completed.")
         do_test()
         sys.exit(0)
+
+    if args.script:
+        from script_runner import run_script
+
+        async def do_script():
+            router = CommandRouter(agent_tools(gnucash_agent))
+            if args.book:
+                _, output = await router.run(f"open_book {shlex.quote(args.book)}")
+                print(output)
+                if not get_active_book():
+                    return 1
+            source = sys.stdin if args.script == '-' else open(args.script)
+            try:
+                return await run_script(source, router, args.commit_every, args.keep_going)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+                book_pool.close_all()
+
+        try:
+            status = asyncio.run(do_script())
+        except OSError as e:
+            print(Fore.RED + f"Error reading script: {e}")
+            status = 2
+        sys.exit(status)
     
     # Get or create an event loop
     try:
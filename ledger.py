@@ -0,0 +1,73 @@
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+import piecash
+from piecash import Split, Transaction
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import selectinload
+
+from checkpoints import day_start
+
+
+def parse_cursor(before: str) -> Tuple[date, Optional[str]]:
+    """
+    Parse a keyset pagination cursor of the form ``YYYY-MM-DD[,guid]``.
+
+    Args:
+        before: Cursor string as printed by list_transactions
+
+    Returns:
+        Tuple of (post date, transaction guid or None)
+
+    Raises:
+        ValueError: If the date part is not in YYYY-MM-DD format
+    """
+    date_str, _, guid = before.strip().partition(',')
+    post_date = datetime.strptime(date_str.strip(), '%Y-%m-%d').date()
+    return post_date, guid.strip() or None
+
+
+def format_cursor(tx: Transaction) -> str:
+    """Cursor pointing just past the given transaction (see :func:`parse_cursor`)."""
+    return f"{tx.post_date.strftime('%Y-%m-%d')},{tx.guid}"
+
+
+def fetch_recent_transactions(book: piecash.Book, limit: int = 10,
+                              before: Optional[Tuple[date, Optional[str]]] = None) -> List[Transaction]:
+    """
+    Fetch the newest transactions with an ORDER BY/LIMIT query.
+
+    Transactions are ordered by (post_date, guid) descending, which uses the
+    post_date index and gives a stable order for keyset pagination. Splits and
+    their accounts are eager loaded so rendering does not issue a query per split.
+
+    Args:
+        book: An opened piecash Book object
+        limit: Maximum number of transactions to return
+        before: Optional (post date, guid) cursor; only older transactions are returned.
+                The guid's stored post_date is the key, so the page continues exactly
+                after it whatever time of day it was stored with. Without a guid (or if
+                that transaction is gone), transactions posted on that date are skipped.
+
+    Returns:
+        List of transactions, newest first
+    """
+    query = book.session.query(Transaction).options(
+        selectinload(Transaction.splits).joinedload(Split.account)
+    )
+
+    if before is not None:
+        post_date, guid = before
+        if guid:
+            # Compare stored values: a date would be bound at piecash's neutral 10:59
+            stored = book.session.query(Transaction._post_date).filter(
+                Transaction.guid == guid).scalar_subquery()
+            key = func.coalesce(stored, day_start(post_date))
+            query = query.filter(or_(
+                Transaction._post_date < key,
+                and_(Transaction._post_date == key, Transaction.guid < guid),
+            ))
+        else:
+            query = query.filter(Transaction._post_date < day_start(post_date))
+
+    return query.order_by(Transaction._post_date.desc(), Transaction.guid.desc()).limit(limit).all()
@@ -0,0 +1,241 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Calls kept per tool for the percentiles
+HISTORY = 1000
+
+
+class CallStats:
+    """Counters of one measured call; nested calls add theirs to the caller's."""
+
+    def __init__(self, name: str, parent: Optional["CallStats"] = None):
+        self.name = name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.wall_ms = 0.0
+        self.open_ms = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.ok = True
+
+    def finish(self):
+        self.wall_ms = (time.perf_counter() - self.started) * 1000
+        if self.parent is not None:
+            self.parent.open_ms += self.open_ms
+            self.parent.queries += self.queries
+            self.parent.rows += self.rows
+
+    def as_record(self) -> dict:
+        return {
+            "time": datetime.now().isoformat(timespec="milliseconds"),
+            "tool": self.name,
+            "wall_ms": round(self.wall_ms, 3),
+            "open_ms": round(self.open_ms, 3),
+            "queries": self.queries,
+            "rows": self.rows,
+            "ok": self.ok,
+        }
+
+
+# Call being measured in the current context. Tool bodies run on worker threads with a
+# copy of the caller's context (see executor.ToolExecutor.run), so the SQL they issue
+# is counted for the call that started them.
+_current: contextvars.ContextVar[Optional[CallStats]] = contextvars.ContextVar("metrics_call", default=None)
+
+
+class _CountingCursor:
+    """DBAPI cursor proxy that counts the rows fetched through it."""
+
+    def __init__(self, cursor, call: CallStats):
+        self._cursor = cursor
+        self._call = call
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._call.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._call.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._call.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    call = _current.get()
+    if call is None:
+        return
+    call.queries += 1
+    if context is not None and cursor.description is not None:
+        # The result is built from context.cursor right after this event
+        context.cursor = _CountingCursor(cursor, call)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+
+def _failed(result) -> bool:
+    # Tools report errors in their result text rather than raising
+    return isinstance(result, str) and "error" in result[:40].lower()
+
+
+class ToolMetrics:
+    """
+    Wall time, book open time, SQL query count and rows fetched per tool call.
+
+    The last HISTORY calls of each tool are kept for percentiles. When
+    ``GC_CLI_METRICS_FILE`` is set, every call is also appended to that file as a
+    JSON line.
+    """
+
+    def __init__(self, history: int = HISTORY):
+        self.history = history
+        self._calls: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.history))
+        self._totals: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.log_file = os.getenv("GC_CLI_METRICS_FILE")
+
+    def _start(self, name: str):
+        call = CallStats(name, _current.get())
+        return call, _current.set(call)
+
+    def _finish(self, call: CallStats, token):
+        call.finish()
+        _current.reset(token)
+        record = call.as_record()
+        with self._lock:
+            self._calls[call.name].append(record)
+            self._totals[call.name] += 1
+            if self.log_file:
+                try:
+                    with open(self.log_file, "a") as f:
+                        f.write(json.dumps(record) + "\n")
+                except OSError as e:
+                    log.error(f"Could not write metrics to {self.log_file}: {e}")
+                    self.log_file = None
+
+    def measured(self, func: Callable = None, *, name: str = None):
+        """Decorator recording a call of func (sync or async) under its name."""
+        if func is None:
+            return functools.partial(self.measured, name=name)
+        label = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                call, token = self._start(label)
+                try:
+                    result = await func(*args, **kwargs)
+                    call.ok = not _failed(result)
+                    return result
+                except BaseException:
+                    call.ok = False
+                    raise
+                finally:
+                    self._finish(call, token)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                call, token = self._start(label)
+                try:
+                    result = func(*args, **kwargs)
+                    call.ok = not _failed(result)
+                    return result
+                except BaseException:
+                    call.ok = False
+                    raise
+                finally:
+                    self._finish(call, token)
+        return wrapper
+
+    @staticmethod
+    def add_open_time(seconds: float):
+        """Count time spent opening a book for the call being measured."""
+        call = _current.get()
+        if call is not None:
+            call.open_ms += seconds * 1000
+
+    def summary(self) -> List[dict]:
+        """Per-tool statistics over the kept calls, slowest p95 first."""
+        with self._lock:
+            calls = {name: list(records) for name, records in self._calls.items()}
+            totals = dict(self._totals)
+        rows = []
+        for name, records in calls.items():
+            wall = sorted(r["wall_ms"] for r in records)
+            n = len(records)
+            rows.append({
+                "tool": name,
+                "calls": totals[name],
+                "errors": sum(not r["ok"] for r in records),
+                "p50_ms": _percentile(wall, 50),
+                "p95_ms": _percentile(wall, 95),
+                "max_ms": wall[-1],
+                "open_ms": sum(r["open_ms"] for r in records) / n,
+                "queries": sum(r["queries"] for r in records) / n,
+                "rows": sum(r["rows"] for r in records) / n,
+            })
+        rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+        return rows
+
+    def render(self) -> str:
+        """Table of :meth:`summary`; open time, queries and rows are averages per call."""
+        from tabulate import tabulate
+
+        rows = self.summary()
+        if not rows:
+            return "No tool calls recorded yet."
+        table = [[r["tool"], r["calls"], r["errors"], r["p50_ms"], r["p95_ms"], r["max_ms"],
+                  r["open_ms"], r["queries"], r["rows"]] for r in rows]
+        return tabulate(table, headers=["Tool", "Calls", "Errors", "p50 ms", "p95 ms", "Max ms",
+                                        "Avg open ms", "Avg queries", "Avg rows"],
+                        floatfmt=".1f", tablefmt="simple")
+
+    def dump(self, path: str) -> int:
+        """Append the kept calls to a JSON lines file; returns the number written."""
+        with self._lock:
+            records = sorted((r for records in self._calls.values() for r in records), key=lambda r: r["time"])
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        return len(records)
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._totals.clear()
+
+
+tool_metrics = ToolMetrics()
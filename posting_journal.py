@@ -0,0 +1,364 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import text
+
+from executor import WRITE, tool_executor
+from shared_vars import book_pool, get_active_book, get_book
+
+log = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal"
+
+
+class Posting:
+    """A posting tool call: its arguments, and the guid and time it is posted with.
+
+    The guid is given to the transaction (or account) the posting creates, so a
+    replay can tell whether the posting already reached the book.
+    """
+
+    def __init__(self, tool: str, args: dict, guid: str = None, time: datetime = None,
+                 seq: int = None, replayed: bool = False):
+        self.tool = tool
+        self.args = args
+        self.guid = guid or uuid.uuid4().hex
+        self.time = time or datetime.now()
+        self.seq = seq
+        self.replayed = replayed
+        # Set when the tool's save was deferred, i.e. the posting was accepted
+        self.saved = False
+
+    def as_record(self) -> dict:
+        return {"seq": self.seq, "tool": self.tool, "args": self.args, "guid": self.guid,
+                "time": self.time.isoformat()}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Posting":
+        return cls(record["tool"], record["args"], record["guid"], datetime.fromisoformat(record["time"]),
+                   record["seq"], replayed=True)
+
+
+# Posting being made in the current context (set by @journaled and by replay)
+_current: contextvars.ContextVar[Optional[Posting]] = contextvars.ContextVar("posting", default=None)
+
+# Posting tools by name, for replay
+_tools: Dict[str, Callable] = {}
+
+
+def current_posting() -> Optional[Posting]:
+    return _current.get()
+
+
+def posting_time() -> datetime:
+    """Time of the posting being made (kept on replay), else now."""
+    posting = _current.get()
+    return posting.time if posting is not None else datetime.now()
+
+
+def tag_posting(obj):
+    """Give the object a posting creates the posting's guid; returns the object."""
+    posting = _current.get()
+    if posting is not None:
+        obj.guid = posting.guid
+    return obj
+
+
+class PostingJournal:
+    """
+    Append-only log of the postings accepted for a book but not committed to it yet,
+    in ``<book>.gnucash.journal`` next to the book (JSON lines).
+
+    A posting is appended, and fsynced, once its changes were validated and flushed to
+    the book's write session (see shared_vars.BookSessionPool.defer_save). Every commit
+    of the write session includes all postings appended so far, so the journal is
+    emptied after each commit. Whatever is left in it was accepted but never committed
+    (the process died, or the pending group was rolled back) and is replayed.
+    """
+
+    def __init__(self, book_path: str):
+        self.path = f"{book_path}{JOURNAL_SUFFIX}"
+        self._lock = threading.Lock()
+        self._file = None
+        self._seq = max((entry["seq"] for entry in self.entries()), default=0)
+        self._appended = 0
+        # Set when accepted postings were rolled back and must be replayed
+        self.needs_replay = bool(self._seq)
+
+    def entries(self) -> List[dict]:
+        """Postings in the journal, oldest first. A torn last line (crash mid-write) is skipped."""
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return []
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                log.debug(f"Skipping incomplete journal line in {self.path}")
+        return entries
+
+    def __len__(self):
+        return self._appended
+
+    def defers(self) -> bool:
+        """Is a journaled posting being made in this context?"""
+        return _current.get() is not None
+
+    def saved(self):
+        """Journal the current posting, whose save was just deferred (raises OSError if it cannot)."""
+        posting = _current.get()
+        if posting is None:
+            return
+        if not posting.replayed:
+            self.append(posting)
+        posting.saved = True
+
+    def append(self, posting: Posting) -> int:
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "ab")
+            self._seq += 1
+            posting.seq = self._seq
+            self._file.write(json.dumps(posting.as_record()).encode() + b"\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._appended += 1
+        return posting.seq
+
+    def committed(self):
+        """The write session committed: every journaled posting is in the book."""
+        with self._lock:
+            if self.needs_replay or not self._appended:
+                return
+            self._truncate()
+
+    def rolled_back(self):
+        """Pending postings were rolled back; the journal still has them."""
+        with self._lock:
+            if self._appended:
+                self.needs_replay = True
+
+    def clear(self):
+        """Empty the journal after a replay."""
+        with self._lock:
+            self.needs_replay = False
+            self._truncate()
+
+    def _truncate(self):
+        if self._file is not None:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        elif os.path.exists(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(0)
+        self._appended = 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def attach_journal(book_path: str, remove: bool = False) -> PostingJournal:
+    """Journal the postings of the active book; remove drops a journal left by an earlier file."""
+    if remove and os.path.exists(f"{book_path}{JOURNAL_SUFFIX}"):
+        os.remove(f"{book_path}{JOURNAL_SUFFIX}")
+    if book_pool.journal is not None:
+        book_pool.journal.close()
+    book_pool.journal = PostingJournal(book_path)
+    return book_pool.journal
+
+
+def _in_book(guid: str) -> bool:
+    """Did a posting with this guid reach the book (or the pending group)?"""
+    with get_book(readonly=False) as book:
+        query = text("SELECT 1 FROM transactions WHERE guid = :guid UNION ALL "
+                     "SELECT 1 FROM accounts WHERE guid = :guid")
+        return book.session.execute(query, {"guid": guid}).first() is not None
+
+
+async def replay_journal() -> dict:
+    """
+    Post the journaled postings of the active book that are not in it, and commit them.
+
+    Must run where writes to the book are serialized (a write or exclusive tool).
+
+    Returns:
+        dict: replayed, skipped (already in the book), failed (descriptions)
+    """
+    journal = book_pool.journal
+    stats = {"replayed": 0, "skipped": 0, "failed": []}
+    entries = journal.entries() if journal is not None else []
+    if not entries:
+        if journal is not None:
+            journal.needs_replay = False
+        return stats
+    log.info(f"Replaying {len(entries)} journaled posting(s) of {get_active_book()}")
+    # Replayed postings are deferred like accepted ones and committed together
+    forced = not book_pool.group_commit
+    book_pool.group_commit = True
+    try:
+        for entry in entries:
+            if _in_book(entry["guid"]):
+                stats["skipped"] += 1
+                continue
+            func = _tools.get(entry["tool"])
+            posting = Posting.from_record(entry)
+            result = f"unknown posting tool {entry['tool']}"
+            if func is not None:
+                token = _current.set(posting)
+                try:
+                    result = await func(None, **entry["args"])
+                finally:
+                    _current.reset(token)
+            if posting.saved:
+                stats["replayed"] += 1
+            else:
+                stats["failed"].append(f"{entry['tool']} {json.dumps(entry['args'])}: {result}")
+                log.error(f"Journaled posting {entry['seq']} could not be replayed: {result}")
+        book_pool.commit_batch()
+    finally:
+        if forced:
+            book_pool.group_commit = False
+    journal.clear()
+    log.info(f"Journal replay: {stats['replayed']} replayed, {stats['skipped']} already in the book, "
+             f"{len(stats['failed'])} failed")
+    return stats
+
+
+def journaled(func):
+    """
+    Decorator for posting tools: while group commit is on, the tool's save is only
+    validated and journaled, and the posting is committed with the next group.
+
+    Put it below ``@tool_executor.writes``. The tool gives the object it creates the
+    posting's guid (:func:`tag_posting`) and uses :func:`posting_time` for its times,
+    so a replay posts the same thing.
+    """
+    signature = inspect.signature(func)
+    _tools[func.__name__] = func
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        arguments = dict(signature.bind(*args, **kwargs).arguments)
+        arguments.pop("ctx", None)
+        posting = Posting(func.__name__, arguments)
+        token = _current.set(posting)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            if posting.saved and group_committer is not None:
+                group_committer.posted()
+    return wrapper
+
+
+class GroupCommitter:
+    """
+    Commits the postings accepted by journaled tools in groups: once group_size are
+    pending, or delay seconds after the first of a group, whichever comes first.
+    Read tools have what is pending committed on the writer thread before they are
+    dispatched (see :meth:`read_barrier`), and so does :meth:`flush`.
+    """
+
+    def __init__(self, group_size: int = 100, delay: float = 0.2):
+        self.group_size = group_size
+        self.delay = delay
+        self.commits = 0
+        self._loop = None
+        self._wake = None
+        self._task = None
+
+    def posted(self):
+        """A posting was accepted (called on the writer thread)."""
+        if book_pool.pending_commands >= self.group_size:
+            self.commit()
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def commit(self) -> int:
+        """Commit the pending postings (blocking); returns how many there were."""
+        pending = book_pool.pending_commands
+        if pending:
+            book_pool.commit_batch()
+            self.commits += 1
+        return pending
+
+    async def flush(self) -> dict:
+        """
+        Replay rolled-back postings and commit everything pending. Must run where
+        writes are serialized (a write tool or the book's writer thread).
+
+        Returns:
+            dict: committed, and the replay statistics
+        """
+        stats = {"committed": 0, "replayed": 0, "skipped": 0, "failed": []}
+        journal = book_pool.journal
+        if journal is not None and journal.needs_replay:
+            stats.update(await replay_journal())
+        stats["committed"] = self.commit()
+        return stats
+
+    def read_barrier(self) -> Optional[Callable]:
+        """Work a read tool waits for: flush when postings are pending or to be replayed."""
+        journal = book_pool.journal
+        if book_pool.pending_commands or (journal is not None and journal.needs_replay):
+            return self.flush
+        return None
+
+    async def start(self):
+        global group_committer
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        book_pool.group_commit = True
+        group_committer = self
+        tool_executor.read_barrier = self.read_barrier
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, run_blocking):
+        """Stop the timer and commit what is pending with run_blocking(func)."""
+        global group_committer
+        tool_executor.read_barrier = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await run_blocking(self.flush)
+        finally:
+            group_committer = None
+            book_pool.group_commit = False
+
+    async def _run(self):
+        while True:
+            try:
+                await self._wake.wait()
+                await asyncio.sleep(self.delay)
+                self._wake.clear()
+                # On the book's writer thread, after the postings issued before it
+                await tool_executor.run(WRITE, self.flush)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error(f"Group commit error: {str(e)}")
+
+
+# Committer of the running CLI (None: postings are committed by the tool that makes them)
+group_committer: Optional[GroupCommitter] = None
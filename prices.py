@@ -0,0 +1,328 @@
+import csv
+import logging
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import piecash
+from piecash import Commodity, Price
+from piecash._common import GncConversionError
+
+log = logging.getLogger(__name__)
+
+# Currencies every book is expected to have, created on first use
+BASIC_CURRENCIES = {
+    "INR": {"fullname": "Indian Rupee", "fraction": 100},
+    "GBP": {"fullname": "British Pound", "fraction": 100},
+    "EUR": {"fullname": "Euro", "fraction": 100},
+    "USD": {"fullname": "US Dollar", "fraction": 100},
+}
+
+
+class Quote(NamedTuple):
+    """One price quote to upsert. A missing currency means the book default currency."""
+    namespace: str
+    mnemonic: str
+    price_date: date
+    value: Decimal
+    currency: Optional[str] = None
+
+
+class PriceSeries:
+    """
+    Prices of one commodity in one currency, sorted by date.
+
+    Dates are kept as ordinals in an array so an as-of lookup is a binary search.
+    When several prices share a date, the last one loaded wins.
+    """
+
+    __slots__ = ("dates", "values")
+
+    def __init__(self):
+        self.dates = array("l")
+        self.values: List[Decimal] = []
+
+    def append(self, price_date: date, value: Decimal):
+        """Add a price; dates must be appended in non-decreasing order."""
+        ordinal = price_date.toordinal()
+        if self.dates and self.dates[-1] == ordinal:
+            self.values[-1] = value
+        else:
+            self.dates.append(ordinal)
+            self.values.append(value)
+
+    @property
+    def latest(self) -> Decimal:
+        return self.values[-1]
+
+    def as_of(self, on_date: date) -> Optional[Decimal]:
+        """Last price on or before on_date, or None if the series starts later."""
+        position = bisect_right(self.dates, on_date.toordinal())
+        return self.values[position - 1] if position else None
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+
+class PriceHistory:
+    """
+    All prices of a book as per-(commodity, currency) sorted series.
+
+    Built with a single query over the price table (raw columns, no ORM objects).
+    Used for valuation: latest prices are O(1), prices as of a date are O(log n).
+    """
+
+    def __init__(self, book: piecash.Book):
+        self.series: Dict[Tuple[str, str], PriceSeries] = defaultdict(PriceSeries)
+        query = book.session.query(
+            Price.commodity_guid, Price.currency_guid, Price.date, Price._value_num, Price._value_denom
+        ).order_by(Price.date)
+        for commodity_guid, currency_guid, price_date, num, denom in query:
+            if isinstance(price_date, datetime):
+                price_date = price_date.date()
+            self.series[(commodity_guid, currency_guid)].append(price_date, Decimal(num) / Decimal(denom))
+        self.series.default_factory = None
+
+    def price(self, commodity: Commodity, currency: Commodity, on_date: Optional[date] = None) -> Optional[Decimal]:
+        """
+        Price of commodity in currency, latest or as of a date.
+
+        Args:
+            commodity: Commodity being priced
+            currency: Currency the price is expressed in
+            on_date: Optional date; the last price on or before it is used
+
+        Returns:
+            The price, or None if there is none
+        """
+        series = self.series.get((commodity.guid, currency.guid))
+        if not series:
+            return None
+        if on_date is None:
+            return series.latest
+        if isinstance(on_date, datetime):
+            on_date = on_date.date()
+        return series.as_of(on_date)
+
+    def conversion(self, commodity: Commodity, currency: Commodity, on_date: Optional[date] = None) -> Decimal:
+        """
+        Conversion factor from commodity to currency, like ``Commodity.currency_conversion``
+        but optionally as of a date.
+
+        A direct commodity->currency price is preferred, otherwise the inverse of a
+        currency->commodity price is used.
+
+        Raises:
+            GncConversionError: If no price links the two commodities
+        """
+        if commodity.guid == currency.guid:
+            return Decimal(1)
+        direct = self.price(commodity, currency, on_date)
+        if direct is not None:
+            return direct
+        inverse = self.price(currency, commodity, on_date)
+        if inverse:
+            return Decimal(1) / inverse
+        raise GncConversionError("Cannot convert {} to {}".format(commodity, currency))
+
+
+def price_history(book) -> PriceHistory:
+    """Price history of a book, shared with its session's PriceStore when it has one."""
+    store = getattr(book, "price_store", None)
+    return store.history() if store is not None else PriceHistory(book)
+
+
+class PriceStore:
+    """
+    Cached commodity/currency lookups and a (commodity, currency, date) price index
+    for one book session.
+
+    Currencies and commodities are loaded with one query each the first time they are
+    needed. Prices are indexed per date range on demand, so upserting a day of quotes
+    reads only that day's prices instead of scanning the whole price table.
+
+    Nothing is saved: callers commit with book.save().
+    """
+
+    def __init__(self, book: piecash.Book):
+        self.book = book
+        self._currencies: Optional[Dict[str, Commodity]] = None
+        self._commodities: Optional[Dict[Tuple[str, str], Commodity]] = None
+        # (commodity guid, currency guid, date) -> Price
+        self._prices: Dict[Tuple[str, str, date], Price] = {}
+        self._loaded_dates = set()
+        self._history: Optional[PriceHistory] = None
+
+    def clear_prices(self):
+        """Forget indexed prices (e.g. after a commit that may have added prices elsewhere)."""
+        self._prices.clear()
+        self._loaded_dates.clear()
+        self._history = None
+
+    def history(self) -> PriceHistory:
+        """Sorted price series of the book, rebuilt after prices change in this session."""
+        if self._history is None:
+            self._history = PriceHistory(self.book)
+        return self._history
+
+    def currencies(self) -> Dict[str, Commodity]:
+        """
+        All currencies of the book keyed by mnemonic, creating missing basic ones.
+
+        Returns:
+            dict: Currency commodities keyed by mnemonic
+        """
+        if self._currencies is None:
+            currencies = {c.mnemonic: c for c in self.book.session.query(Commodity).filter_by(namespace="CURRENCY")}
+            for mnemonic, details in BASIC_CURRENCIES.items():
+                if mnemonic not in currencies:
+                    log.debug(f"Creating new currency {mnemonic}")
+                    currencies[mnemonic] = Commodity(namespace="CURRENCY",
+                                                     mnemonic=mnemonic,
+                                                     fullname=details["fullname"],
+                                                     fraction=details["fraction"],
+                                                     book=self.book)
+            self._currencies = currencies
+        return self._currencies
+
+    def currency(self, mnemonic: Optional[str]) -> Commodity:
+        """Currency by mnemonic (book default currency when None). Raises KeyError if unknown."""
+        if mnemonic is None:
+            return self.book.default_currency
+        currencies = self.currencies()
+        if mnemonic not in currencies:
+            # May have been created by another tool since the cache was filled
+            currencies[mnemonic] = self.book.commodities(namespace="CURRENCY", mnemonic=mnemonic)
+        return currencies[mnemonic]
+
+    def commodity(self, namespace: str, mnemonic: str) -> Optional[Commodity]:
+        """Non-currency commodity by namespace and mnemonic, or None."""
+        if self._commodities is None:
+            self._load_commodities()
+        key = (namespace, mnemonic)
+        if key not in self._commodities:
+            try:
+                self._commodities[key] = self.book.commodities(namespace=namespace, mnemonic=mnemonic)
+            except KeyError:
+                return None
+        return self._commodities[key]
+
+    def _load_commodities(self):
+        self._commodities = {(c.namespace, c.mnemonic): c
+                             for c in self.book.session.query(Commodity).filter(Commodity.namespace != "CURRENCY")}
+
+    def add_commodity(self, commodity: Commodity):
+        """Register a commodity created in this session."""
+        if self._commodities is not None:
+            self._commodities[(commodity.namespace, commodity.mnemonic)] = commodity
+
+    def _load_dates(self, dates: Iterable[date]):
+        """Index the existing prices of the given dates with one range query."""
+        missing = sorted(set(dates) - self._loaded_dates)
+        if not missing:
+            return
+        # The stored time of day depends on the writer, so query whole days
+        # and match on the date in Python
+        start = missing[0]
+        end = missing[-1] + timedelta(days=1)
+        wanted = set(missing)
+        query = self.book.session.query(Price).filter(Price.date >= start, Price.date < end)
+        for price in query:
+            if price.date in wanted:
+                self._prices.setdefault((price.commodity_guid, price.currency_guid, price.date), price)
+        self._loaded_dates.update(missing)
+
+    def get(self, commodity: Commodity, currency: Commodity, price_date: date) -> Optional[Price]:
+        """Existing price of a commodity in a currency on a date, or None."""
+        self._load_dates([price_date])
+        return self._prices.get((commodity.guid, currency.guid, price_date))
+
+    def upsert(self, commodity: Commodity, currency: Commodity, price_date: date, value: Decimal) -> bool:
+        """
+        Create or update the price of a commodity on a date.
+
+        Returns:
+            bool: True if a new price was created, False if an existing one was updated
+        """
+        if isinstance(price_date, datetime):
+            price_date = price_date.date()
+        existing = self.get(commodity, currency, price_date)
+        self._history = None
+        if existing is not None:
+            existing.value = value
+            return False
+        # A new commodity has no guid until the session is flushed
+        if commodity.guid is None or currency.guid is None:
+            self.book.flush()
+        self._prices[(commodity.guid, currency.guid, price_date)] = Price(
+            commodity=commodity,
+            currency=currency,
+            date=price_date,
+            value=value,
+            type='last'
+        )
+        return True
+
+    def upsert_many(self, quotes: Iterable[Quote]) -> Tuple[int, int, List[str]]:
+        """
+        Upsert a batch of quotes, reading existing prices with one query for all their dates.
+
+        Args:
+            quotes: Quotes to write
+
+        Returns:
+            Tuple of (created count, updated count, list of error messages for skipped quotes)
+        """
+        quotes = list(quotes)
+        self._load_dates(q.price_date for q in quotes)
+        # Resolve symbols before creating any price: a lookup query would autoflush them one by one
+        if self._commodities is None or any((q.namespace, q.mnemonic) not in self._commodities for q in quotes):
+            self._load_commodities()
+        self.currencies()
+        created = updated = 0
+        errors = []
+        for quote in quotes:
+            commodity = self.commodity(quote.namespace, quote.mnemonic)
+            if commodity is None:
+                errors.append(f"{quote.namespace}:{quote.mnemonic}: commodity not found")
+                continue
+            try:
+                currency = self.currency(quote.currency)
+            except KeyError:
+                errors.append(f"{quote.namespace}:{quote.mnemonic}: currency '{quote.currency}' not found")
+                continue
+            if self.upsert(commodity, currency, quote.price_date, quote.value):
+                created += 1
+            else:
+                updated += 1
+        return created, updated, errors
+
+
+def read_quotes(path: str, namespace: str, date_format: str = "%Y-%m-%d",
+                errors: Optional[List[str]] = None) -> Iterator[Quote]:
+    """
+    Stream quotes from a CSV file with a header row.
+
+    Columns (case-insensitive): symbol (or mnemonic), date, price (or close/value),
+    and optionally currency and namespace. Unreadable rows are reported in `errors`.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        for line_no, row in enumerate(reader, 2):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            try:
+                symbol = row.get("symbol") or row.get("mnemonic")
+                if not symbol:
+                    raise ValueError("missing symbol")
+                value = Decimal((row.get("price") or row.get("close") or row.get("value") or "").replace(",", ""))
+                yield Quote(row.get("namespace") or namespace,
+                            symbol,
+                            datetime.strptime(row.get("date", ""), date_format).date(),
+                            value,
+                            row.get("currency") or None)
+            except (ValueError, InvalidOperation) as e:
+                if errors is not None:
+                    errors.append(f"line {line_no}: unreadable quote ({e})")
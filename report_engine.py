@@ -0,0 +1,218 @@
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import piecash
+import sqlalchemy as sa
+from piecash import Account, Split, Transaction
+from piecash.sa_extra import tz as local_tz
+
+from balances import to_decimal
+
+log = logging.getLogger(__name__)
+
+INT64_LIMIT = 2 ** 63
+
+
+def _bound(day) -> pd.Timestamp:
+    """Local midnight starting a posting day (post dates are held in local time)."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return pd.Timestamp(datetime.combine(day, time()))
+
+
+def _exact_sums(frame: pd.DataFrame, keys, column: str, absolute: bool = False) -> pd.Series:
+    """Group-by sum of an integer column that cannot overflow int64."""
+    values = frame[column]
+    if absolute:
+        values = values.abs()
+    if len(values) and int(values.abs().max()) * len(values) >= INT64_LIMIT:
+        # Python integers never overflow; slower, but only for extreme books
+        values = values.astype(object)
+    return values.groupby([frame[key] for key in keys], observed=True, sort=False).sum()
+
+
+def _to_decimals(sums: pd.Series) -> Dict:
+    """(..., denom) -> num sums to {...: Decimal}, adding up the denominators of a key."""
+    totals = {}
+    for key, num in sums.items():
+        *group, denom = key
+        group = group[0] if len(group) == 1 else tuple(group)
+        totals[group] = totals.get(group, Decimal('0')) + to_decimal(num, denom)
+    return totals
+
+
+class SplitFrame:
+    """
+    The splits of a book as columns, loaded with one query, for vectorized reports.
+
+    Columns: ``account`` (categorical account guid), ``post_date``, ``value_num``,
+    ``value_denom``, ``quantity_num``, ``quantity_denom``. Amounts stay scaled
+    integers: sums are taken per (group, denominator) in int64 and turned into
+    Decimals only at the end, so results equal the Decimal/SQL computations exactly.
+
+    Account attributes (name, type, commodity) are in :attr:`accounts`, indexed by guid.
+    """
+
+    def __init__(self, splits: pd.DataFrame, accounts: pd.DataFrame):
+        self.splits = splits
+        self.accounts = accounts
+
+    @classmethod
+    def load(cls, book: piecash.Book) -> "SplitFrame":
+        """
+        Load the splits table and account attributes of a book.
+
+        Args:
+            book: An opened piecash Book object
+
+        Returns:
+            SplitFrame: frame of all splits
+        """
+        accounts_table = Account.__table__
+        account_rows = book.session.execute(sa.select(
+            accounts_table.c.guid, accounts_table.c.name, accounts_table.c.account_type,
+            accounts_table.c.parent_guid, accounts_table.c.commodity_guid,
+        )).fetchall()
+        accounts = pd.DataFrame.from_records(
+            account_rows, columns=["guid", "name", "type", "parent_guid", "commodity_guid"]
+        ).set_index("guid")
+
+        splits_table = Split.__table__
+        transactions_table = Transaction.__table__
+        # Raw post_date column: parsing it per row through piecash's type is the slow part
+        post_date = sa.type_coerce(transactions_table.c.post_date, sa.String)
+        rows = book.session.execute(sa.select(
+            splits_table.c.account_guid, post_date,
+            splits_table.c.value_num, splits_table.c.value_denom,
+            splits_table.c.quantity_num, splits_table.c.quantity_denom,
+        ).select_from(splits_table.join(
+            transactions_table, splits_table.c.tx_guid == transactions_table.c.guid
+        ))).fetchall()
+        splits = pd.DataFrame.from_records(rows, columns=[
+            "account", "post_date", "value_num", "value_denom", "quantity_num", "quantity_denom",
+        ])
+        splits["account"] = pd.Categorical(splits["account"], categories=accounts.index)
+        # Stored in UTC; piecash reads post dates as the local date, so the frame does too
+        splits["post_date"] = pd.to_datetime(splits["post_date"], format="mixed").dt.tz_localize(
+            "UTC").dt.tz_convert(local_tz).dt.tz_localize(None)
+        for column in ("value_num", "value_denom", "quantity_num", "quantity_denom"):
+            splits[column] = splits[column].astype(np.int64)
+        log.debug(f"Loaded split frame: {len(splits)} splits, {len(accounts)} accounts")
+        return cls(splits, accounts)
+
+    def __len__(self):
+        return len(self.splits)
+
+    def _between(self, start=None, end=None) -> pd.DataFrame:
+        splits = self.splits
+        mask = None
+        if start is not None:
+            mask = splits["post_date"] >= _bound(start)
+        if end is not None:
+            upto = splits["post_date"] < _bound(end) + pd.Timedelta(days=1)
+            mask = upto if mask is None else mask & upto
+        return splits if mask is None else splits[mask]
+
+    def _of_types(self, splits: pd.DataFrame, account_types: Iterable[str]) -> pd.DataFrame:
+        guids = self.accounts.index[self.accounts["type"].isin(list(account_types))]
+        return splits[splits["account"].isin(guids)]
+
+    def own_totals(self, at_date: Optional[date] = None) -> Dict[str, Decimal]:
+        """Own balance per account guid, like :func:`balances.load_split_totals`."""
+        sums = _exact_sums(self._between(end=at_date), ["account", "quantity_denom"], "quantity_num")
+        return _to_decimals(sums)
+
+    def flow_totals(self, start_date: date, end_date: date,
+                    account_types: Iterable[str]) -> Dict[str, Tuple[str, str, Decimal]]:
+        """Absolute split values per account in a period, like :func:`balances.load_flow_totals`."""
+        splits = self._of_types(self._between(start_date, end_date), account_types)
+        sums = _exact_sums(splits, ["account", "value_denom"], "value_num", absolute=True)
+        return {
+            guid: (self.accounts.at[guid, "name"], self.accounts.at[guid, "type"], total)
+            for guid, total in _to_decimals(sums).items()
+        }
+
+    def period_flow_totals(self, start_date: date, end_date: date, account_types: Iterable[str],
+                           freq: str = "M") -> Dict[Tuple[str, str], Decimal]:
+        """
+        Absolute split values per (period, account) with one group-by.
+
+        Args:
+            start_date: First posting date included
+            end_date: Last posting date included
+            account_types: Account types to include (e.g. INCOME, EXPENSE)
+            freq: pandas period frequency (M: months, Q: quarters, Y: years)
+
+        Returns:
+            Dictionary of (period label, account guid) -> total, e.g. ("2024-03", guid)
+        """
+        splits = self._of_types(self._between(start_date, end_date), account_types)
+        splits = splits.assign(period=splits["post_date"].dt.to_period(freq).astype(str))
+        sums = _exact_sums(splits, ["period", "account", "value_denom"], "value_num", absolute=True)
+        return _to_decimals(sums)
+
+
+def benchmark(path: str, repeat: int = 5):
+    """Time the SQL/checkpoint report paths against the split frame on a book."""
+    import os
+    import timeit
+
+    from balances import load_flow_totals, load_split_totals
+    from bs import calculate_balance_sheet
+    from checkpoints import sum_split_quantities
+
+    book = piecash.open_book(path, readonly=True, open_if_lock=True)
+    checkpoints = os.environ.get("GC_CLI_CHECKPOINTS")
+    try:
+        today = date.today()
+        start = today.replace(year=today.year - 1)
+        types = ["INCOME", "EXPENSE"]
+        months = pd.period_range(start, today, freq="M")
+
+        # Plain book: the SQL paths below do not use the frame, and no checkpoints
+        os.environ["GC_CLI_CHECKPOINTS"] = "0"
+        frame = SplitFrame.load(book)
+        # Same results before timing anything
+        if frame.own_totals() != dict(load_split_totals(book)):
+            raise RuntimeError(f"Split frame balances differ from the SQL balances on {path}")
+        if frame.flow_totals(start, today, types) != load_flow_totals(book, start, today, types):
+            raise RuntimeError(f"Split frame cash flow differs from the SQL cash flow on {path}")
+
+        def monthly_sql():
+            for month in months:
+                load_flow_totals(book, max(month.start_time.date(), start), min(month.end_time.date(), today), types)
+
+        cases = [
+            ("split frame load", lambda: SplitFrame.load(book)),
+            ("balances: SQL full scan", lambda: sum_split_quantities(book)),
+            ("balances: split frame", lambda: frame.own_totals()),
+            ("balance sheet (bs.py)", lambda: calculate_balance_sheet(book)),
+            ("cash flow: SQL", lambda: load_flow_totals(book, start, today, types)),
+            ("cash flow: split frame", lambda: frame.flow_totals(start, today, types)),
+            (f"{len(months)} monthly flows: SQL", monthly_sql),
+            (f"{len(months)} monthly flows: split frame", lambda: frame.period_flow_totals(start, today, types)),
+        ]
+        print(f"{path}: {len(frame)} splits, {len(frame.accounts)} accounts")
+        for name, case in cases:
+            best = min(timeit.repeat(case, number=1, repeat=repeat))
+            print(f"  {name:<36}{best * 1000:>10.1f} ms")
+    finally:
+        if checkpoints is None:
+            os.environ.pop("GC_CLI_CHECKPOINTS", None)
+        else:
+            os.environ["GC_CLI_CHECKPOINTS"] = checkpoints
+        book.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the report engine on a GnuCash book")
+    parser.add_argument("book", help="Path to a .gnucash (SQLite) book")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case, best is reported")
+    args = parser.parse_args()
+    benchmark(args.book, args.repeat)
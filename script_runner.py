@@ -0,0 +1,107 @@
+import logging
+import re
+import sys
+import time
+from typing import Iterable, TextIO
+
+from colorama import Fore
+
+from command_router import CommandRouter
+from shared_vars import book_pool
+
+log = logging.getLogger(__name__)
+
+# Tools report failures as text; these are the shapes they start with. Only the start
+# counts: listings and confirmations quote descriptions and memos verbatim.
+ERROR_PATTERN = re.compile(
+    r"(error|invalid|no active book|failed|validation failed|cannot)\b"
+    r"|[\w ]+ '[^'\n]*' not found\."
+    r"|[\w ]+ must be "
+    r"|parent account path \S+ does not exist",
+    re.IGNORECASE,
+)
+ANSI_PATTERN = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def is_error(output) -> bool:
+    """Does a tool result start like a failure message?"""
+    if not isinstance(output, str):
+        return False
+    return bool(ERROR_PATTERN.match(ANSI_PATTERN.sub("", output).strip()))
+
+
+def read_commands(source: TextIO) -> Iterable[tuple]:
+    """Yield (line number, command) pairs, skipping blank lines and # comments."""
+    for line_no, line in enumerate(source, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line_no, line
+
+
+async def run_script(source: TextIO, router: CommandRouter, commit_every: int = None,
+                     keep_going: bool = False, out: TextIO = sys.stdout) -> int:
+    """
+    Run a file of commands against one warm book session.
+
+    Every line must be an exact tool invocation (see :class:`CommandRouter`); there is
+    no agent fallback. Writes are committed every `commit_every` commands, or once at
+    the end of the script when it is not given.
+
+    Args:
+        source: Open file (or stdin) with one command per line
+        router: Command router over the agent tools
+        commit_every: Commands per commit (None or 0: one commit for the whole script)
+        keep_going: Continue after a failed command instead of stopping
+        out: Where command output and timings are printed
+
+    Returns:
+        int: Process exit status - 0 if every command succeeded, 1 otherwise
+    """
+    failed = 0
+    ran = 0
+    started = time.perf_counter()
+    book_pool.begin_batch(commit_every or None)
+    try:
+        for line_no, command in read_commands(source):
+            ran += 1
+            command_started = time.perf_counter()
+            try:
+                handled, output = await router.run(command)
+                if not handled:
+                    output = f"Error: not a command (line {line_no}): {command}"
+                ok = handled and not is_error(output)
+            except Exception as e:
+                log.exception(f"Error running script line {line_no}: {command}")
+                output, ok = f"Error: {str(e)}", False
+            try:
+                book_pool.command_done()
+            except Exception as e:
+                log.exception(f"Error committing after script line {line_no}")
+                output, ok = f"{output}\nError committing changes: {str(e)}", False
+            elapsed = (time.perf_counter() - command_started) * 1000
+
+            lost = book_pool.take_rolled_back()
+            if lost:
+                ok = False
+                output = f"{output}\n{lost} uncommitted command(s) of this batch were rolled back"
+
+            status = Fore.GREEN + "ok" if ok else Fore.RED + "FAILED"
+            print(f"{status}{Fore.RESET} [{line_no}] {command} ({elapsed:.1f} ms)", file=out)
+            if output is not None:
+                print(output, file=out)
+
+            if not ok:
+                failed += 1
+                if not keep_going:
+                    break
+    finally:
+        try:
+            book_pool.end_batch()
+        except Exception as e:
+            log.exception("Error committing script changes")
+            print(Fore.RED + f"Error committing changes: {str(e)}", file=out)
+            failed += 1
+
+    total = time.perf_counter() - started
+    print(f"{ran} commands, {failed} failed, {book_pool.commits} commits in {total:.2f}s", file=out)
+    return 1 if failed else 0
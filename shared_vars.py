@@ -1,9 +1,511 @@
-# Track the active book
-active_book: str = None
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import piecash
+from piecash import Account, Commodity, Split, Transaction
+from sqlalchemy import event
+from sqlalchemy import inspect as sa_inspect
+
+from account_index import AccountIndex
+from checkpoints import file_signature, watch_session
+from metrics import tool_metrics
+from prices import PriceStore
+
+log = logging.getLogger(__name__)
+
+VALIDATION_ORDER = {Commodity: 2, Split: 3, Transaction: 5, Account: 10}
+
+# Reports a read session serves before it loads a split frame for the next ones
+FRAME_AFTER_REPORTS = 3
+
+
+class ChangeLog:
+    """Objects a session flushed since its last commit or rollback, and how they changed.
+
+    Recorded from SQLAlchemy's session events rather than read from piecash's own
+    change log, which is private to piecash. Entries are in flush order, so a deferred
+    save can validate just the objects flushed after a mark (see :meth:`since`).
+    Bulk INSERT/UPDATE/DELETE statements (e.g. of statement imports) change the book
+    without a flush; each is an entry too, with no object to validate.
+    """
+
+    def __init__(self, session):
+        # Objects in the order of their flushes (an object once per flush)
+        self._flushed = []
+        # id(obj) -> (obj, its state changes: "new", "dirty", "deleted")
+        self._changes = {}
+        event.listen(session, "before_flush", self._record)
+        event.listen(session, "do_orm_execute", self._record_statement)
+        event.listen(session, "after_commit", self.clear)
+        event.listen(session, "after_soft_rollback", self.clear)
+
+    def _record(self, session, flush_context, instances):
+        for change, objects in (("dirty", session.dirty), ("new", session.new), ("deleted", session.deleted)):
+            for obj in objects:
+                entry = self._changes.get(id(obj))
+                if entry is None:
+                    entry = self._changes[id(obj)] = (obj, [])
+                entry[1].append(change)
+                self._flushed.append(obj)
+
+    def _record_statement(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            self._flushed.append(None)
+
+    def clear(self, *args):
+        self._flushed = []
+        self._changes = {}
+
+    def __len__(self):
+        return len(self._flushed)
+
+    def since(self, mark: int):
+        """(object, state changes) of the objects flushed after the first `mark` entries."""
+        seen = set()
+        for obj in self._flushed[mark:]:
+            if obj is not None and id(obj) not in seen:
+                seen.add(id(obj))
+                yield self._changes[id(obj)]
+
+
+class PooledSession:
+    """A warm piecash session of the pool and the caches built on it.
+
+    A session is used by one tool at a time, so its caches need no locking.
+    """
+
+    def __init__(self, book: piecash.Book, readonly: bool, signature):
+        self.book = book
+        self.readonly = readonly
+        # File signature the session was last synced with
+        self.signature = signature
+        # AccountIndex / PriceStore, built on first use and maintained by the tools
+        self.index: Optional[AccountIndex] = None
+        self.price_store: Optional[PriceStore] = None
+        # Splits as columns, loaded once a read session serves repeated reports
+        self.split_frame = None
+        self.report_reads = 0
+        # Set when the pool dropped the session while a tool was using it
+        self.stale = False
+        # What the read-write session flushed but did not commit yet
+        self.changes = None if readonly else ChangeLog(book.session)
+
+    def drop_caches(self):
+        self.index = None
+        self.price_store = None
+        self.split_frame = None
+        self.report_reads = 0
+
+    def close(self):
+        try:
+            self.book.close()
+        except Exception as e:
+            log.debug(f"Error closing pooled session: {e}")
+
+
+class PooledBook:
+    """Thin proxy around a warm piecash book handed out by the BookSessionPool.
+
+    Tools keep using the piecash API as before (``with book:``, ``book.save()``,
+    ``book.close()``) but closing the proxy returns the session to the pool
+    instead of tearing down the engine. Closing is idempotent, so a tool can
+    wrap its whole body in ``with`` and still close early.
+    """
+
+    def __init__(self, pool, session: PooledSession):
+        self._pool = pool
+        self._session = session
+        self._book = session.book
+        self.readonly = session.readonly
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._book, name)
+
+    @property
+    def account_index(self) -> AccountIndex:
+        """Account lookup index of this session, built on first use."""
+        if self._session.index is None:
+            self._session.index = AccountIndex(self._book)
+        return self._session.index
+
+    @property
+    def price_store(self) -> PriceStore:
+        """Currency/commodity cache and price index of this session, built on first use."""
+        if self._session.price_store is None:
+            self._session.price_store = PriceStore(self._book)
+        return self._session.price_store
+
+    def report_frame(self):
+        """Split frame for a report on this session, or None to aggregate in SQL.
+
+        Loading the frame costs a few SQL aggregations, so it is loaded on the
+        third report of a read session and reused until the book changes.
+        Read-write sessions always use SQL, their data changes with every tool.
+        """
+        session = self._session
+        if session.readonly and session.split_frame is None:
+            session.report_reads += 1
+            if session.report_reads >= FRAME_AFTER_REPORTS:
+                # pandas is imported here, not at startup
+                from report_engine import SplitFrame
+                session.split_frame = SplitFrame.load(self._book)
+        return session.split_frame if session.readonly else None
+
+    def save(self):
+        """Commit the session, or only validate it while the pool is batching commits
+        or group-committing journaled postings (see posting_journal.py)."""
+        if not self.readonly and (self._pool.batching or self._pool.defers_posting()):
+            self._pool.defer_save(self)
+        else:
+            self._book.save()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """Return the session to the pool. Unsaved changes are rolled back."""
+        if not self._released:
+            self._released = True
+            self._pool.release(self)
+
+
+class BookSessionPool:
+    """Keeps piecash sessions warm for the active book.
+
+    Read-only sessions are pooled: each concurrent reader gets its own session, and
+    idle ones are reused by later tool calls. There is a single read-write session;
+    writers take it in turn (the write lock is held from acquire to release).
+    Sessions are opened lazily, refreshed when the book file changes on disk behind
+    their back, and discarded when the file is replaced or the active book changes.
+
+    Sessions are opened with ``check_same_thread=False`` so tools can run on worker
+    threads (see executor.py); the pool never lets two threads use one session at once.
+
+    In batch mode (see :meth:`begin_batch`) every tool gets the read-write session,
+    ``save()`` only validates, and the pending changes are committed every N
+    commands instead of once per tool.
+
+    With group commit on (see posting_journal.GroupCommitter), the saves of journaled
+    postings are deferred the same way, while other tools commit as usual (and so
+    commit the pending postings too). Read sessions see the last commit.
+    """
+
+    def __init__(self):
+        self.path: str = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._writer: Optional[PooledSession] = None
+        self._idle_readers: List[PooledSession] = []
+        self._busy_readers: List[PooledSession] = []
+        # Batch mode: commit every N commands (None: only at end_batch)
+        self.batching = False
+        self._commit_every = None
+        # Commands whose saves are validated but not committed yet
+        self._pending_commands = 0
+        self._saved_this_command = False
+        # Size of the session change log at the last deferred save
+        self._change_mark = 0
+        self._rolled_back = 0
+        self.commits = 0
+        # Group commit of journaled postings; journal of the active book (posting_journal.py)
+        self.group_commit = False
+        self.journal = None
+
+    @property
+    def deferring(self) -> bool:
+        """Are saves being deferred (batch mode or group commit)?"""
+        return self.batching or self.group_commit
+
+    @property
+    def pending_commands(self) -> int:
+        return self._pending_commands
+
+    def defers_posting(self) -> bool:
+        """Is the current tool a journaled posting whose save is to be deferred?"""
+        return self.group_commit and self.journal is not None and self.journal.defers()
+
+    def set_path(self, path):
+        with self._lock:
+            if path != self.path:
+                self.close_all()
+                if self.journal is not None:
+                    # Belongs to the previous book
+                    self.journal.close()
+                    self.journal = None
+            self.path = path
+
+    def _open(self, readonly) -> PooledSession:
+        log.debug(f"Opening {'ro' if readonly else 'rw'} session: {self.path}")
+        started = time.perf_counter()
+        book = piecash.open_book(self.path, open_if_lock=True, readonly=readonly, check_same_thread=False)
+        tool_metrics.add_open_time(time.perf_counter() - started)
+        if not readonly:
+            # Commits drop the balance checkpoints they make stale
+            watch_session(book)
+            event.listen(book.session, "after_commit", self._committed)
+        return PooledSession(book, readonly, file_signature(self.path))
+
+    def _sync(self, session: PooledSession) -> Optional[PooledSession]:
+        """Bring an idle session up to date with the file; None if it must be reopened."""
+        signature = file_signature(self.path)
+        known = session.signature
+        if signature is None or known is None or signature[0] != known[0]:
+            # File was removed or replaced (e.g. restored) - start over
+            log.debug(f"Book file replaced, reopening {'ro' if session.readonly else 'rw'} session: {self.path}")
+            session.close()
+            return None
+        if signature != known and not (self.deferring and self._pending_commands):
+            # Someone else wrote to the file - drop cached ORM state
+            # (not possible while a batch holds uncommitted writes: SQLite locks the file)
+            log.debug(f"Book file changed, refreshing {'ro' if session.readonly else 'rw'} session: {self.path}")
+            session.book.session.rollback()
+            session.book.session.expire_all()
+            session.signature = signature
+            session.drop_caches()
+        return session
+
+    def acquire(self, readonly=True) -> PooledBook:
+        """Hand out a warm session for the active book, opening one if needed.
+
+        Args:
+            readonly (bool): Whether a read-only or read-write session is wanted
+
+        Returns:
+            PooledBook: proxy around the pooled piecash book
+        """
+        if not self.path:
+            raise ValueError("No active book")
+        if self.batching:
+            # One warm session for the whole batch, so reads see the pending writes
+            readonly = False
+
+        if readonly:
+            with self._lock:
+                session = self._idle_readers.pop() if self._idle_readers else None
+            if session is not None:
+                session = self._sync(session)
+            if session is None:
+                session = self._open(True)
+            with self._lock:
+                self._busy_readers.append(session)
+            return PooledBook(self, session)
+
+        self._write_lock.acquire()
+        try:
+            session = self._writer
+            if session is not None:
+                session = self._sync(session)
+                if session is not None and self._has_leftovers(session):
+                    # Leftovers from a tool that bailed out without saving
+                    self._rollback(session)
+            if session is None:
+                session = self._open(False)
+            self._writer = session
+        except Exception:
+            self._write_lock.release()
+            raise
+        return PooledBook(self, session)
+
+    def release(self, pooled: PooledBook):
+        """Take a session back after a tool call and record our own writes."""
+        session = pooled._session
+        if session.readonly:
+            with self._lock:
+                if session in self._busy_readers:
+                    self._busy_readers.remove(session)
+                if not session.stale:
+                    self._idle_readers.append(session)
+                    return
+            # Session was dropped while handed out - just close the orphan
+            session.close()
+            return
+
+        try:
+            if session.stale:
+                session.close()
+                return
+            if self._has_leftovers(session):
+                self._rollback(session)
+            self._after_write(session)
+        finally:
+            self._write_lock.release()
+
+    def _has_leftovers(self, session: PooledSession) -> bool:
+        """Does the session hold changes no save() accounted for?"""
+        if not self.deferring:
+            return not session.book.is_saved or len(session.changes) > 0
+        orm = session.book.session
+        return bool(orm.new or orm.dirty or orm.deleted or len(session.changes) != self._change_mark)
+
+    def _rollback(self, session: PooledSession):
+        """Cancel unsaved changes, including the deferred saves of a batch."""
+        session.book.cancel()
+        # Caches may hold objects that were just rolled back
+        session.drop_caches()
+        if self.deferring and not session.readonly:
+            lost = self._pending_commands + (1 if self._saved_this_command else 0)
+            if lost:
+                log.debug(f"Rolled back {lost} uncommitted batch command(s)")
+            self._rolled_back += lost
+            if self.journal is not None:
+                self.journal.rolled_back()
+            self._pending_commands = 0
+            self._saved_this_command = False
+            self._change_mark = 0
+
+    def _after_write(self, session: PooledSession):
+        """Record a commit of the write session.
+
+        Read sessions notice the new file signature and refresh themselves the
+        next time they are handed out.
+        """
+        signature = file_signature(self.path)
+        if signature != session.signature:
+            session.signature = signature
+            if session.price_store is not None:
+                session.price_store.clear_prices()
+
+    def begin_batch(self, commit_every: int = None):
+        """
+        Start deferring commits: tools' saves are validated and flushed, and committed
+        together every `commit_every` commands (or at :meth:`end_batch`).
+
+        A tool that leaves unsaved changes behind rolls back the whole pending batch;
+        :meth:`take_rolled_back` reports how many commands were lost.
+        """
+        self.batching = True
+        self._commit_every = commit_every
+        self._pending_commands = 0
+        self._saved_this_command = False
+        self._change_mark = 0
+        self._rolled_back = 0
+        self.commits = 0
+
+    def defer_save(self, pooled: PooledBook):
+        """Flush and validate a tool's changes in place of committing them (batch mode,
+        or a journaled posting under group commit, which is then journaled).
+
+        Only the objects changed since the previous save are validated, so errors are
+        reported by the command that caused them; piecash validates everything again
+        when the batch is committed.
+        """
+        changes = pooled._session.changes
+        pooled._book.session.flush()
+        to_validate = set()
+        for changed, states in changes.since(self._change_mark):
+            for obj in changed.object_to_validate(states):
+                if not sa_inspect(obj).deleted:
+                    to_validate.add(obj)
+        # Same order as piecash's Book.validate_book: splits before transactions before accounts
+        for obj in sorted(to_validate, key=lambda o: VALIDATION_ORDER.get(type(o), 20)):
+            obj.validate()
+        if self.journal is not None and not self.batching:
+            # Durable before it counts as saved; if this fails the changes are leftovers
+            self.journal.saved()
+        self._change_mark = len(changes)
+        if self.batching:
+            self._saved_this_command = True
+        else:
+            # A journaled posting is one command of the group
+            self._pending_commands += 1
+
+    def _committed(self, session):
+        """The write session committed, including everything deferred so far."""
+        if self.group_commit:
+            self._pending_commands = 0
+            self._change_mark = 0
+        if self.journal is not None:
+            self.journal.committed()
+
+    def command_done(self):
+        """Mark the end of one batch command; commits when N commands are pending."""
+        if self._saved_this_command:
+            self._pending_commands += 1
+            self._saved_this_command = False
+        if self._commit_every and self._pending_commands >= self._commit_every:
+            self.commit_batch()
+
+    def commit_batch(self):
+        """Commit the pending batch commands, if any."""
+        with self._write_lock:
+            session = self._writer
+            if session is None or not self._pending_commands:
+                return
+            log.debug(f"Committing {self._pending_commands} batch command(s)")
+            try:
+                session.book.save()
+            except Exception:
+                self._rollback(session)
+                raise
+            self.commits += 1
+            self._pending_commands = 0
+            self._change_mark = 0
+            self._after_write(session)
+
+    def take_rolled_back(self) -> int:
+        """Number of batch commands rolled back since the last call."""
+        lost, self._rolled_back = self._rolled_back, 0
+        return lost
+
+    def end_batch(self):
+        """Commit what is pending and go back to committing per tool."""
+        try:
+            self.commit_batch()
+        finally:
+            self.batching = False
+            self._commit_every = None
+
+    def invalidate(self):
+        """Drop all warm sessions, e.g. before the book file is overwritten."""
+        self.close_all()
+
+    def close_all(self):
+        with self._lock:
+            if self.deferring and self._writer is not None:
+                # Switching books in a batch: keep what the earlier commands did
+                self.commit_batch()
+            sessions = self._idle_readers
+            self._idle_readers = []
+            for session in self._busy_readers:
+                session.stale = True
+            self._busy_readers = []
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            # Closed now if idle, or by release() when its tool is done
+            if self._write_lock.acquire(blocking=False):
+                try:
+                    sessions.append(writer)
+                finally:
+                    self._write_lock.release()
+            else:
+                writer.stale = True
+        for session in sessions:
+            session.close()
+
+
+# Track the active book and its warm sessions
+book_pool = BookSessionPool()
+
 
 def get_active_book():
-    return active_book
+    return book_pool.path
+
 
 def set_active_book(value):
-    global active_book  # needed to modify the global
-    active_book = value
\ No newline at end of file
+    book_pool.set_path(value)
+
+
+def get_book(readonly=True) -> PooledBook:
+    """Get a pooled session for the active book.
+
+    Use it as a context manager (``with get_book(readonly=False) as book:``) so the
+    session goes back to the pool on every return and exception: the read-write
+    session holds the pool's write lock until it is closed.
+    """
+    return book_pool.acquire(readonly=readonly)
@@ -0,0 +1,117 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+log = logging.getLogger(__name__)
+
+# Pages copied per backup step are sized to about this many bytes
+STEP_BYTES = 1024 * 1024
+
+# Snapshots are taken one at a time, so each gets its own name
+_snapshot_lock = threading.Lock()
+
+
+def copy_database(source: str, dest: str, rate: Optional[float] = None) -> dict:
+    """
+    Consistent copy of a SQLite database with the online backup API.
+
+    Pages are copied in steps of about STEP_BYTES. The source is only read-locked
+    during a step, so readers are never blocked and writers only wait for the step
+    in progress. If another connection writes to the source mid-copy, SQLite
+    restarts the copy, so the result is always a point-in-time snapshot.
+
+    Args:
+        source: Database file to copy
+        dest: File to write (overwritten)
+        rate: Throughput limit in bytes per second (None: as fast as possible)
+
+    Returns:
+        dict: bytes, pages, restarts, seconds
+    """
+    started = time.perf_counter()
+    progress = {"pages": 0, "copied": 0, "restarts": 0, "remaining": None}
+    page_size = 0
+
+    def on_progress(status, remaining, total):
+        if progress["remaining"] is not None and remaining > progress["remaining"]:
+            # The source changed and the copy started over
+            progress["restarts"] += 1
+        previous = progress["remaining"] if progress["remaining"] is not None else total
+        progress["copied"] += max(0, previous - remaining)
+        progress["remaining"] = remaining
+        progress["pages"] = total
+        if rate and remaining:
+            # Sleep off any lead over the rate; the source is not locked between steps
+            lead = progress["copied"] * page_size / rate - (time.perf_counter() - started)
+            if lead > 0:
+                time.sleep(lead)
+
+    if os.path.exists(dest):
+        os.remove(dest)
+    src = sqlite3.connect(f"file:{Path(source).resolve().as_posix()}?mode=ro", uri=True, timeout=30)
+    with closing(src), closing(sqlite3.connect(dest)) as dst:
+        page_size = src.execute("PRAGMA page_size").fetchone()[0]
+        pages = max(1, STEP_BYTES // page_size)
+        src.backup(dst, pages=pages, progress=on_progress)
+    seconds = time.perf_counter() - started
+    size = os.path.getsize(dest)
+    return {"bytes": size, "pages": progress["pages"], "restarts": progress["restarts"],
+            "seconds": round(seconds, 3)}
+
+
+def _unused_name(book: str, folder, store=None) -> str:
+    """Snapshot name that is in neither the store nor the folder (timestamps have one-second resolution)."""
+    if store is not None:
+        return store.unused_name(book)
+    when = datetime.now()
+    while True:
+        name = f"{book}.{when:%Y%m%d%H%M%S}.gnucash"
+        if not (Path(folder) / name).exists():
+            return name
+        when += timedelta(seconds=1)
+
+
+def snapshot_book(book_path: str, folder="backups", store=None, rate: Optional[float] = None) -> dict:
+    """
+    Take a point-in-time snapshot of a book, named like a GnuCash backup
+    (book.gnucash.YYYYMMDDHHMMSS.gnucash).
+
+    Only committed changes are copied: callers commit what the pool has pending first.
+
+    Args:
+        book_path: Book file (SQLite)
+        folder: Where the snapshot file is written
+        store: backup_store.BackupStore to add the snapshot to; the file is then removed
+        rate: Throughput limit in bytes per second (None: as fast as possible)
+
+    Returns:
+        dict: name, path (None when stored), stored, and the copy statistics
+    """
+    Path(folder).mkdir(exist_ok=True)
+    with _snapshot_lock:
+        name = _unused_name(os.path.basename(book_path), folder, store)
+        path = Path(folder) / name
+        # Written under a name the backup sweeper ignores until it is complete
+        partial = Path(folder) / f"{name}.snapshot"
+        try:
+            stats = copy_database(book_path, str(partial), rate)
+            if store is not None:
+                if store.add(partial, name=name) is None:
+                    raise FileExistsError(f"Backup {name} is already in the backup store")
+                partial.unlink()
+                result_path = None
+            else:
+                os.replace(partial, path)
+                result_path = str(path)
+        finally:
+            if partial.exists():
+                partial.unlink()
+    stats.update(name=name, path=result_path, stored=store is not None)
+    log.debug(f"Snapshot of {book_path}: {stats}")
+    return stats
@@ -0,0 +1,67 @@
+import builtins
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+
+class ImportProfiler:
+    """
+    Times the first import of every top-level package while installed.
+
+    Self time excludes the time spent importing other packages from inside the
+    package, so the self times add up to the total import time (like
+    ``python -X importtime``, but grouped by top-level package).
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.self_times: Dict[str, float] = defaultdict(float)
+        self.cumulative: Dict[str, float] = defaultdict(float)
+        self._children: List[float] = []
+        self._active: List[str] = []
+        self._original = None
+
+    def install(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+        self.finished = time.perf_counter()
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top = name.partition(".")[0]
+        if level or not top or name in sys.modules or top in self._active:
+            return self._original(name, globals, locals, fromlist, level)
+
+        self._active.append(top)
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            self._active.pop()
+            self.self_times[top] += elapsed - children
+            self.cumulative[top] += elapsed
+            if self._children:
+                self._children[-1] += elapsed
+
+    def report(self, limit: int = 25) -> str:
+        """Import time per top-level package, slowest first."""
+        end = self.finished or time.perf_counter()
+        total = end - self.started
+        rows = sorted(self.self_times.items(), key=lambda item: item[1], reverse=True)
+        lines = [f"{'package':<28}{'self ms':>10}{'cumulative ms':>15}"]
+        for package, self_time in rows[:limit]:
+            lines.append(f"{package:<28}{self_time * 1000:>10.1f}{self.cumulative[package] * 1000:>15.1f}")
+        if len(rows) > limit:
+            rest = sum(t for _, t in rows[limit:])
+            lines.append(f"{f'({len(rows) - limit} more)':<28}{rest * 1000:>10.1f}")
+        lines.append(f"Startup (imports and module setup): {total * 1000:.1f} ms")
+        return "\n".join(lines)
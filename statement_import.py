@@ -0,0 +1,282 @@
+import csv
+import re
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import piecash
+from piecash import Account, Split, Transaction
+from piecash.kvp import KVP_Type, Slot
+
+from account_index import AccountIndex
+from checkpoints import note_change
+
+# Accepted CSV header names (lower-case) for each field
+CSV_COLUMNS = {
+    "date": ("date", "post_date", "posted", "transaction date", "value date"),
+    "description": ("description", "payee", "narration", "details", "name"),
+    "amount": ("amount", "value"),
+    "debit": ("debit", "withdrawal", "withdrawal amt."),
+    "credit": ("credit", "deposit", "deposit amt."),
+    "account": ("account", "category", "counter_account"),
+    "memo": ("memo", "notes", "reference", "ref"),
+}
+
+
+class StatementLine(NamedTuple):
+    """One statement row. A positive amount is money coming into the statement account."""
+    line_no: int
+    post_date: date
+    description: str
+    amount: Decimal
+    memo: str = ""
+    account: Optional[str] = None
+
+
+class ImportStats:
+    """Counters and error samples collected while a statement streams through the pipeline."""
+
+    def __init__(self, max_errors: int = 20):
+        self.read = 0
+        self.imported = 0
+        # Chunks saved; each is one commit, unless a --script batch defers the saves
+        self.chunks = 0
+        # Line number of the last row of the last chunk saved
+        self.saved_through: Optional[int] = None
+        self.skipped = 0
+        self.errors: List[str] = []
+        self.max_errors = max_errors
+        self.started = time.perf_counter()
+
+    def skip(self, line_no, reason):
+        self.skipped += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append(f"line {line_no}: {reason}")
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def summary(self) -> str:
+        rate = self.imported / self.elapsed if self.elapsed > 0 else 0.0
+        lines = [f"Read {self.read} rows, imported {self.imported} transactions in {self.chunks} chunks, "
+                 f"skipped {self.skipped} ({self.elapsed:.2f}s, {rate:,.0f} tx/s)"]
+        lines.extend(f"  - {e}" for e in self.errors)
+        if self.skipped > len(self.errors):
+            lines.append(f"  ... and {self.skipped - len(self.errors)} more")
+        return "\n".join(lines)
+
+
+def _parse_amount(value: str) -> Decimal:
+    value = (value or "").strip().replace(",", "")
+    if not value:
+        return Decimal("0")
+    # (123.45) is a common way of writing negative amounts
+    if value.startswith("(") and value.endswith(")"):
+        value = "-" + value[1:-1]
+    return Decimal(value)
+
+
+def parse_csv(path: str, stats: ImportStats, date_format: str = "%Y-%m-%d") -> Iterator[StatementLine]:
+    """
+    Stream statement lines from a CSV file with a header row.
+
+    Recognised columns (case-insensitive, see CSV_COLUMNS): date, description,
+    amount (or debit/credit), and optionally account and memo.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = [h.strip().lower() for h in next(reader, [])]
+        columns = {}
+        for field, names in CSV_COLUMNS.items():
+            for name in names:
+                if name in header:
+                    columns[field] = header.index(name)
+                    break
+        if "date" not in columns or not ("amount" in columns or "debit" in columns or "credit" in columns):
+            raise ValueError("CSV needs a date column and an amount (or debit/credit) column")
+
+        def cell(row, field):
+            position = columns.get(field)
+            return row[position].strip() if position is not None and position < len(row) else ""
+
+        for line_no, row in enumerate(reader, 2):
+            if not any(c.strip() for c in row):
+                continue
+            stats.read += 1
+            try:
+                post_date = datetime.strptime(cell(row, "date"), date_format).date()
+                if "amount" in columns:
+                    amount = _parse_amount(cell(row, "amount"))
+                else:
+                    amount = _parse_amount(cell(row, "credit")) - _parse_amount(cell(row, "debit"))
+            except (ValueError, InvalidOperation) as e:
+                stats.skip(line_no, f"unreadable row ({e})")
+                continue
+            yield StatementLine(line_no, post_date, cell(row, "description"), amount,
+                                cell(row, "memo"), cell(row, "account") or None)
+
+
+def _ofx_tokens(f, chunk_size: int = 65536) -> Iterator[Tuple[str, str]]:
+    """Yield (tag, text) pairs from an OFX (SGML or XML) stream without loading it whole."""
+    buffer = ""
+    while True:
+        chunk = f.read(chunk_size)
+        buffer += chunk
+        parts = buffer.split("<")
+        # Keep the last, possibly incomplete, element for the next round
+        buffer = "" if not chunk else parts.pop()
+        for part in parts:
+            if ">" in part:
+                tag, _, text = part.partition(">")
+                yield tag.strip().upper(), text.strip()
+        if not chunk:
+            break
+
+
+def parse_ofx(path: str, stats: ImportStats) -> Iterator[StatementLine]:
+    """Stream statement lines from the STMTTRN records of an OFX file."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        record = None
+        record_no = 0
+        for tag, text in _ofx_tokens(f):
+            if tag == "STMTTRN":
+                record = {}
+                record_no += 1
+            elif tag == "/STMTTRN" and record is not None:
+                stats.read += 1
+                try:
+                    post_date = datetime.strptime(record.get("DTPOSTED", "")[:8], "%Y%m%d").date()
+                    amount = _parse_amount(record.get("TRNAMT", ""))
+                except (ValueError, InvalidOperation) as e:
+                    stats.skip(record_no, f"unreadable transaction ({e})")
+                else:
+                    yield StatementLine(record_no, post_date, record.get("NAME") or record.get("MEMO", ""),
+                                        amount, record.get("MEMO", "") if record.get("NAME") else "")
+                record = None
+            elif record is not None and not tag.startswith("/"):
+                record[tag] = text
+
+
+def load_rules(rules: Optional[dict]) -> Tuple[List[Tuple[re.Pattern, str]], Optional[str]]:
+    """
+    Compile account mapping rules, as loaded from YAML::
+
+        rules:
+          - match: "SALARY|PAYROLL"
+            account: Income:Salary
+        default: Expenses:Uncategorized
+
+    Returns:
+        Tuple of ([(compiled pattern, account name)], default account name)
+    """
+    if not rules:
+        return [], None
+    compiled = [(re.compile(rule["match"], re.IGNORECASE), rule["account"]) for rule in rules.get("rules", [])]
+    return compiled, rules.get("default")
+
+
+def map_accounts(lines: Iterable[StatementLine], rules: List[Tuple[re.Pattern, str]],
+                 default_account: Optional[str], index: AccountIndex,
+                 stats: ImportStats) -> Iterator[Tuple[StatementLine, Account]]:
+    """Resolve the counter account of each line: explicit column, then first matching rule, then default."""
+    resolved: Dict[str, Optional[Account]] = {}
+    for line in lines:
+        name = line.account
+        if not name:
+            text = f"{line.description} {line.memo}"
+            name = next((account for pattern, account in rules if pattern.search(text)), default_account)
+        if not name:
+            stats.skip(line.line_no, f"no rule matches '{line.description}'")
+            continue
+        if name not in resolved:
+            resolved[name] = index.get(name)
+        if resolved[name] is None:
+            stats.skip(line.line_no, index.not_found("account", name))
+            continue
+        yield line, resolved[name]
+
+
+def validate_postings(postings: Iterable[Tuple[StatementLine, Account]], statement_account: Account,
+                      currency, stats: ImportStats) -> Iterator[Tuple[StatementLine, Account]]:
+    """Drop lines that would not give a balanced, single-currency two-split transaction."""
+    for line, counter in postings:
+        if line.amount == 0:
+            stats.skip(line.line_no, "zero amount")
+        elif not _fits(line.amount, currency.fraction) or not _fits(line.amount, statement_account.commodity_scu):
+            stats.skip(line.line_no, f"{line.amount} has more decimals than {currency.mnemonic} allows")
+        elif counter is statement_account:
+            stats.skip(line.line_no, f"counter account is the statement account {counter.fullname}")
+        elif counter.commodity != currency:
+            stats.skip(line.line_no, f"{counter.fullname} is not in {currency.mnemonic}")
+        elif counter.placeholder:
+            stats.skip(line.line_no, f"{counter.fullname} is a placeholder account")
+        else:
+            yield line, counter
+
+
+def _fits(amount: Decimal, fraction: int) -> bool:
+    return (amount * fraction) % 1 == 0
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def insert_postings(book: piecash.Book, postings: Iterable[Tuple[StatementLine, Account]],
+                    statement_account: Account, stats: ImportStats, chunk_size: int = 1000,
+                    dry_run: bool = False):
+    """
+    Create the transactions chunk by chunk, with one save per chunk.
+
+    Rows are inserted in bulk (as in synthetic_book), as piecash would write them:
+    a transaction, its two splits and its date-posted slot. That skips piecash's
+    per-object validation, so `postings` must come through validate_postings.
+    """
+    currency = book.default_currency
+    enter_date = datetime.now().replace(microsecond=0)
+    value_denom = currency.fraction
+    quantity_denom = statement_account.commodity_scu
+    touched = {statement_account}
+    for chunk in _chunks(postings, chunk_size):
+        if dry_run:
+            stats.imported += len(chunk)
+            continue
+        tx_rows, split_rows, slot_rows = [], [], []
+        for line, counter in chunk:
+            tx_guid = uuid.uuid4().hex
+            value = int(line.amount * value_denom)
+            quantity = int(line.amount * quantity_denom)
+            tx_rows.append(dict(guid=tx_guid, currency_guid=currency.guid, num="", post_date=line.post_date,
+                                enter_date=enter_date, description=line.description))
+            for account, memo, sign in ((statement_account, line.memo, 1), (counter, "", -1)):
+                split_rows.append(dict(guid=uuid.uuid4().hex, tx_guid=tx_guid, account_guid=account.guid,
+                                       memo=memo, action="", reconcile_state="n", reconcile_date=None,
+                                       value_num=sign * value, value_denom=value_denom,
+                                       quantity_num=sign * quantity, quantity_denom=quantity_denom,
+                                       lot_guid=None))
+            slot_rows.append(dict(obj_guid=tx_guid, name="date-posted", slot_type=KVP_Type.KVP_TYPE_GDATE,
+                                  int64_val=0, string_val=None, double_val=0.0, timespec_val=None,
+                                  guid_val=None, numeric_val_num=0, numeric_val_denom=1,
+                                  gdate_val=line.post_date))
+            touched.add(counter)
+        book.session.execute(Transaction.__table__.insert(), tx_rows)
+        book.session.execute(Split.__table__.insert(), split_rows)
+        book.session.execute(Slot.__table__.insert(), slot_rows)
+        # Balance checkpoints only see ORM flushes
+        note_change(book.session, min(line.post_date for line, _ in chunk))
+        book.save()
+        stats.imported += len(chunk)
+        stats.chunks += 1
+        stats.saved_through = chunk[-1][0].line_no
+    for account in touched:
+        # Loaded split lists do not include the inserted rows
+        book.session.expire(account, ["splits"])
@@ -0,0 +1,210 @@
+import logging
+import math
+import random
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+import piecash
+from piecash import Account, Commodity, Price, Split, Transaction
+
+log = logging.getLogger(__name__)
+
+# Top-level accounts and the type of the accounts created below them
+TOP_ACCOUNTS = [
+    ("Assets", "ASSET", "BANK"),
+    ("Liabilities", "LIABILITY", "CREDIT"),
+    ("Income", "INCOME", "INCOME"),
+    ("Expenses", "EXPENSE", "EXPENSE"),
+    ("Equity", "EQUITY", "EQUITY"),
+]
+# Share of the leaf accounts created under each top-level account
+LEAF_SHARE = {"Assets": 0.2, "Liabilities": 0.1, "Income": 0.15, "Expenses": 0.5, "Equity": 0.05}
+
+CHUNK_SIZE = 20000
+
+
+def _guid() -> str:
+    return uuid.uuid4().hex
+
+
+def _insert(book: piecash.Book, table, rows: List[dict]):
+    if rows:
+        book.session.execute(table.insert(), rows)
+
+
+def _account_tree(book: piecash.Book, leaves: int, depth: int) -> Dict[str, List[Account]]:
+    """Create `leaves` leaf accounts `depth` levels below the top-level accounts."""
+    currency = book.default_currency
+    created = {}
+    by_top = {}
+    for name, top_type, leaf_type in TOP_ACCOUNTS:
+        # Not placeholders: YAML imports post opening balances to the top-level Equity
+        top = Account(name=name, type=top_type, parent=book.root_account, commodity=currency)
+        count = max(1, round(leaves * LEAF_SHARE[name]))
+        # Groups per level so that `depth - 1` group levels hold `count` leaves
+        branching = max(2, math.ceil(count ** (1 / depth))) if depth > 1 else count
+        by_top[top_type] = []
+        for i in range(count):
+            parent = top
+            for level in range(depth - 1):
+                group = (i // branching ** (depth - 1 - level)) % branching
+                path = (name, level, i // branching ** (depth - 1 - level))
+                if path not in created:
+                    created[path] = Account(name=f"{name} Group {level + 1}.{group + 1}", type=top_type,
+                                            parent=parent, commodity=currency, placeholder=True)
+                parent = created[path]
+            by_top[top_type].append(Account(name=f"{name} Account {i + 1}", type=leaf_type,
+                                            parent=parent, commodity=currency))
+    return by_top
+
+
+def _stocks(book: piecash.Book, stocks: int, assets: Account, namespace: str) -> List[Account]:
+    currency = book.default_currency
+    investments = Account(name="Investments", type="ASSET", parent=assets, commodity=currency, placeholder=True)
+    accounts = []
+    for i in range(stocks):
+        commodity = Commodity(namespace=namespace, mnemonic=f"STK{i + 1:03d}",
+                              fullname=f"Synthetic Stock {i + 1}", fraction=1, book=book)
+        accounts.append(Account(name=f"STK{i + 1:03d}", type="STOCK", parent=investments, commodity=commodity))
+    return accounts
+
+
+def generate_book(path: str, accounts: int = 50, depth: int = 3, transactions: int = 1000,
+                  splits_per_transaction: int = 2, stocks: int = 0, price_days: int = 0,
+                  years: int = 3, currency: str = "INR", seed: int = 0) -> dict:
+    """
+    Create a synthetic GnuCash book for benchmarks.
+
+    Accounts and commodities go through piecash; transactions, splits and prices are
+    bulk-inserted in chunks, so books with millions of splits take seconds to minutes
+    rather than hours.
+
+    Args:
+        path: Book file to create (overwritten)
+        accounts: Number of leaf accounts, spread over assets, liabilities, income,
+            expenses and equity
+        depth: Levels of accounts below the top-level accounts (1: leaves only)
+        transactions: Number of transactions
+        splits_per_transaction: Splits per transaction (2 or more)
+        stocks: Number of stock commodities, each with an account that ~5% of the
+            transactions buy into
+        price_days: Days of daily price history per stock
+        years: Transactions are spread over this many years up to today
+        currency: Book currency
+        seed: Random seed (same arguments and seed give the same amounts and dates)
+
+    Returns:
+        dict: Counts of what was created and the time it took
+    """
+    if splits_per_transaction < 2:
+        raise ValueError("A transaction needs at least 2 splits")
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    book = piecash.create_book(path, overwrite=True, currency=currency, keep_foreign_keys=False)
+    try:
+        by_type = _account_tree(book, accounts, depth)
+        assets = book.root_account.children(name="Assets")
+        stock_accounts = _stocks(book, stocks, assets, "NSE") if stocks else []
+        book.save()
+
+        today = date.today()
+        first_day = today - timedelta(days=365 * years)
+        currency_guid = book.default_currency.guid
+        # Money leaves assets, liabilities and income for expenses and assets
+        sources = by_type["ASSET"] + by_type["LIABILITY"] + by_type["INCOME"]
+        targets = by_type["EXPENSE"] + by_type["ASSET"]
+        enter_date = datetime.now().replace(microsecond=0)
+
+        tx_rows, split_rows = [], []
+        split_count = 0
+        for i in range(transactions):
+            tx_guid = _guid()
+            post_date = first_day + timedelta(days=rng.randrange(365 * years + 1))
+            tx_rows.append(dict(guid=tx_guid, currency_guid=currency_guid, num="", post_date=post_date,
+                                enter_date=enter_date, description=f"Synthetic transaction {i + 1}"))
+            source = rng.choice(sources)
+            if stock_accounts and rng.random() < 0.05:
+                # Buy shares: value in currency, quantity in shares
+                cents = rng.randint(1000, 1000000)
+                legs = [(rng.choice(stock_accounts).guid, cents, rng.randint(1, 100), 1)]
+                legs += [(by_type["ASSET"][0].guid, 0, 0, 100)] * (splits_per_transaction - 2)
+            else:
+                legs = []
+                cents = 0
+                for _ in range(splits_per_transaction - 1):
+                    amount = rng.randint(100, 500000)
+                    cents += amount
+                    legs.append((rng.choice(targets).guid, amount, amount, 100))
+            legs.append((source.guid, -cents, -cents, 100))
+            for account_guid, value, quantity, quantity_denom in legs:
+                split_rows.append(dict(guid=_guid(), tx_guid=tx_guid, account_guid=account_guid, memo="",
+                                       action="", reconcile_state="n", reconcile_date=None,
+                                       value_num=value, value_denom=100,
+                                       quantity_num=quantity, quantity_denom=quantity_denom, lot_guid=None))
+            if len(split_rows) >= CHUNK_SIZE:
+                _insert(book, Transaction.__table__, tx_rows)
+                _insert(book, Split.__table__, split_rows)
+                split_count += len(split_rows)
+                tx_rows, split_rows = [], []
+        _insert(book, Transaction.__table__, tx_rows)
+        _insert(book, Split.__table__, split_rows)
+        split_count += len(split_rows)
+
+        price_rows = []
+        price_count = 0
+        for account in stock_accounts:
+            value = rng.randint(1000, 500000)
+            for day in range(price_days):
+                value = max(1, value + rng.randint(-value // 50 - 1, value // 50 + 1))
+                price_rows.append(dict(guid=_guid(), commodity_guid=account.commodity.guid,
+                                       currency_guid=currency_guid, date=today - timedelta(days=day),
+                                       source="user:price", type="last", value_num=value, value_denom=100))
+                if len(price_rows) >= CHUNK_SIZE:
+                    _insert(book, Price.__table__, price_rows)
+                    price_count += len(price_rows)
+                    price_rows = []
+        _insert(book, Price.__table__, price_rows)
+        price_count += len(price_rows)
+        book.save()
+
+        stats = {
+            "accounts": len(book.accounts),
+            "transactions": transactions,
+            "splits": split_count,
+            "stocks": stocks,
+            "prices": price_count,
+            "seconds": round(time.perf_counter() - started, 2),
+        }
+        log.debug(f"Generated synthetic book {path}: {stats}")
+        return stats
+    finally:
+        book.close()
+
+
+def parse_size(text: str) -> int:
+    """'1k' -> 1000, '100k' -> 100000, '1M' -> 1000000."""
+    text = text.strip()
+    multiplier = {"k": 1000, "K": 1000, "m": 1000000, "M": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("kKmM")) * multiplier)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic GnuCash book")
+    parser.add_argument("book", help="Book file to create (overwritten)")
+    parser.add_argument("--splits", default="10k", help="Approximate number of splits, e.g. 1k, 100k, 1M")
+    parser.add_argument("--accounts", type=int, default=50, help="Leaf accounts")
+    parser.add_argument("--depth", type=int, default=3, help="Account levels below the top-level accounts")
+    parser.add_argument("--splits-per-transaction", type=int, default=2)
+    parser.add_argument("--stocks", type=int, default=5, help="Stock commodities")
+    parser.add_argument("--price-days", type=int, default=365, help="Days of price history per stock")
+    parser.add_argument("--years", type=int, default=3, help="Years of transactions up to today")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(generate_book(args.book, accounts=args.accounts, depth=args.depth,
+                        transactions=max(1, parse_size(args.splits) // args.splits_per_transaction),
+                        splits_per_transaction=args.splits_per_transaction, stocks=args.stocks,
+                        price_days=args.price_days, years=args.years, seed=args.seed))
@@ -0,0 +1,23 @@
+import asyncio
+import functools
+
+import pytest
+
+import gnucash_cli as cli
+import posting_journal
+from executor import WRITE, tool_executor
+from shared_vars import set_active_book
+
+BOOK = "test_book.gnucash"
+
+
+@pytest.fixture
+def book(tmp_path, monkeypatch):
+    """A new active book with the sample accounts and transactions, in a temporary folder."""
+    monkeypatch.chdir(tmp_path)
+    asyncio.run(cli.create_book(None, BOOK[:-len(".gnucash")]))
+    asyncio.run(cli.add_dummy_accounts())
+    yield BOOK
+    if posting_journal.group_committer is not None:
+        asyncio.run(posting_journal.group_committer.stop(functools.partial(tool_executor.run, WRITE)))
+    set_active_book(None)
@@ -0,0 +1,117 @@
+"""YAML account trees: validated first, then imported in a single commit."""
+import asyncio
+import sqlite3
+from decimal import Decimal
+
+import piecash
+
+import gnucash_cli as cli
+from shared_vars import set_active_book
+
+TREE = """
+accounts:
+  - name: Assets
+    children:
+      - name: Wallet
+        type: BANK
+        initial_balance: 100.50
+        balance_date: "2024-06-01"
+      - name: Brokerage
+        children:
+          - name: ACME
+            type: STOCK
+            namespace: NSE
+            initial_price: 12.5
+  - name: Liabilities
+    children:
+      - name: Car Loan
+        type: LIABILITY
+        initial_balance: 2000
+        balance_date: "2024-06-02"
+  # Opening balances may come before the Equity account
+  - name: Equity
+    type: EQUITY
+    children:
+      - name: Opening Balances
+"""
+
+
+def write(text, path="accounts.yaml"):
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def run_import(path, dry_run=False):
+    return asyncio.run(cli.create_accounts_from_file(None, path, dry_run))
+
+
+def count(path, table):
+    with sqlite3.connect(path) as db:
+        return db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_tree_is_imported_with_opening_balances(book):
+    result = run_import(write(TREE))
+    assert result.endswith("in one commit: 6 accounts to create, 2 already exist, "
+                           "2 opening balances, 1 stock accounts"), result
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        wallet = raw.accounts(fullname="Assets:Wallet")
+        assert wallet.type == "BANK"
+        assert wallet.get_balance() == Decimal("100.50")
+        assert wallet.splits[0].transaction.post_date.isoformat() == "2024-06-01"
+        assert raw.accounts(fullname="Liabilities:Car Loan").get_balance() == Decimal("2000")
+        assert raw.accounts(fullname="Equity").get_balance(natural_sign=False) == Decimal("1899.50")
+        acme = raw.accounts(fullname="Assets:Brokerage:ACME")
+        assert acme.commodity.namespace == "NSE"
+        assert acme.commodity.prices[0].value == Decimal("12.5")
+        assert raw.accounts(fullname="Assets:Brokerage").type == "ASSET"
+
+
+def test_importing_again_only_adds_the_opening_balances(book):
+    run_import(write(TREE))
+    accounts, transactions = count(book, "accounts"), count(book, "transactions")
+    result = run_import("accounts.yaml")
+    assert "Account already exists: Assets:Wallet" in result
+    assert "0 accounts to create, 8 already exist" in result
+    assert count(book, "accounts") == accounts
+    assert count(book, "transactions") == transactions + 2
+
+
+def test_invalid_file_imports_nothing(book):
+    accounts, transactions = count(book, "accounts"), count(book, "transactions")
+    result = run_import(write("""
+accounts:
+  - name: Assets
+    children:
+      - name: Fine
+      - name: "Bad:Name"
+      - name: Loan
+        type: MORTGAGE
+      - name: Fine
+      - name: Wallet
+        initial_balance: lots
+        balance_date: "01/06/2024"
+"""))
+    assert result.startswith("Validation failed, nothing was imported (6 errors):"), result
+    for error in ["Assets:Bad:Name: account names cannot contain ':'",
+                  "Assets:Loan: invalid account type 'MORTGAGE'",
+                  "Assets:Fine: duplicate account name under the same parent",
+                  "Assets:Wallet: invalid initial_balance - 'lots' is not a number",
+                  "Assets:Wallet: invalid balance_date '01/06/2024' (expected YYYY-MM-DD)",
+                  "Opening balances need an 'Equity' top-level account"]:
+        assert error in result
+    assert (count(book, "accounts"), count(book, "transactions")) == (accounts, transactions)
+
+
+def test_dry_run_reports_without_writing(book):
+    accounts = count(book, "accounts")
+    result = run_import(write(TREE), dry_run=True)
+    assert result == ("Dry run OK for accounts.yaml: 6 accounts to create, 2 already exist, "
+                      "2 opening balances, 1 stock accounts")
+    assert count(book, "accounts") == accounts
+
+
+def test_missing_accounts_section(book):
+    assert run_import(write("rules: []\n")) == "Invalid YAML format - missing 'accounts' section"
@@ -0,0 +1,103 @@
+"""Account path index: lookups stay in step with created, moved and deleted accounts."""
+import asyncio
+
+import piecash
+import pytest
+from piecash import Account
+
+import gnucash_cli as cli
+from account_index import AccountIndex
+from shared_vars import set_active_book
+
+
+@pytest.fixture
+def raw_book(book):
+    set_active_book(None)
+    with piecash.open_book(book, readonly=False, open_if_lock=True, do_backup=False) as raw:
+        yield raw
+
+
+def indexed(index):
+    return sorted(name for name in index._by_fullname)
+
+
+def test_index_has_every_full_name(raw_book):
+    index = AccountIndex(raw_book)
+    assert indexed(index) == sorted(acc.fullname for acc in raw_book.accounts)
+    assert len(index) == len(raw_book.accounts)
+    assert "Assets:Checking Account" in index
+    assert "Root Account" not in index
+
+
+def test_lookups(raw_book):
+    index = AccountIndex(raw_book)
+    checking = raw_book.accounts(fullname="Assets:Checking Account")
+    assert index.get("Assets:Checking Account") is checking
+    assert index.get("assets:checking account") is checking
+    assert index.get("assets:checking account", case_sensitive=True) is None
+    assert index.get("Assets:Nowhere") is None
+    assert index.get(None) is None
+    assert index.find_by_name("CHECKING ACCOUNT") == [checking]
+    assert index.child(raw_book.accounts(fullname="Assets"), "Checking Account") is checking
+    assert {acc.name for acc in index.children(None)} == {"Assets", "Liabilities", "Income", "Expenses"}
+    assert {acc.name for acc in index.children(raw_book.root_account)} == {
+        "Assets", "Liabilities", "Income", "Expenses"}
+
+
+def test_names_that_differ_only_in_case_are_not_guessed(raw_book):
+    assets = raw_book.accounts(fullname="Assets")
+    index = AccountIndex(raw_book)
+    upper = Account("CASH", "BANK", raw_book.default_currency, parent=assets)
+    lower = Account("cash", "BANK", raw_book.default_currency, parent=assets)
+    index.add_all([upper, lower])
+    assert index.get("Assets:CASH") is upper
+    assert index.get("Assets:cash") is lower
+    assert index.get("Assets:Cash") is None
+    assert index.find_by_name("Cash") == [upper, lower]
+
+
+def test_move_and_remove_re_key_the_subtree(raw_book):
+    index = AccountIndex(raw_book)
+    savings = raw_book.accounts(fullname="Assets:Savings Account")
+    emergency = Account("Emergency", "BANK", raw_book.default_currency, parent=savings)
+    house = Account("House", "BANK", raw_book.default_currency, parent=emergency)
+    index.add_all([emergency, house])
+    assert index.get("Assets:Savings Account:Emergency:House") is house
+
+    checking = raw_book.accounts(fullname="Assets:Checking Account")
+    emergency.parent = checking
+    index.move(emergency, "Assets:Savings Account:Emergency")
+    assert index.get("Assets:Checking Account:Emergency") is emergency
+    assert index.get("Assets:Checking Account:Emergency:House") is house
+    assert index.get("Assets:Savings Account:Emergency") is None
+    assert index.get("Assets:Savings Account:Emergency:House") is None
+    assert index.children(savings) == []
+    assert index.child(checking, "Emergency") is emergency
+    raw_book.flush()
+    assert indexed(index) == sorted(acc.fullname for acc in raw_book.accounts)
+
+    index.remove(emergency)
+    assert "Assets:Checking Account:Emergency" not in index
+    assert "Assets:Checking Account:Emergency:House" not in index
+    assert index.find_by_name("House") == []
+    assert index.children(checking) == []
+
+
+def test_not_found_suggests_close_names(raw_book):
+    index = AccountIndex(raw_book)
+    assert index.not_found("Account", "Assets:Checking Acount") == (
+        "Account 'Assets:Checking Acount' not found. Did you mean: Assets:Checking Account, Assets:Savings Account?")
+    assert index.suggest("Groceries") == ["Expenses:Groceries"]
+    assert index.not_found("Account", "Zzz") == "Account 'Zzz' not found."
+
+
+def test_tools_resolve_a_moved_account_by_its_new_path(book):
+    result = asyncio.run(cli.create_subaccount(None, "Assets:Savings Account", "Emergency", "BANK"))
+    assert result.startswith("Successfully"), result
+    result = asyncio.run(cli.move_account(None, "Assets:Savings Account:Emergency", "Assets:Checking Account"))
+    assert result.startswith("Successfully"), result
+    moved = asyncio.run(cli.transfer_funds(None, "Assets:Checking Account:Emergency", "Expenses", 1, "moved"))
+    assert moved.startswith("Successfully"), moved
+    old = asyncio.run(cli.transfer_funds(None, "Assets:Savings Account:Emergency", "Expenses", 1, "old path"))
+    assert "'Assets:Savings Account:Emergency' not found" in old
+    assert "Did you mean: Assets:Checking Account:Emergency" in old
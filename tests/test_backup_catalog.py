@@ -0,0 +1,77 @@
+"""Backup catalog: retention policies and purging."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import gnucash_cli as cli
+from backup_catalog import expired_by_policy, parse_policy
+
+
+@pytest.mark.parametrize("kwargs, message", [
+    ({"policy": "daily:30"}, "Invalid retention policy: Invalid retention window '30' for daily"),
+    ({"policy": "fortnightly:1y"}, "Invalid retention policy: Unknown retention tier 'fortnightly'"),
+    ({"before_date": "15/03/2024"}, "Invalid date format. Please use YYYY-MM-DD"),
+])
+def test_purge_reports_invalid_arguments(book, kwargs, message):
+    assert asyncio.run(cli.purge_backups(None, "test_book", **kwargs)).startswith(message)
+
+
+NOW = datetime(2024, 6, 15, 12, 0, 0)
+
+
+def ago(**kwargs):
+    return NOW - timedelta(**kwargs)
+
+
+def test_parse_policy():
+    assert parse_policy("hourly:1d, daily:30d,monthly:1y") == [
+        ("hourly", timedelta(days=1)), ("daily", timedelta(days=30)), ("monthly", timedelta(days=365))]
+    assert parse_policy("ALL:12h,weekly:2w") == [("all", timedelta(hours=12)), ("weekly", timedelta(weeks=2))]
+    with pytest.raises(ValueError, match="Empty retention policy"):
+        parse_policy(" , ")
+
+
+def test_hourly_tier_keeps_the_newest_backup_of_each_hour_in_its_window():
+    times = [ago(minutes=10), ago(minutes=40), ago(hours=1, minutes=5), ago(hours=1, minutes=50),
+             ago(days=2)]
+    expired = expired_by_policy(times, parse_policy("hourly:1d"), now=NOW)
+    # 11:50 and 11:20 share an hour, so do 10:55 and 10:10; two days ago is outside the window
+    assert expired == [ago(days=2), ago(hours=1, minutes=50), ago(minutes=40)]
+
+
+def test_window_includes_its_first_instant():
+    times = [ago(days=30), ago(days=30, seconds=1), NOW]
+    assert expired_by_policy(times, parse_policy("daily:30d"), now=NOW) == [ago(days=30, seconds=1)]
+
+
+def test_newest_backup_is_kept_outside_every_window():
+    times = [ago(days=400), ago(days=500)]
+    assert expired_by_policy(times, parse_policy("daily:7d"), now=NOW) == [ago(days=500)]
+    assert expired_by_policy([], parse_policy("daily:7d"), now=NOW) == []
+
+
+def test_tiers_keep_the_union_of_their_buckets():
+    # At 11:00 and 07:00 of each of the last 60 days
+    times = [ago(days=d, hours=h) for d in range(60) for h in (1, 5)]
+    expired = set(expired_by_policy(times, parse_policy("all:12h,daily:7d,monthly:1y"), now=NOW))
+    kept = sorted(set(times) - expired)
+    # all:12h: both of today
+    assert ago(hours=5) in kept
+    # daily:7d: the newest of each day since 2024-06-08 12:00
+    assert all(ago(days=d, hours=1) in kept for d in range(1, 7))
+    assert all(ago(days=d, hours=5) in expired for d in range(1, 60))
+    assert ago(days=7, hours=1) in expired
+    # monthly:1y: the newest of May and of April
+    assert datetime(2024, 5, 31, 11) in kept
+    assert datetime(2024, 4, 30, 11) in kept
+    assert len(kept) == 2 + 6 + 2
+
+
+def test_weekly_and_yearly_tiers_use_iso_weeks_and_calendar_years():
+    times = [datetime(2023, 12, 31, 9), datetime(2024, 1, 1, 9), datetime(2024, 1, 7, 9), datetime(2024, 1, 8, 9)]
+    now = datetime(2024, 1, 9)
+    # 2023-12-31 is a Sunday: ISO week 52 of 2023; 1 to 7 January is week 1
+    assert expired_by_policy(times, parse_policy("weekly:4w"), now=now) == [datetime(2024, 1, 1, 9)]
+    assert expired_by_policy(times, parse_policy("yearly:2y"), now=now) == [
+        datetime(2024, 1, 1, 9), datetime(2024, 1, 7, 9)]
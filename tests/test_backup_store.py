@@ -0,0 +1,59 @@
+"""Backup store: swept files are only deleted once the store holds their contents, and
+the tools that change backups do not run alongside reads."""
+from datetime import timedelta
+
+import pytest
+
+import gnucash_cli as cli
+from backup_store import BackupStore
+from backup_sweeper import MOVE, BackupSweeper
+from executor import EXCLUSIVE, WRITE
+
+NAME = "book.gnucash.20240301120000.gnucash"
+
+
+def write(path, text):
+    path.write_text(text)
+    return path
+
+
+def contents(store, name, tmp_path):
+    dest = tmp_path / "restored"
+    store.restore(name, dest)
+    return dest.read_text()
+
+
+def test_keep_stores_a_file_once(tmp_path):
+    store = BackupStore(tmp_path / "store.db")
+    path = write(tmp_path / NAME, "first")
+    assert store.keep(path) == NAME
+    assert store.keep(path) == NAME
+    assert [b["name"] for b in store.list()] == [NAME]
+
+
+def test_keep_renames_different_contents_under_a_taken_name(tmp_path):
+    store = BackupStore(tmp_path / "store.db")
+    store.keep(write(tmp_path / NAME, "first"))
+    assert store.keep(write(tmp_path / NAME, "second")) == "book.gnucash.20240301120001.gnucash"
+    assert contents(store, NAME, tmp_path) == "first"
+    assert contents(store, "book.gnucash.20240301120001.gnucash", tmp_path) == "second"
+
+
+def test_sweeper_keeps_a_backup_whose_name_is_taken(tmp_path):
+    store = BackupStore(tmp_path / "store.db")
+    store.keep(write(tmp_path / NAME, "first"))
+    sweeper = BackupSweeper(tmp_path, tmp_path / "backups", timedelta(minutes=1), timedelta(days=1),
+                            run_blocking=None, store=store)
+    path = write(tmp_path / NAME, "second")
+    sweeper.apply([(str(path), MOVE)])
+    assert not path.exists()
+    assert sorted(contents(store, b["name"], tmp_path) for b in store.list()) == ["first", "second"]
+
+
+@pytest.mark.parametrize("tool, kind", [
+    (cli.snapshot_book, WRITE),
+    (cli.purge_backups, EXCLUSIVE),
+    (cli.restore_backup, EXCLUSIVE),
+])
+def test_backup_tools_that_change_state_do_not_run_as_reads(tool, kind):
+    assert tool.tool_kind == kind
@@ -0,0 +1,56 @@
+"""Aggregated account balances against piecash's own per-account computation."""
+import asyncio
+from decimal import Decimal
+
+import piecash
+import pytest
+
+import gnucash_cli as cli
+from balances import AccountBalances, load_split_totals, to_decimal
+from shared_vars import set_active_book
+
+
+@pytest.fixture
+def raw_book(book):
+    """The test book with cents and a priced stock account, opened directly with piecash."""
+    asyncio.run(cli.transfer_funds(None, "Assets:Checking Account", "Expenses:Groceries", 0.3, "cents"))
+    asyncio.run(cli.create_stock_sub_account(None, "AAPL", parent_path="Assets", initial_price=150.25))
+    asyncio.run(cli.add_stock_transaction(None, "AAPL", "2024-02-01", 10, 150.25,
+                                          credit_account="Assets:Checking Account"))
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        yield raw
+
+
+def test_to_decimal_keeps_the_scale_of_the_denominator():
+    assert str(to_decimal(6023470, 100)) == "60234.70"
+    assert str(to_decimal(9226600, 100)) == "92266.00"
+    assert str(to_decimal(0, 100)) == "0.00"
+    assert str(to_decimal(5, 1)) == "5"
+    assert to_decimal(1, 3) == Decimal(1) / Decimal(3)
+
+
+def test_balances_equal_piecash_get_balance(raw_book):
+    balances = AccountBalances(raw_book)
+    assert any(acc.commodity.namespace != "CURRENCY" for acc in raw_book.accounts)
+    for acc in raw_book.accounts:
+        for recurse in (True, False):
+            for natural_sign in (True, False):
+                expected = acc.get_balance(recurse=recurse, natural_sign=natural_sign)
+                assert balances.get_balance(acc, recurse, natural_sign) == expected, acc.fullname
+
+
+def test_own_totals_keep_the_split_scale(raw_book):
+    totals = load_split_totals(raw_book)
+    savings = raw_book.accounts(fullname="Assets:Savings Account")
+    checking = raw_book.accounts(fullname="Assets:Checking Account")
+    assert str(totals[savings.guid]) == "1000.00"
+    assert totals[checking.guid] == checking.get_balance(recurse=False)
+    assert totals[checking.guid].as_tuple().exponent == -2
+
+
+def test_zero_balance_of_a_credit_account_is_not_negative(raw_book):
+    card = raw_book.accounts(fullname="Liabilities:Credit Card")
+    balance = AccountBalances(raw_book).get_balance(card)
+    assert balance == 0
+    assert not balance.is_signed()
@@ -0,0 +1,78 @@
+"""Session pool: sessions go back on every path, and deferred saves validate per command."""
+import asyncio
+import sqlite3
+import threading
+from decimal import Decimal
+
+import pytest
+from piecash import GncImbalanceError, Split, Transaction
+
+import gnucash_cli as cli
+from shared_vars import book_pool, get_book
+
+
+def post(description, debit, credit):
+    with get_book(readonly=False) as book:
+        Transaction(currency=book.default_currency, description=description, splits=[
+            Split(account=book.accounts(fullname="Assets"), value=Decimal(-credit)),
+            Split(account=book.accounts(fullname="Expenses"), value=Decimal(debit)),
+        ])
+        book.save()
+
+
+def descriptions(path):
+    with sqlite3.connect(path) as db:
+        return {d for (d,) in db.execute("SELECT description FROM transactions")}
+
+
+def test_early_return_releases_the_write_session(book):
+    result = asyncio.run(cli.create_stock_sub_account(None, "AAPL", parent_path="Nowhere"))
+    assert "does not exist" in result
+
+    # Another thread can take the write lock, e.g. the writer thread of the next posting
+    acquired = []
+
+    def take_lock():
+        if book_pool._write_lock.acquire(timeout=5):
+            acquired.append(True)
+            book_pool._write_lock.release()
+
+    thread = threading.Thread(target=take_lock)
+    thread.start()
+    thread.join()
+    assert acquired == [True]
+
+
+def test_deferred_saves_validate_each_command(book):
+    book_pool.begin_batch()
+    try:
+        post("first", 1, 1)
+        book_pool.command_done()
+        assert book_pool.pending_commands == 1
+        with pytest.raises(GncImbalanceError):
+            post("unbalanced", 2, 1)
+        book_pool.command_done()
+        # The session was left with changes no save accounted for
+        assert book_pool.take_rolled_back() == 1
+        assert book_pool.pending_commands == 0
+        post("second", 3, 3)
+        book_pool.command_done()
+    finally:
+        book_pool.end_batch()
+    assert book_pool.commits == 1
+    found = descriptions(book)
+    assert "second" in found
+    assert not {"first", "unbalanced"} & found
+
+
+def test_change_log_starts_over_after_each_commit(book):
+    book_pool.begin_batch()
+    try:
+        post("batched", 1, 1)
+        book_pool.command_done()
+        assert len(book_pool._writer.changes) > 0
+        book_pool.commit_batch()
+        assert len(book_pool._writer.changes) == 0
+    finally:
+        book_pool.end_batch()
+    assert "batched" in descriptions(book)
@@ -0,0 +1,81 @@
+"""Balance sheet rollup against piecash's recursive get_balance."""
+import asyncio
+from datetime import date, datetime
+from decimal import Decimal
+
+import piecash
+import pytest
+from piecash import Account, Split, Transaction
+
+import gnucash_cli as cli
+from bs import calculate_balance_sheet
+from shared_vars import set_active_book
+
+CATEGORIES = {"assets": ["ASSET", "BANK", "CASH", "STOCK", "MUTUAL"], "liabilities": ["LIABILITY", "CREDIT"],
+              "equity": ["EQUITY"]}
+
+
+def transfer(book, day, debit, credit, amount):
+    Transaction(currency=book.default_currency, description="test", post_date=day, splits=[
+        Split(account=book.accounts(fullname=debit), value=Decimal(amount)),
+        Split(account=book.accounts(fullname=credit), value=-Decimal(amount)),
+    ])
+
+
+@pytest.fixture
+def nested(book):
+    """The test book with a priced stock, a three-level subtree and an equity account."""
+    asyncio.run(cli.create_stock_sub_account(None, "AAPL", parent_path="Assets", initial_price=150.25))
+    asyncio.run(cli.add_stock_transaction(None, "AAPL", "2024-02-01", 10, 150.25,
+                                          credit_account="Assets:Checking Account"))
+    set_active_book(None)
+    with piecash.open_book(book, readonly=False, open_if_lock=True, do_backup=False) as raw:
+        assets = raw.accounts(fullname="Assets")
+        currency = raw.default_currency
+        investments = Account("Investments", "ASSET", currency, parent=assets)
+        broker = Account("Broker", "ASSET", currency, parent=investments)
+        Account("Cash", "BANK", currency, parent=broker)
+        Account("Opening Balances", "EQUITY", currency, parent=raw.root_account)
+        raw.flush()
+        transfer(raw, date(2024, 1, 2), "Assets:Investments:Broker:Cash", "Assets:Checking Account", "123.45")
+        transfer(raw, date(2024, 3, 1), "Assets:Investments:Broker:Cash", "Opening Balances", "0.55")
+        raw.save()
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        yield raw
+
+
+def expected_balance(account, at_date):
+    return float(account.get_balance(recurse=True, natural_sign=False, at_date=at_date,
+                                     commodity=account.book.default_currency))
+
+
+@pytest.mark.parametrize("at_date", [date(2024, 1, 3), date(2024, 2, 15), None])
+def test_rollup_equals_piecash_get_balance(nested, at_date):
+    sheet = calculate_balance_sheet(nested, datetime.combine(at_date, datetime.min.time()) if at_date else None)
+    compared = 0
+    for top in nested.root_account.children:
+        category = next((c for c, types in CATEGORIES.items() if top.type in types), None)
+        if category is None:
+            continue
+        total = expected_balance(top, at_date)
+        if total == 0:
+            assert top.name not in sheet[category]
+            continue
+        group = sheet[category][top.name]
+        assert group["Total"] == total, top.fullname
+        for child in top.children:
+            assert group.get(child.name, 0.0) == expected_balance(child, at_date), child.fullname
+        compared += 1
+    assert compared
+
+
+def test_placeholder_children_are_left_out(book, nested):
+    with piecash.open_book(book, readonly=False, open_if_lock=True, do_backup=False) as raw:
+        raw.accounts(fullname="Assets:Investments").placeholder = 1
+        raw.save()
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        sheet = calculate_balance_sheet(raw)
+        assets = raw.accounts(fullname="Assets")
+        investments = raw.accounts(fullname="Assets:Investments")
+        assert "Investments" not in sheet["assets"]["Assets"]
+        assert sheet["assets"]["Assets"]["Total"] == expected_balance(assets, None) - expected_balance(investments, None)
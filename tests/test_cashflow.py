@@ -0,0 +1,50 @@
+"""Cash-flow totals filtered in SQL select the same posting days as piecash."""
+import sqlite3
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+import piecash
+import pytest
+
+from balances import load_flow_totals
+from shared_vars import set_active_book
+
+TYPES = ["INCOME", "EXPENSE"]
+
+
+@pytest.fixture
+def raw_book(book):
+    """The test book with posts stored at the first and last minute of their UTC day."""
+    set_active_book(None)
+    with sqlite3.connect(book) as db:
+        db.execute("UPDATE transactions SET post_date = '2024-01-03 00:00:00' WHERE description = 'Grocery shopping'")
+        db.execute("UPDATE transactions SET post_date = '2024-01-04 23:59:00' "
+                   "WHERE description = 'Utility bill payment'")
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        yield raw
+
+
+def expected_flows(book, start, end):
+    """Absolute split values per account, from the post dates piecash reads back."""
+    totals = defaultdict(Decimal)
+    for split in book.splits:
+        if split.account.type in TYPES and start <= split.transaction.post_date <= end:
+            totals[split.account.guid] += abs(split.value)
+    return dict(totals)
+
+
+def test_flow_totals_select_whole_posting_days(raw_book):
+    days = sorted({tx.post_date for tx in raw_book.transactions})
+    first, last = days[0] - timedelta(days=1), days[-1] + timedelta(days=1)
+    ranges = [(start, end) for start in days + [first] for end in days + [last] if start <= end]
+    for start, end in ranges:
+        flows = {guid: total for guid, (_, _, total) in load_flow_totals(raw_book, start, end, TYPES).items()}
+        assert flows == expected_flows(raw_book, start, end), (start, end)
+
+
+def test_flow_totals_name_the_accounts(raw_book):
+    flows = load_flow_totals(raw_book, date(2024, 1, 1), date(2024, 1, 31), TYPES)
+    assert sorted((name, account_type) for name, account_type, _ in flows.values()) == [
+        ("Groceries", "EXPENSE"), ("Salary", "INCOME"), ("Utilities", "EXPENSE")]
+    assert load_flow_totals(raw_book, date(2024, 2, 1), date(2024, 2, 29), TYPES) == {}
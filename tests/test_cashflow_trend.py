@@ -0,0 +1,69 @@
+"""Cash-flow trend periods: buckets cover the range day by day, cut at its ends."""
+from datetime import date, timedelta
+
+import pytest
+
+from balances import period_label
+from cashflow_trend import period_buckets
+
+
+def covered_days(buckets):
+    days = []
+    for label, first, last in buckets:
+        assert first <= last
+        for offset in range((last - first).days + 1):
+            days.append((first + timedelta(days=offset), label))
+    return days
+
+
+@pytest.mark.parametrize("freq", ["M", "Q", "Y"])
+@pytest.mark.parametrize("start_date, end_date", [
+    (date(2024, 1, 1), date(2024, 12, 31)),
+    (date(2023, 11, 15), date(2024, 3, 1)),
+    (date(2024, 2, 29), date(2024, 2, 29)),
+    (date(2023, 12, 31), date(2024, 1, 1)),
+    (date(2024, 3, 31), date(2024, 4, 1)),
+    (date(2020, 6, 30), date(2024, 7, 1)),
+])
+def test_buckets_partition_a_date_range(freq, start_date, end_date):
+    buckets = period_buckets(end_date, freq, start_date=start_date)
+    days = covered_days(buckets)
+    expected = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    # Every day once, in order, in the bucket of its own period
+    assert [day for day, _ in days] == expected
+    assert all(label == period_label(day, freq) for day, label in days)
+    assert len({label for label, _, _ in buckets}) == len(buckets)
+
+
+@pytest.mark.parametrize("end_date, freq, periods, first_bucket, last_bucket", [
+    (date(2024, 3, 15), "M", 12, ("2023-04", date(2023, 4, 1), date(2023, 4, 30)),
+     ("2024-03", date(2024, 3, 1), date(2024, 3, 15))),
+    (date(2024, 1, 31), "M", 1, ("2024-01", date(2024, 1, 1), date(2024, 1, 31)),
+     ("2024-01", date(2024, 1, 1), date(2024, 1, 31))),
+    (date(2024, 3, 1), "M", 2, ("2024-02", date(2024, 2, 1), date(2024, 2, 29)),
+     ("2024-03", date(2024, 3, 1), date(2024, 3, 1))),
+    (date(2024, 1, 1), "Q", 4, ("2023Q2", date(2023, 4, 1), date(2023, 6, 30)),
+     ("2024Q1", date(2024, 1, 1), date(2024, 1, 1))),
+    (date(2024, 12, 31), "Y", 3, ("2022", date(2022, 1, 1), date(2022, 12, 31)),
+     ("2024", date(2024, 1, 1), date(2024, 12, 31))),
+])
+def test_period_count_ends_with_the_period_of_end_date(end_date, freq, periods, first_bucket, last_bucket):
+    buckets = period_buckets(end_date, freq, periods)
+    assert len(buckets) == periods
+    assert buckets[0] == first_bucket
+    assert buckets[-1] == last_bucket
+    # Whole periods before the last one, without gaps
+    assert [day for day, _ in covered_days(buckets)] == [
+        first_bucket[1] + timedelta(days=n) for n in range((end_date - first_bucket[1]).days + 1)]
+
+
+def test_start_date_overrides_the_period_count():
+    assert period_buckets(date(2024, 3, 10), "M", periods=1, start_date=date(2024, 1, 20)) == [
+        ("2024-01", date(2024, 1, 20), date(2024, 1, 31)),
+        ("2024-02", date(2024, 2, 1), date(2024, 2, 29)),
+        ("2024-03", date(2024, 3, 1), date(2024, 3, 10)),
+    ]
+
+
+def test_start_after_end_has_no_buckets():
+    assert period_buckets(date(2024, 3, 10), "M", start_date=date(2024, 3, 11)) == []
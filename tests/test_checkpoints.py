@@ -0,0 +1,127 @@
+"""Balance checkpoints: month-end sums stay equal to a full scan as the book changes."""
+import sqlite3
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from piecash import Split, Transaction
+
+from checkpoints import checkpoint_store, file_signature, note_change, pending_from, sum_split_quantities
+from shared_vars import get_book
+
+LATE = date(2024, 12, 20)
+
+
+def add_posting(book, day, amount=10):
+    Transaction(currency=book.default_currency, description=f"posted {day}", post_date=day, splits=[
+        Split(account=book.accounts(fullname="Assets:Checking Account"), value=Decimal(-amount)),
+        Split(account=book.accounts(fullname="Expenses:Groceries"), value=Decimal(amount)),
+    ])
+
+
+def post(day, amount=10):
+    with get_book(readonly=False) as book:
+        add_posting(book, day, amount)
+        book.save()
+
+
+def split_sums(at_date=LATE):
+    """Checkpointed sums as of a date, checked against a full scan."""
+    with get_book() as book:
+        sums = checkpoint_store(book).split_sums(book, at_date)
+        assert sums == sum_split_quantities(book, upto=at_date)
+        return sums
+
+
+def periods(book):
+    with sqlite3.connect(f"{book}.checkpoints") as db:
+        return [p for (p,) in db.execute("SELECT period_end FROM periods ORDER BY period_end")]
+
+
+def generation(book):
+    with sqlite3.connect(f"{book}.checkpoints") as db:
+        return int(db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0])
+
+
+@pytest.fixture
+def history(book):
+    """A posting on the 15th of every month of 2024, and checkpoints at three month ends."""
+    for month in range(1, 13):
+        post(date(2024, month, 15), amount=month)
+    for day in (date(2024, 4, 20), date(2024, 8, 20), LATE):
+        split_sums(day)
+    assert periods(book) == ["2024-03-31", "2024-07-31", "2024-11-30"]
+    return book
+
+
+def test_back_dated_posting_drops_later_period_ends(history):
+    before = generation(history)
+    post(date(2024, 6, 10))
+    assert periods(history) == ["2024-03-31"]
+    assert generation(history) == before + 1
+    split_sums()
+    # The book file changed with the commit; the kept checkpoint is still trusted
+    assert periods(history) == ["2024-03-31", "2024-11-30"]
+    assert generation(history) == before + 1
+
+
+def test_posting_after_the_last_checkpoint_keeps_every_checkpoint(history):
+    before = generation(history)
+    post(date(2024, 12, 18))
+    split_sums()
+    assert periods(history) == ["2024-03-31", "2024-07-31", "2024-11-30"]
+    assert generation(history) == before
+
+
+def test_change_outside_the_hooks_drops_every_checkpoint(history):
+    before = generation(history)
+    with sqlite3.connect(history) as db:
+        db.execute("UPDATE splits SET quantity_num = quantity_num * 2, value_num = value_num * 2 "
+                   "WHERE tx_guid IN (SELECT guid FROM transactions WHERE description = 'posted 2024-02-15')")
+    split_sums(date(2024, 8, 20))
+    assert periods(history) == ["2024-07-31"]
+    assert generation(history) == before + 1
+
+
+def test_checkpoint_of_an_older_generation_is_not_saved(history):
+    with get_book() as book:
+        store = checkpoint_store(book)
+    # Built while a back-dated commit dropped checkpoints
+    store._store(date(2024, 5, 31), {}, generation(history) - 1, file_signature(history))
+    assert "2024-05-31" not in periods(history)
+    store._store(date(2024, 5, 31), {}, generation(history), file_signature(history))
+    assert "2024-05-31" in periods(history)
+
+
+def test_uncommitted_back_dated_changes_bypass_checkpoints(history):
+    committed = split_sums()
+    with get_book(readonly=False) as book:
+        assert pending_from(book.session) is None
+        add_posting(book, date(2024, 2, 10))
+        assert pending_from(book.session) == date(2024, 2, 10)
+        # Flushed, as by a deferred save of a --script batch
+        book.session.flush()
+        assert pending_from(book.session) == date(2024, 2, 10)
+        store = checkpoint_store(book)
+        # Sums include the pending posting, and are not saved as checkpoints
+        sums = store.split_sums(book, LATE)
+        assert sums == sum_split_quantities(book, upto=LATE)
+        assert sums != committed
+        assert pending_from(book.session) == date(2024, 2, 10)
+        book.cancel()
+        assert pending_from(book.session) is None
+    assert periods(history) == ["2024-03-31", "2024-07-31", "2024-11-30"]
+
+
+def test_note_change_records_the_earliest_day(book):
+    with get_book(readonly=False) as raw:
+        session = raw.session
+        # A bulk insert runs in a transaction of the session
+        session.query(Transaction).first()
+        note_change(session, date(2024, 5, 1))
+        note_change(session, date(2024, 7, 1))
+        assert pending_from(session) == date(2024, 5, 1)
+        note_change(session, date(2024, 3, 1))
+        assert pending_from(session) == date(2024, 3, 1)
+        raw.cancel()
+        assert pending_from(session) is None
@@ -0,0 +1,73 @@
+"""Command router: lines routed to tools with their arguments, and lines left for the agent."""
+from decimal import Decimal
+
+import pytest
+
+import gnucash_cli as cli
+from command_router import CommandError, CommandRouter, _convert, agent_tools
+
+
+@pytest.fixture(scope="module")
+def router():
+    return CommandRouter(agent_tools(cli.gnucash_agent))
+
+
+def arguments(router, line):
+    parsed = router.parse(line)
+    assert parsed is not None, line
+    name, function, kwargs = parsed
+    assert function is agent_tools(cli.gnucash_agent)[name].function
+    kwargs.pop("ctx", None)
+    return name, kwargs
+
+
+def test_positional_words_fill_parameters_in_order(router):
+    assert arguments(router, "list_transactions 20") == ("list_transactions", {"limit": 20})
+    assert arguments(router, "transfer_funds Assets:Checking 'Expenses:Food and Drink' 12.50") == (
+        "transfer_funds",
+        {"from_account": "Assets:Checking", "to_account": "Expenses:Food and Drink", "amount": 12.5},
+    )
+
+
+@pytest.mark.parametrize("line", [
+    "purge_backups mybook --days 30",
+    "purge_backups mybook --days=30",
+    "purge_backups mybook days=30",
+    "purge_backups --days 30 mybook",
+    "purge_backups book_name=mybook --da 30",
+])
+def test_options_by_name_and_unique_prefix(router, line):
+    assert arguments(router, line) == ("purge_backups", {"book_name": "mybook", "days": 30})
+
+
+def test_flags_and_dashed_names(router):
+    name, kwargs = arguments(router, "import_transactions s.csv Assets:Checking --dry-run --chunk-size 50")
+    assert kwargs == {"file_path": "s.csv", "account": "Assets:Checking", "dry_run": True, "chunk_size": 50}
+    _, kwargs = arguments(router, "import_transactions s.csv Assets:Checking --dry-run=no")
+    assert kwargs["dry_run"] is False
+
+
+@pytest.mark.parametrize("line", [
+    "",
+    "show me my balance",
+    "list_transactions 'unterminated",
+    "list_transactions ten",
+    "list_transactions 1 2 3",
+    "list_transactions --nope 3",
+    "list_transactions --limit",
+    "list_transactions 5 --limit 6",
+    "purge_backups mybook --b 2024-01-01",
+    "transfer_funds Assets:Checking",
+])
+def test_lines_that_do_not_fit_are_left_for_the_agent(router, line):
+    assert router.parse(line) is None
+
+
+def test_convert():
+    assert _convert("2.10", Decimal, "amount") == Decimal("2.10")
+    assert _convert('["a", "b"]', list, "names") == ["a", "b"]
+    assert _convert("YES", bool, "dry_run") is True
+    assert _convert("7", int, "limit") == 7
+    assert _convert("text", str, "name") == "text"
+    with pytest.raises(CommandError, match="dry_run: 'maybe' is not a yes/no value"):
+        _convert("maybe", bool, "dry_run")
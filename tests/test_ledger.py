@@ -0,0 +1,88 @@
+"""Keyset paging of list_transactions."""
+import asyncio
+import re
+import sqlite3
+
+import piecash
+import pytest
+
+import gnucash_cli as cli
+from ledger import fetch_recent_transactions, format_cursor, parse_cursor
+from shared_vars import set_active_book
+
+CURSOR = re.compile(r"Older transactions: list_transactions (\d+) before=(\S+)")
+
+
+@pytest.fixture
+def ties(book):
+    """Six more transactions on 2024-03-01, two of them stored at other times of that day."""
+    for i in range(6):
+        asyncio.run(cli.transfer_funds(None, "Assets", "Expenses", 1 + i, f"tie {i}"))
+    set_active_book(None)
+    with sqlite3.connect(book) as db:
+        db.execute("UPDATE transactions SET post_date = '2024-03-01 10:59:00' WHERE description LIKE 'tie %'")
+        db.execute("UPDATE transactions SET post_date = '2024-03-01 06:00:00' WHERE description = 'tie 4'")
+        db.execute("UPDATE transactions SET post_date = '2024-03-01 16:00:00' WHERE description = 'tie 5'")
+    asyncio.run(cli.open_book(None, book))
+    return book
+
+
+def all_descriptions(path):
+    with sqlite3.connect(path) as db:
+        return sorted(d for (d,) in db.execute("SELECT description FROM transactions"))
+
+
+def listed(output):
+    return re.findall(r"\] (.+)$", output, re.MULTILINE)
+
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_limit_below_one_is_rejected(book, limit):
+    assert asyncio.run(cli.list_transactions(None, limit)) == "Limit must be at least 1."
+
+
+def test_pages_of_one_visit_every_transaction_once(ties):
+    seen = []
+    before = None
+    while True:
+        output = asyncio.run(cli.list_transactions(None, 1, before))
+        if output == "No transactions found in the book.":
+            break
+        page = listed(output)
+        assert len(page) == 1
+        seen += page
+        match = CURSOR.search(output)
+        assert match and match.group(1) == "1"
+        before = match.group(2)
+    assert sorted(seen) == all_descriptions(ties)
+
+
+@pytest.mark.parametrize("limit", [2, 3, 4, 100])
+def test_pages_follow_the_stored_order(ties, limit):
+    with sqlite3.connect(ties) as db:
+        expected = [g for (g,) in db.execute("SELECT guid FROM transactions ORDER BY post_date DESC, guid DESC")]
+    with piecash.open_book(ties, readonly=True, open_if_lock=True) as raw:
+        seen, before = [], None
+        while True:
+            page = fetch_recent_transactions(raw, limit, before=before)
+            seen += [tx.guid for tx in page]
+            if len(page) < limit:
+                break
+            before = parse_cursor(format_cursor(page[-1]))
+    assert seen == expected
+
+
+def test_cursor_round_trips(ties):
+    with piecash.open_book(ties, readonly=True, open_if_lock=True) as raw:
+        for tx in fetch_recent_transactions(raw, 1000):
+            assert parse_cursor(format_cursor(tx)) == (tx.post_date, tx.guid)
+    assert parse_cursor(" 2024-03-01 ") == (parse_cursor("2024-03-01,x")[0], None)
+    with pytest.raises(ValueError):
+        parse_cursor("03/01/2024")
+
+
+def test_date_cursor_skips_that_day(ties):
+    output = asyncio.run(cli.list_transactions(None, 100, "2024-03-01"))
+    assert not [d for d in listed(output) if d.startswith("tie")]
+    assert "Fund transfer" not in output
+    assert asyncio.run(cli.list_transactions(None, 100, "not a date")).startswith("Invalid 'before' cursor")
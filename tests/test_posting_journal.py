@@ -0,0 +1,220 @@
+"""Posting journal and group commit: replay after a crash or a rolled-back group,
+and how pending postings interact with reads, restores and snapshots."""
+import asyncio
+import functools
+import json
+import shutil
+import sqlite3
+import threading
+import uuid
+
+import pytest
+
+import gnucash_cli as cli
+from backup_store import backup_store
+from conftest import BOOK
+from executor import WRITE, tool_executor
+from posting_journal import GroupCommitter
+from shared_vars import book_pool, set_active_book
+
+
+def count_transactions(path=BOOK, description=None):
+    with sqlite3.connect(path) as db:
+        if description is None:
+            return db.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        return db.execute("SELECT COUNT(*) FROM transactions WHERE description = ?",
+                          (description,)).fetchone()[0]
+
+
+def journal_lines(path=BOOK):
+    with open(f"{path}.journal") as f:
+        return f.read().splitlines()
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def started_committer(delay=60):
+    """Group commit that only commits when asked (or a read needs it) during a test."""
+    committer = GroupCommitter(group_size=1000, delay=delay)
+    await committer.start()
+    return committer
+
+
+async def stop(committer):
+    await committer.stop(functools.partial(tool_executor.run, WRITE))
+
+
+def test_crash_between_append_and_commit_replays_once(book):
+    base = count_transactions()
+
+    async def post_then_crash():
+        committer = await started_committer()
+        for i in range(3):
+            result = await cli.transfer_funds(None, "Assets", "Expenses", 1.0 + i, f"crash {i}")
+            assert result.startswith("Successfully")
+        # What a crash leaves on disk: the journal, and a book without the postings
+        shutil.copy(book, "crashed.gnucash")
+        shutil.copy(f"{book}.journal", "crashed.gnucash.journal")
+        await stop(committer)
+
+    run(post_then_crash())
+    assert count_transactions("crashed.gnucash") == base
+    assert len(journal_lines("crashed.gnucash")) == 3
+
+    result = run(cli.open_book(None, "crashed.gnucash"))
+    assert "Recovered 3 journaled posting(s) (0 already in the book)" in result
+    assert journal_lines("crashed.gnucash") == []
+
+    # Opening again finds nothing to replay
+    assert "Recovered" not in run(cli.open_book(None, "crashed.gnucash"))
+    assert count_transactions("crashed.gnucash") == base + 3
+    for i in range(3):
+        assert count_transactions("crashed.gnucash", f"crash {i}") == 1
+
+
+def test_rolled_back_group_is_replayed(book):
+    base = count_transactions()
+
+    async def scenario():
+        committer = await started_committer()
+        for i in range(3):
+            await cli.transfer_funds(None, "Assets", "Expenses", 2.0, f"rolled back {i}")
+        assert book_pool.pending_commands == 3
+
+        writer = book_pool._writer.book
+        save = writer.save
+
+        def failing_save():
+            writer.save = save
+            raise OSError("disk full")
+
+        writer.save = failing_save
+        with pytest.raises(OSError):
+            await tool_executor.run(WRITE, book_pool.commit_batch)
+        assert book_pool.journal.needs_replay
+        assert count_transactions() == base
+
+        result = await cli.flush(None)
+        await stop(committer)
+        return result
+
+    result = run(scenario())
+    assert "Replayed 3 rolled-back posting(s)" in result
+    assert count_transactions() == base + 3
+    assert journal_lines() == []
+
+
+def test_replay_skips_postings_already_in_the_book(book):
+    base = count_transactions()
+    with sqlite3.connect(book) as db:
+        existing = db.execute("SELECT guid FROM transactions LIMIT 1").fetchone()[0]
+    records = [
+        {"tool": "transfer_funds", "guid": uuid.uuid4().hex, "time": "2024-01-02T03:04:05",
+         "args": {"from_account": "Assets", "to_account": "Expenses", "amount": 12.5, "description": "new"}},
+        {"tool": "transfer_funds", "guid": existing, "time": "2024-01-02T03:04:06",
+         "args": {"from_account": "Assets", "to_account": "Expenses", "amount": 1, "description": "dup"}},
+    ]
+    set_active_book(None)
+    with open(f"{book}.journal", "w") as f:
+        for seq, record in enumerate(records, 1):
+            f.write(json.dumps(dict(record, seq=seq)) + "\n")
+        # Torn write of a crash
+        f.write('{"seq": 3, "tool": "transf')
+
+    result = run(cli.open_book(None, book))
+    assert "Recovered 1 journaled posting(s) (1 already in the book)" in result
+    assert count_transactions() == base + 1
+    assert count_transactions(description="dup") == 0
+    with sqlite3.connect(book) as db:
+        guid, post_date = db.execute(
+            "SELECT guid, post_date FROM transactions WHERE description = 'new'").fetchone()
+    # Replayed with the journaled guid and time
+    assert guid == records[0]["guid"]
+    assert post_date.startswith("2024-01-02")
+    assert journal_lines() == []
+
+
+def test_reads_see_postings_committed_on_the_writer_thread(book, monkeypatch):
+    threads = set()
+    commit_batch = book_pool.commit_batch
+
+    def spy():
+        threads.add(threading.current_thread().name)
+        return commit_batch()
+
+    monkeypatch.setattr(book_pool, "commit_batch", spy)
+
+    async def scenario():
+        committer = await started_committer()
+        outputs = await asyncio.gather(
+            *[cli.transfer_funds(None, "Assets", "Expenses", 1.0, f"seen {i}") for i in range(3)],
+            cli.list_transactions(None, 10),
+        )
+        await stop(committer)
+        return outputs[-1]
+
+    listing = run(scenario())
+    assert all(f"seen {i}" in listing for i in range(3))
+    assert threads and all(name.startswith("gnucash-write") for name in threads)
+
+
+def test_leaked_write_session_does_not_block_postings_or_reads(book):
+    async def scenario():
+        committer = await started_committer()
+        # Early returns of a write tool (missing parent account)
+        for _ in range(2):
+            result = await cli.create_stock_sub_account(None, "AAPL", parent_path="Nowhere")
+            assert "does not exist" in result
+        outputs = await asyncio.wait_for(asyncio.gather(
+            cli.transfer_funds(None, "Assets", "Expenses", 5.0, "after leak"),
+            cli.list_transactions(None, 5),
+        ), timeout=30)
+        await stop(committer)
+        return outputs
+
+    posted, listing = run(scenario())
+    assert posted.startswith("Successfully")
+    assert "after leak" in listing
+
+
+def test_restore_keeps_pending_postings_in_the_safety_copy(book):
+    async def scenario():
+        committer = await started_committer()
+        await cli.snapshot_book(None)
+        snapshot = backup_store().list(book)[-1]
+        await cli.transfer_funds(None, "Assets", "Expenses", 7.0, "before restore")
+        assert book_pool.pending_commands == 1
+        result = await cli.restore_backup(None, snapshot["timestamp"])
+        await stop(committer)
+        return snapshot, result
+
+    snapshot, result = run(scenario())
+    assert result.startswith("Restored")
+    store = backup_store()
+    safety = [b for b in store.list(book) if b["name"] != snapshot["name"]]
+    assert len(safety) == 1
+    assert result.endswith(f"; its previous state is backup {safety[0]['name']}")
+    store.restore(safety[0]["name"], "safety.gnucash")
+    assert count_transactions("safety.gnucash", "before restore") == 1
+    assert count_transactions(description="before restore") == 0
+    assert journal_lines() == []
+
+
+def test_snapshots_include_pending_postings_and_get_their_own_names(book):
+    async def scenario():
+        committer = await started_committer()
+        await cli.transfer_funds(None, "Assets", "Expenses", 3.0, "before snapshot")
+        results = await asyncio.gather(cli.snapshot_book(None), cli.snapshot_book(None))
+        await stop(committer)
+        return results
+
+    results = run(scenario())
+    assert all(r.startswith("Snapshot") for r in results), results
+    store = backup_store()
+    names = [b["name"] for b in store.list(book)]
+    assert len(names) == 2
+    for name in names:
+        store.restore(name, "snapshot.gnucash")
+        assert count_transactions("snapshot.gnucash", "before snapshot") == 1
@@ -0,0 +1,119 @@
+"""Price store upserts and price lookups."""
+import asyncio
+import sqlite3
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import piecash
+import pytest
+from piecash._common import GncConversionError
+
+import gnucash_cli as cli
+from prices import PriceHistory, PriceSeries
+from shared_vars import set_active_book
+
+QUOTES = """symbol,date,price,currency
+AAPL,2024-03-01,170.10,
+AAPL,2024-03-04,171.5,
+MSFT,2024-03-01,400,USD
+NOPE,2024-03-01,1,
+AAPL,03/05/2024,1,
+AAPL,2024-03-06,1,XYZ
+"""
+
+
+def prices(path):
+    with sqlite3.connect(path) as db:
+        return db.execute(
+            "SELECT c.mnemonic, substr(p.date, 1, 10), p.value_num * 1.0 / p.value_denom, cur.mnemonic "
+            "FROM prices p JOIN commodities c ON c.guid = p.commodity_guid "
+            "JOIN commodities cur ON cur.guid = p.currency_guid ORDER BY c.mnemonic, p.date").fetchall()
+
+
+def stocks():
+    for ticker in ("AAPL", "MSFT"):
+        result = asyncio.run(cli.create_stock_sub_account(None, ticker, parent_path="Assets", namespace="NASDAQ"))
+        assert result.startswith("Successfully"), result
+
+
+def load(text, path="quotes.csv"):
+    with open(path, "w") as f:
+        f.write(text)
+    return asyncio.run(cli.set_prices(None, path, namespace="NASDAQ"))
+
+
+def test_set_prices_creates_updates_and_reports_skipped_quotes(book):
+    stocks()
+    result = load(QUOTES)
+    assert result.startswith("Prices loaded: 3 created, 0 updated, 3 skipped"), result
+    assert "NASDAQ:NOPE: commodity not found" in result
+    assert "line 6: unreadable quote" in result
+    assert "NASDAQ:AAPL: currency 'XYZ' not found" in result
+    assert prices(book) == [("AAPL", "2024-03-01", 170.1, "INR"), ("AAPL", "2024-03-04", 171.5, "INR"),
+                            ("MSFT", "2024-03-01", 400.0, "USD")]
+
+    result = load("symbol,date,price\nAAPL,2024-03-04,172\nAAPL,2024-03-05,173\n")
+    assert result == "Prices loaded: 1 created, 1 updated, 0 skipped"
+    assert [p for p in prices(book) if p[0] == "AAPL"] == [
+        ("AAPL", "2024-03-01", 170.1, "INR"), ("AAPL", "2024-03-04", 172.0, "INR"),
+        ("AAPL", "2024-03-05", 173.0, "INR")]
+
+
+def test_same_day_quotes_in_one_file_update_the_price_they_created(book):
+    stocks()
+    assert load("symbol,date,price\nAAPL,2024-03-01,1\nAAPL,2024-03-01,2\n") == (
+        "Prices loaded: 1 created, 1 updated, 0 skipped")
+    assert prices(book) == [("AAPL", "2024-03-01", 2.0, "INR")]
+
+
+def test_price_series_as_of():
+    series = PriceSeries()
+    for day, value in [(date(2024, 3, 1), "1"), (date(2024, 3, 4), "2"), (date(2024, 3, 4), "3"),
+                       (date(2024, 3, 10), "4")]:
+        series.append(day, Decimal(value))
+    assert len(series) == 3
+    assert series.latest == Decimal("4")
+    assert series.as_of(date(2024, 2, 29)) is None
+    assert series.as_of(date(2024, 3, 1)) == Decimal("1")
+    assert series.as_of(date(2024, 3, 3)) == Decimal("1")
+    # The last price loaded for a date wins
+    assert series.as_of(date(2024, 3, 4)) == Decimal("3")
+    assert series.as_of(date(2024, 3, 9)) == Decimal("3")
+    assert series.as_of(date(2030, 1, 1)) == Decimal("4")
+
+
+def test_history_matches_a_scan_of_the_price_table(book):
+    stocks()
+    load("symbol,date,price,currency\n"
+         "AAPL,2024-03-01,170.10,\nAAPL,2024-03-04,171.5,\nAAPL,2024-03-08,169,\nAAPL,2024-03-04,2,USD\n")
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        history = PriceHistory(raw)
+        aapl = raw.commodities(mnemonic="AAPL")
+        for currency in (raw.default_currency, raw.commodities(mnemonic="USD")):
+            known = sorted((p.date, p.value) for p in aapl.prices if p.currency == currency)
+            assert history.price(aapl, currency) == known[-1][1]
+            for offset in range(-1, 10):
+                day = date(2024, 3, 1) + timedelta(days=offset)
+                expected = [value for price_date, value in known if price_date <= day]
+                assert history.price(aapl, currency, day) == (expected[-1] if expected else None), day
+                assert history.price(aapl, currency, datetime.combine(day, time(23, 59))) == history.price(
+                    aapl, currency, day)
+
+
+def test_conversion_uses_direct_then_inverse_prices(book):
+    stocks()
+    load("symbol,date,price,currency\nAAPL,2024-03-01,170,\n")
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        history = PriceHistory(raw)
+        aapl, msft = raw.commodities(mnemonic="AAPL"), raw.commodities(mnemonic="MSFT")
+        inr = raw.default_currency
+        assert history.conversion(inr, inr) == 1
+        assert history.conversion(aapl, inr) == Decimal("170")
+        assert history.conversion(inr, aapl) == Decimal(1) / Decimal("170")
+        assert history.conversion(aapl, inr, date(2024, 3, 5)) == Decimal("170")
+        with pytest.raises(GncConversionError):
+            history.conversion(aapl, inr, date(2024, 2, 29))
+        with pytest.raises(GncConversionError):
+            history.conversion(msft, inr)
@@ -0,0 +1,87 @@
+"""Split frame reports against the SQL paths they stand in for."""
+import os
+import sqlite3
+from datetime import date, timedelta
+
+import piecash
+import pytest
+
+import report_engine
+from balances import load_flow_totals, load_split_totals
+from report_engine import SplitFrame
+from synthetic_book import generate_book
+
+TYPES = ["INCOME", "EXPENSE"]
+
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("synthetic") / "synthetic.gnucash")
+    generate_book(path, accounts=30, transactions=300, splits_per_transaction=3, stocks=2, price_days=5)
+    with sqlite3.connect(path) as db:
+        # Times of day GnuCash desktop and imports store, near the day boundaries
+        db.execute("UPDATE transactions SET post_date = substr(post_date, 1, 10) || ' 00:00:00' "
+                   "WHERE rowid % 7 = 0")
+        db.execute("UPDATE transactions SET post_date = substr(post_date, 1, 10) || ' 23:59:59' "
+                   "WHERE rowid % 7 = 1")
+    return path
+
+
+@pytest.fixture
+def raw(synthetic):
+    with piecash.open_book(synthetic, readonly=True, open_if_lock=True) as book:
+        yield book
+
+
+def exactly(totals):
+    """Totals with their scale: Decimal("1.50") == Decimal("1.5") but their strings differ."""
+    return {key: str(value) for key, value in totals.items()}
+
+
+def test_frame_own_totals_equal_sql_totals(raw, monkeypatch):
+    monkeypatch.setenv("GC_CLI_CHECKPOINTS", "0")
+    frame = SplitFrame.load(raw)
+    days = sorted({d.date() for d in frame.splits["post_date"]})
+    for at_date in [None, days[0], days[len(days) // 2], days[-1], days[0] - timedelta(days=1)]:
+        assert exactly(frame.own_totals(at_date)) == exactly(load_split_totals(raw, at_date)), at_date
+
+
+def test_frame_flows_equal_sql_flows(raw):
+    frame = SplitFrame.load(raw)
+    end = date.today()
+    for start in [end - timedelta(days=400), end - timedelta(days=31), end]:
+        expected = load_flow_totals(raw, start, end, TYPES)
+        assert {k: (n, t, str(v)) for k, (n, t, v) in frame.flow_totals(start, end, TYPES).items()} == \
+            {k: (n, t, str(v)) for k, (n, t, v) in expected.items()}
+
+
+def test_frame_monthly_flows_equal_sql_flows_per_month(raw):
+    frame = SplitFrame.load(raw)
+    end = date.today()
+    start = end.replace(year=end.year - 1)
+    periods = frame.period_flow_totals(start, end, TYPES)
+    months = {period for period, _ in periods}
+    assert len(months) >= 12
+    for month in months:
+        first = max(date.fromisoformat(f"{month}-01"), start)
+        last = min((first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1), end)
+        expected = {guid: str(total) for guid, (_, _, total) in load_flow_totals(raw, first, last, TYPES).items()}
+        assert {guid: str(total) for (period, guid), total in periods.items() if period == month} == expected
+
+
+@pytest.mark.parametrize("setting", [None, "1"])
+def test_benchmark_restores_the_checkpoint_setting(synthetic, monkeypatch, setting):
+    if setting is None:
+        monkeypatch.delenv("GC_CLI_CHECKPOINTS", raising=False)
+    else:
+        monkeypatch.setenv("GC_CLI_CHECKPOINTS", setting)
+    report_engine.benchmark(synthetic, repeat=1)
+    assert os.environ.get("GC_CLI_CHECKPOINTS") == setting
+
+
+def test_benchmark_raises_when_the_paths_differ(synthetic, monkeypatch):
+    monkeypatch.delenv("GC_CLI_CHECKPOINTS", raising=False)
+    monkeypatch.setattr(report_engine.SplitFrame, "own_totals", lambda self, at_date=None: {})
+    with pytest.raises(RuntimeError, match="balances differ"):
+        report_engine.benchmark(synthetic, repeat=1)
+    assert "GC_CLI_CHECKPOINTS" not in os.environ
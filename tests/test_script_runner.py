@@ -0,0 +1,53 @@
+"""Script mode: which tool results count as failures."""
+import asyncio
+import io
+
+import pytest
+from colorama import Fore
+
+import gnucash_cli as cli
+from command_router import CommandRouter, agent_tools
+from script_runner import is_error, run_script
+
+
+@pytest.mark.parametrize("output", [
+    "Error transferring funds: boom",
+    "No active book. Please create or open a book first.",
+    "Invalid date format. Use YYYY-MM-DD.",
+    "Account 'Assets:Nowhere' not found. Did you mean: Assets?",
+    "Parent account path Nowhere does not exist",
+    "Limit must be at least 1.",
+    "\x1b[31mError: not a command (line 3): frobnicate",
+])
+def test_failure_messages(output):
+    assert is_error(output)
+
+
+@pytest.mark.parametrize("output", [
+    "Recent transactions:\n[2024-03-01] refund: item not found\n  Assets: +5.00",
+    "Successfully transferred 5.00 from Assets to Expenses (refund: item does not exist)",
+    "No transactions found in the book.",
+    None,
+])
+def test_results_that_quote_failure_words(output):
+    assert not is_error(output)
+
+
+def run(script):
+    out = io.StringIO()
+    status = asyncio.run(run_script(io.StringIO(script), CommandRouter(agent_tools(cli.gnucash_agent)), out=out))
+    return status, out.getvalue()
+
+
+def test_descriptions_do_not_fail_a_listing(book):
+    status, output = run('transfer_funds Assets Expenses 5 "refund: item not found"\nlist_transactions 5\n')
+    assert "refund: item not found" in output
+    assert "FAILED" not in output
+    assert status == 0
+
+
+def test_failed_command_stops_the_script(book):
+    status, output = run("list_transactions 0\nlist_transactions 5\n")
+    assert output.startswith(Fore.RED + "FAILED")
+    assert "[2]" not in output
+    assert status == 1
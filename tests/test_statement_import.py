@@ -0,0 +1,92 @@
+"""Bulk statement import: rows as piecash writes them, checkpoints, and failures mid-import."""
+import asyncio
+import sqlite3
+from datetime import date
+from decimal import Decimal
+
+import piecash
+
+import gnucash_cli as cli
+import statement_import
+from balances import load_split_totals
+from shared_vars import set_active_book
+
+STATEMENT = """date,description,amount,memo
+2024-01-05,coffee,-12.30,card 1
+2024-02-06,refund,100,
+2024-03-07,interest,0.05,
+2024-03-08,rounding,0.005,
+2024-04-09,rent,-700,
+2024-05-10,books,-20.10,
+"""
+
+
+def run_import(path="statement.csv", **kwargs):
+    return asyncio.run(cli.import_transactions(None, path, "Assets:Checking Account",
+                                               default_account="Expenses:Groceries", **kwargs))
+
+
+def write_statement(text=STATEMENT, path="statement.csv"):
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def test_imported_transactions_read_back_through_piecash(book):
+    write_statement()
+    result = run_import()
+    assert result.startswith("Read 6 rows, imported 5 transactions in 1 chunks, skipped 1"), result
+    assert "line 5: 0.005 has more decimals than INR allows" in result
+
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        coffee = raw.transactions(description="coffee")
+        assert coffee.post_date == date(2024, 1, 5)
+        assert coffee.currency == raw.default_currency
+        assert {(s.account.fullname, s.value, s.quantity, s.memo) for s in coffee.splits} == {
+            ("Assets:Checking Account", Decimal("-12.30"), Decimal("-12.30"), "card 1"),
+            ("Expenses:Groceries", Decimal("12.30"), Decimal("12.30"), ""),
+        }
+        checking = raw.accounts(fullname="Assets:Checking Account")
+        assert checking.get_balance() == load_split_totals(raw)[checking.guid]
+    with sqlite3.connect(book) as db:
+        slots = db.execute("SELECT gdate_val FROM slots JOIN transactions ON guid = obj_guid "
+                           "WHERE name = 'date-posted' AND description = 'coffee'")
+        assert slots.fetchall() == [("20240105",)]
+
+
+def test_back_dated_import_drops_later_checkpoints(book):
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        checking = raw.accounts(fullname="Assets:Checking Account").guid
+        before = load_split_totals(raw, date(2024, 7, 15))[checking]
+
+    write_statement()
+    run_import()
+    set_active_book(None)
+    with piecash.open_book(book, readonly=True, open_if_lock=True) as raw:
+        # The checkpoint of 2024-06-30 was built before the import
+        assert load_split_totals(raw, date(2024, 7, 15))[checking] == before + Decimal("-632.35")
+
+
+def test_failure_mid_import_reports_what_was_committed(book, monkeypatch):
+    note_change = statement_import.note_change
+    calls = []
+
+    def fail_second_chunk(session, day):
+        calls.append(day)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        note_change(session, day)
+
+    monkeypatch.setattr(statement_import, "note_change", fail_second_chunk)
+    write_statement()
+    result = run_import(chunk_size=2)
+    assert result.startswith("Error importing transactions: disk full"), result
+    assert "2 transactions in 1 chunks were committed before the error, up to line 3" in result
+
+    set_active_book(None)
+    with sqlite3.connect(book) as db:
+        imported = {d for (d,) in db.execute("SELECT description FROM transactions")}
+    # The rows of the failed chunk were rolled back
+    assert {"coffee", "refund"} <= imported
+    assert not {"interest", "rent", "books"} & imported